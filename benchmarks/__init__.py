@@ -0,0 +1,22 @@
+# type: ignore
+from .benchmarks import (
+    BENCHMARKS,
+    DEFAULT_MIN_SECONDS,
+    DEFAULT_QUBITS,
+    DEFAULT_REPEATS,
+    DEFAULT_SIZES,
+    DEFAULT_THRESHOLD,
+    DEFAULT_WORKERS,
+    SHARED_BENCHMARK_QUBITS,
+    BenchmarkComparison,
+    BenchmarkResult,
+    compare_results,
+    load_metadata,
+    load_results,
+    peak_memory,
+    results_to_json,
+    run_benchmarks,
+    save_results,
+    time_call,
+)
+from .benchmarks_cli import benchmarks_main
@@ -0,0 +1,13 @@
+"""Run the benchmarks from the command line, e.g.
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --baseline results.json
+
+The exit status is 1 if any benchmark is a regression compared with the baseline.
+"""
+
+import sys
+
+from .benchmarks_cli import benchmarks_main
+
+sys.exit(benchmarks_main())
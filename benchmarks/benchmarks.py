@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterable, Optional
+
+from complex_matrices import ComplexMatrix, tensor_product
+from complex_numbers import use_numpy
+from complex_vectors import ComplexVector
+from myqasm import MYQASMSession
+from shared import complex_matrix_vector_multiply
+
+DEFAULT_SIZES = [4, 8, 16, 32]
+DEFAULT_QUBITS = [4, 8, 12]
+DEFAULT_WORKERS = [1, 2, 4]
+# The SHARED register benchmarks split a register of this many qubits
+# between each number of worker processes.
+SHARED_BENCHMARK_QUBITS = 20
+DEFAULT_REPEATS = 5
+# Each repeat calls the benchmark enough times to take at least this long,
+# so that quick calls aren't lost in the timer's resolution.
+DEFAULT_MIN_SECONDS = 0.1
+# A benchmark is a regression if it is this much (as a fraction) slower than
+# the baseline.
+DEFAULT_THRESHOLD = 0.2
+
+# A benchmark's setup is given the size, qubit count or number of workers,
+# and returns the function to time (so the setup isn't timed).
+BenchmarkSetup = Callable[[int], Callable[[], object]]
+
+
+def _random_matrix(size: int, rng: random.Random) -> ComplexMatrix:
+    return ComplexMatrix(
+        [
+            [complex(rng.uniform(-1, 1), rng.uniform(-1, 1)) for _ in range(size)]
+            for _ in range(size)
+        ]
+    )
+
+
+def _matrix_multiply(size: int) -> Callable[[], object]:
+    rng = random.Random(size)
+    m1, m2 = _random_matrix(size, rng), _random_matrix(size, rng)
+    return lambda: m1 * m2
+
+
+def _tensor_product(size: int) -> Callable[[], object]:
+    rng = random.Random(size)
+    m1, m2 = _random_matrix(size, rng), _random_matrix(size, rng)
+    return lambda: tensor_product(m1, m2)
+
+
+def _matrix_vector_multiply(size: int) -> Callable[[], object]:
+    rng = random.Random(size)
+    m = _random_matrix(size, rng)
+    v = ComplexVector.from_complex(
+        complex(rng.uniform(-1, 1), rng.uniform(-1, 1)) for _ in range(size)
+    )
+    return lambda: complex_matrix_vector_multiply(m, v)
+
+
+def _myqasm_session(qubits: int) -> MYQASMSession:
+    session = MYQASMSession(seed=qubits)
+    session.MYQASM(f"INITIALIZE R {qubits}")
+    for qubit in range(qubits):
+        session.MYQASM(f"APPLY H R {qubit}")
+    return session
+
+
+def _myqasm_apply(qubits: int) -> Callable[[], object]:
+    session = _myqasm_session(qubits)
+    return lambda: session.MYQASM("APPLY CNOT R 0 1")
+
+
+def _myqasm_measure(qubits: int) -> Callable[[], object]:
+    session = _myqasm_session(qubits)
+    # Sampling shots doesn't collapse the register, so every call does the same.
+    return lambda: session.MYQASM("MEASURE R 100")
+
+
+def _shared_session(workers: int) -> MYQASMSession:
+    session = MYQASMSession(seed=workers, workers=workers)
+    session.MYQASM(f"INITIALIZE R {SHARED_BENCHMARK_QUBITS} SHARED")
+    for qubit in range(SHARED_BENCHMARK_QUBITS):
+        session.MYQASM(f"APPLY H R {qubit}")
+    return session
+
+
+def _shared_apply(workers: int) -> Callable[[], object]:
+    session = _shared_session(workers)
+    return lambda: session.MYQASM("APPLY CNOT R 0 1")
+
+
+def _shared_measure(workers: int) -> Callable[[], object]:
+    session = _shared_session(workers)
+    return lambda: session.MYQASM("MEASURE R 100")
+
+
+# Benchmark name -> what it sweeps ("size", "qubits" or "workers"), and its setup.
+BENCHMARKS: dict[str, tuple[str, BenchmarkSetup]] = {
+    "matrix_multiply": ("size", _matrix_multiply),
+    "tensor_product": ("size", _tensor_product),
+    "matrix_vector_multiply": ("size", _matrix_vector_multiply),
+    "myqasm_apply": ("qubits", _myqasm_apply),
+    "myqasm_measure": ("qubits", _myqasm_measure),
+    "shared_apply": ("workers", _shared_apply),
+    "shared_measure": ("workers", _shared_measure),
+}
+
+
+@dataclass
+class BenchmarkResult:
+    """The time one call of a benchmark took, with the size, number of qubits or
+    number of workers (`parameter`) set to `value`: the fastest and the median of
+    the repeats, in seconds.
+    `peak_bytes` is the most memory allocated during one call.
+    """
+
+    name: str
+    parameter: str
+    value: int
+    seconds: float
+    median_seconds: float
+    peak_bytes: int
+
+
+@dataclass
+class BenchmarkComparison:
+    """A result compared with the same benchmark in a baseline:
+    `ratio` is how many times longer it took.
+    """
+
+    name: str
+    value: int
+    baseline_seconds: float
+    seconds: float
+    ratio: float
+    regression: bool
+
+
+def time_call(
+    call: Callable[[], object],
+    repeats: int = DEFAULT_REPEATS,
+    min_seconds: float = DEFAULT_MIN_SECONDS,
+) -> list[float]:
+    """The seconds one call of `call` took, in each of `repeats` repeats.
+
+    Each repeat calls it enough times to take at least `min_seconds`
+    (found by doubling), and divides by the number of calls.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            break
+        number *= 2
+    times = [elapsed / number]
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        times.append((time.perf_counter() - started) / number)
+    return times
+
+
+def peak_memory(call: Callable[[], object]) -> int:
+    """The most memory (in bytes) allocated during one call of `call`,
+    above what was allocated before it.
+    """
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        return max(tracemalloc.get_traced_memory()[1] - before, 0)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def run_benchmarks(
+    names: Optional[Iterable[str]] = None,
+    sizes: Iterable[int] = DEFAULT_SIZES,
+    qubits: Iterable[int] = DEFAULT_QUBITS,
+    workers: Iterable[int] = DEFAULT_WORKERS,
+    repeats: int = DEFAULT_REPEATS,
+    min_seconds: float = DEFAULT_MIN_SECONDS,
+    progress: Optional[Callable[[BenchmarkResult], None]] = None,
+) -> list[BenchmarkResult]:
+    """Run each benchmark in `names` (by default, all of `BENCHMARKS`)
+    for each of `sizes`, `qubits` or `workers` (whichever it sweeps),
+    calling `progress` with each result as it is made.
+
+    Raises ValueError if a name isn't a benchmark.
+    """
+    if names is None:
+        names = BENCHMARKS
+    names = list(names)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError(
+                f"Unknown benchmark {name}, must be one of {', '.join(BENCHMARKS)}."
+            )
+    values = {"size": list(sizes), "qubits": list(qubits), "workers": list(workers)}
+    results: list[BenchmarkResult] = []
+    for name in names:
+        parameter, setup = BENCHMARKS[name]
+        for value in values[parameter]:
+            call = setup(value)
+            times = time_call(call, repeats, min_seconds)
+            result = BenchmarkResult(
+                name,
+                parameter,
+                value,
+                min(times),
+                statistics.median(times),
+                peak_memory(call),
+            )
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return results
+
+
+def results_to_json(results: list[BenchmarkResult]) -> dict[str, Any]:
+    """The results, and what they were run with, as JSON-compatible values."""
+    return {
+        "metadata": {
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "numpy": use_numpy(),
+        },
+        "results": [asdict(result) for result in results],
+    }
+
+
+def save_results(results: list[BenchmarkResult], path: str | os.PathLike[str]) -> None:
+    with open(path, "w") as file:
+        json.dump(results_to_json(results), file, indent=2)
+
+
+def load_results(path: str | os.PathLike[str]) -> list[BenchmarkResult]:
+    """The results saved to `path` by `save_results`."""
+    with open(path) as file:
+        return [BenchmarkResult(**result) for result in json.load(file)["results"]]
+
+
+def load_metadata(path: str | os.PathLike[str]) -> dict[str, Any]:
+    """What the results saved to `path` by `save_results` were run with."""
+    with open(path) as file:
+        return json.load(file)["metadata"]
+
+
+def compare_results(
+    results: list[BenchmarkResult],
+    baseline: list[BenchmarkResult],
+    threshold: float = DEFAULT_THRESHOLD,
+    baseline_metadata: Optional[dict[str, Any]] = None,
+) -> list[BenchmarkComparison]:
+    """Compare the fastest time of each result with the same benchmark (and size,
+    qubit count or number of workers) in `baseline`.
+    Those more than `threshold` (as a fraction) slower are regressions.
+    Results that aren't in the baseline are left out.
+
+    Gives a RuntimeWarning if `baseline_metadata` (see `load_metadata`) says
+    the baseline was run with NumPy and these results weren't, or the other way
+    round, as the times can't be compared.
+    """
+    if baseline_metadata is not None and "numpy" in baseline_metadata:
+        if baseline_metadata["numpy"] != use_numpy():
+            numpy_used = "with" if use_numpy() else "without"
+            warnings.warn(
+                f"These results were run {numpy_used} NumPy but the baseline"
+                " wasn't, so their times can't be compared.",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+    baseline_seconds = {(b.name, b.value): b.seconds for b in baseline}
+    comparisons: list[BenchmarkComparison] = []
+    for result in results:
+        before = baseline_seconds.get((result.name, result.value))
+        if before is None:
+            continue
+        ratio = result.seconds / before if before > 0 else float("inf")
+        comparisons.append(
+            BenchmarkComparison(
+                result.name,
+                result.value,
+                before,
+                result.seconds,
+                ratio,
+                ratio > 1 + threshold,
+            )
+        )
+    return comparisons
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import argparse
+from typing import Optional, Sequence
+
+from .benchmarks import (
+    BENCHMARKS,
+    DEFAULT_MIN_SECONDS,
+    DEFAULT_QUBITS,
+    DEFAULT_REPEATS,
+    DEFAULT_SIZES,
+    DEFAULT_THRESHOLD,
+    DEFAULT_WORKERS,
+    BenchmarkResult,
+    compare_results,
+    load_metadata,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+
+
+def _print_result(result: BenchmarkResult) -> None:
+    print(
+        f"{result.name:<24} {result.parameter} {result.value:<6}"
+        f" {result.seconds * 1e6:12.1f} us (median {result.median_seconds * 1e6:.1f}"
+        f" us) {result.peak_bytes:12d} bytes"
+    )
+
+
+def benchmarks_main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Time the matrix operations and MYQASM instructions.",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=list(BENCHMARKS),
+        help="the benchmarks to run (by default, all of them)",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SIZES,
+        help="matrix sizes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--qubits",
+        nargs="+",
+        type=int,
+        default=DEFAULT_QUBITS,
+        help="register sizes of the MYQASM benchmarks (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        nargs="+",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=(
+            "numbers of processes to split the SHARED register benchmarks between"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=DEFAULT_MIN_SECONDS,
+        help="the shortest each repeat can take (default: %(default)s)",
+    )
+    parser.add_argument("--output", help="the JSON file to save the results to")
+    parser.add_argument(
+        "--baseline", help="a JSON file of earlier results to compare with"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=(
+            "how much slower (as a fraction) than the baseline is a regression"
+            " (default: %(default)s)"
+        ),
+    )
+    args = parser.parse_args(argv)
+
+    # Load the baseline first, so a missing file is found before the benchmarks run.
+    baseline = baseline_metadata = None
+    if args.baseline is not None:
+        baseline = load_results(args.baseline)
+        baseline_metadata = load_metadata(args.baseline)
+    results = run_benchmarks(
+        args.only,
+        args.sizes,
+        args.qubits,
+        args.workers,
+        args.repeats,
+        args.min_seconds,
+        progress=_print_result,
+    )
+    if args.output is not None:
+        save_results(results, args.output)
+    if baseline is None:
+        return 0
+
+    comparisons = compare_results(results, baseline, args.threshold, baseline_metadata)
+    print()
+    for comparison in comparisons:
+        print(
+            f"{comparison.name:<24} {comparison.value:<6} {comparison.ratio:6.2f}x"
+            " baseline" + (" REGRESSION" if comparison.regression else "")
+        )
+    regressions = sum(comparison.regression for comparison in comparisons)
+    print(f"{regressions} regression(s) of {len(comparisons)} compared.")
+    return 1 if regressions else 0
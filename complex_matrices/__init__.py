@@ -1,3 +1,4 @@
 # type: ignore
 from .complex_matrices import ComplexMatrix
 from .complex_matrix_tensor_product import tensor_product
+from .sparse_complex_matrices import SparseComplexMatrix
@@ -1,15 +1,27 @@
 from __future__ import annotations
 
-from typing import Sequence, TypeGuard
-
-from complex_numbers import ComplexNumber
+import operator
+from array import array
+from typing import Any, Sequence, TypeGuard
+
+from complex_numbers import (
+    ComplexNumber,
+    complex_to_packed,
+    numpy_to_packed,
+    pack_complex_numbers,
+    packed_all_close,
+    packed_to_complex,
+    packed_to_numpy,
+    packed_view,
+    use_numpy,
+)
 
 zero = ComplexNumber(0, 0)
 
 
 def _is_complex_matrixable(
     m: object,
-) -> TypeGuard[Sequence[Sequence[ComplexNumber | int | float]]]:
+) -> TypeGuard[Sequence[Sequence[ComplexNumber | int | float | complex]]]:
     try:
         _ = len(m)  # type: ignore
         outer_iter = iter(m)  # type: ignore
@@ -17,7 +29,7 @@ def _is_complex_matrixable(
             _ = len(i)  # type: ignore
             inner_iter = iter(i)  # type: ignore
             for c in inner_iter:  # type: ignore
-                if not isinstance(c, ComplexNumber | int | float):
+                if not isinstance(c, ComplexNumber | int | float | complex):
                     return False
     except TypeError:
         return False
@@ -26,11 +38,19 @@ def _is_complex_matrixable(
 
 
 class ComplexMatrix:
-    _matrix: list[list[ComplexNumber]]
+    _data: array[float] | memoryview
+    _height: int
+    _width: int
 
-    def __init__(self, matrix: Sequence[Sequence[ComplexNumber | int | float]]) -> None:
+    def __init__(
+        self, matrix: Sequence[Sequence[ComplexNumber | int | float | complex]]
+    ) -> None:
         """Each inner list is a row.
         Each column is the elements in each row with the same index.
+
+        The elements are stored packed, row by row, in a contiguous `array("d")`
+        (see `complex_numbers.pack_complex_numbers`); `ComplexNumber`s are only
+        created when a caller asks for them.
         """
         try:
             first_length = len(matrix[0])
@@ -46,11 +66,63 @@ class ComplexMatrix:
                     "matrix passed to ComplexMatrix must have rows of consistent"
                     " lengths."
                 )
-        new_matrix: list[list[ComplexNumber]] = [
-            [c if isinstance(c, ComplexNumber) else ComplexNumber(c, 0) for c in row]
-            for row in matrix
-        ]
-        self._matrix = new_matrix
+        self._data = pack_complex_numbers(c for row in matrix for c in row)
+        self._height = len(matrix)
+        self._width = first_length
+
+    @classmethod
+    def _from_packed(
+        cls, data: array[float] | memoryview, height: int, width: int
+    ) -> ComplexMatrix:
+        """Create a matrix directly from packed row-major `data`, without validation."""
+        new = cls.__new__(cls)
+        new._data = data
+        new._height = height
+        new._width = width
+        return new
+
+    @classmethod
+    def from_buffer(cls, buffer: Any, height: int, width: int) -> ComplexMatrix:
+        """Create a matrix that uses `buffer`'s memory as its (row-major) storage,
+        without copying.
+
+        See `complex_numbers.packed_view` for which buffers are accepted,
+        e.g. a 2 dimensional NumPy `complex128` array.
+        """
+        if height <= 0 or width <= 0:
+            raise ValueError("Cannot create a ComplexMatrix with no elements.")
+        data = packed_view(buffer)
+        if len(data) != 2 * height * width:
+            raise ValueError("Buffer size does not match the matrix size.")
+        return cls._from_packed(data, height, width)
+
+    def to_complex_list(self) -> list[list[complex]]:
+        """Get the rows as lists of builtin `complex`."""
+        return self._complex_rows()
+
+    def to_buffer(self) -> memoryview:
+        """A view of the packed, row-major storage (interleaved real and imaginary
+        parts, format `"d"`), without copying.
+        """
+        return memoryview(self._data)
+
+    @classmethod
+    def _from_numpy(cls, values: Any) -> ComplexMatrix:
+        """Create a matrix from a 2 dimensional NumPy array."""
+        height, width = values.shape
+        return cls._from_packed(numpy_to_packed(values), height, width)
+
+    def _as_numpy(self) -> Any:
+        """View the matrix as a 2 dimensional `complex128` NumPy array (no copy).
+
+        Only call this if `use_numpy()`.
+        """
+        return packed_to_numpy(self._data, (self._height, self._width))
+
+    def _complex_rows(self) -> list[list[complex]]:
+        values = packed_to_complex(self._data)
+        width = self._width
+        return [values[i : i + width] for i in range(0, len(values), width)]
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, ComplexMatrix):
@@ -59,11 +131,7 @@ class ComplexMatrix:
                 or self.get_height() != other.get_height()
             ):
                 return False
-            for row_index in range(self.get_height()):
-                if self.get_row(row_index) != other.get_row(row_index):
-                    return False
-
-            return True
+            return packed_all_close(self._data, other._data)
         elif isinstance(other, list) and all(isinstance(i, list) for i in other):  # type: ignore
             if len(other) != self.get_height():  # type: ignore
                 return False
@@ -73,48 +141,64 @@ class ComplexMatrix:
 
             return True
         else:
-            return False
+            return NotImplemented
 
     def get_width(self):
         """Get length of a row."""
-        return len(self._matrix[0])
+        return self._width
 
     def get_height(self):
         """Get height of a column."""
-        return len(self._matrix)
+        return self._height
 
     def get_row(self, i: int) -> list[ComplexNumber]:
         if i < 0 or i >= self.get_height():  # equal to get_height because of 0 indexing
             raise ValueError("Invalid index.")
-        return self._matrix[i]
+        data = self._data
+        start = 2 * i * self._width
+        return [
+            ComplexNumber(data[k], data[k + 1])
+            for k in range(start, start + 2 * self._width, 2)
+        ]
 
     def get_column(self, i: int) -> list[ComplexNumber]:
         if i < 0 or i >= self.get_width():  # equal to get_width because of 0 indexing
             raise ValueError("Invalid index.")
-        return [row[i] for row in self._matrix]
+        data = self._data
+        return [
+            ComplexNumber(data[k], data[k + 1])
+            for k in range(2 * i, len(data), 2 * self._width)
+        ]
 
     def inverse(self) -> ComplexMatrix:
-        new_matrix: list[list[ComplexNumber]] = []
-        for row_index in range(self.get_height()):
-            new_matrix.append([i.inverse() for i in self.get_row(row_index)])
-        return ComplexMatrix(new_matrix)
+        if use_numpy():
+            return self._from_numpy(-self._as_numpy())
+        return self._from_packed(
+            array("d", [-x for x in self._data]), self._height, self._width
+        )
 
     def conjugate(self) -> ComplexMatrix:
-        new_matrix: list[list[ComplexNumber]] = []
-        for row_index in range(self.get_height()):
-            new_matrix.append([i.conjugate() for i in self.get_row(row_index)])
-        return ComplexMatrix(new_matrix)
+        if use_numpy():
+            return self._from_numpy(self._as_numpy().conj())
+        data = array("d", self._data)
+        data[1::2] = array("d", [-x for x in data[1::2]])
+        return self._from_packed(data, self._height, self._width)
 
     def transpose(self) -> ComplexMatrix:
-        new_matrix: list[list[ComplexNumber]] = []
-        for column_index in range(self.get_width()):
-            new_row: list[ComplexNumber] = []
-            for row_index in range(self.get_height()):
-                new_row.append(self.get_row(row_index)[column_index])
-            new_matrix.append(new_row)
-        return ComplexMatrix(new_matrix)
+        if use_numpy():
+            return self._from_numpy(self._as_numpy().T)
+        data = self._data
+        row_stride = 2 * self._width
+        new_data: list[float] = []
+        for column_index in range(self._width):
+            for k in range(2 * column_index, len(data), row_stride):
+                new_data.append(data[k])
+                new_data.append(data[k + 1])
+        return self._from_packed(array("d", new_data), self._width, self._height)
 
     def adjoint(self) -> ComplexMatrix:
+        if use_numpy():
+            return self._from_numpy(self._as_numpy().conj().T)
         return self.transpose().conjugate()
 
     def is_hermitian(self) -> bool:
@@ -128,20 +212,22 @@ class ComplexMatrix:
         return self.get_width() == self.get_height()
 
     def moduli_squared_matrix(self) -> ComplexMatrix:
-        return ComplexMatrix(
-            [
-                [ComplexNumber(c.modulus_squared(), 0) for c in row]
-                for row in self._matrix
-            ]
-        )
+        data = self._data
+        new_data: list[float] = []
+        for k in range(0, len(data), 2):
+            new_data.append(data[k] * data[k] + data[k + 1] * data[k + 1])
+            new_data.append(0)
+        return self._from_packed(array("d", new_data), self._height, self._width)
 
     def is_diagonal(self) -> bool:
         if not self.is_square():
             return False
 
-        for i, row in enumerate(self._matrix):
-            for j, c in enumerate(row):
-                if i != j and c != zero:
+        data = self._data
+        for i in range(self._height):
+            for j in range(self._width):
+                k = 2 * (i * self._width + j)
+                if i != j and ComplexNumber(data[k], data[k + 1]) != zero:
                     return False
 
         return True
@@ -153,17 +239,13 @@ class ComplexMatrix:
                 or self.get_height() != other.get_height()
             ):
                 raise ValueError("Cannot add matrices of different sizes.")
-            new_matrix: list[list[ComplexNumber]] = []
-            for row_index in range(self.get_height()):
-                new_matrix.append(
-                    [
-                        i1 + i2
-                        for i1, i2 in zip(
-                            self.get_row(row_index), other.get_row(row_index)
-                        )
-                    ]
-                )
-            return ComplexMatrix(new_matrix)
+            if use_numpy():
+                return self._from_numpy(self._as_numpy() + other._as_numpy())
+            return self._from_packed(
+                array("d", map(operator.add, self._data, other._data)),
+                self._height,
+                self._width,
+            )
         elif _is_complex_matrixable(other):
             return self + ComplexMatrix(other)
         return NotImplemented
@@ -189,29 +271,35 @@ class ComplexMatrix:
                     "Cannot multiply matrices due to incorrect sizes: width of first"
                     f" {n1} is not equal to height of second {n2}"
                 )
-            n = n1  # Just to make naming clearer.
-            new_matrix: list[list[ComplexNumber]] = []
+            if use_numpy():
+                return self._from_numpy(self._as_numpy() @ other._as_numpy())
             # (m1 x m2)[j, k] = sum from h = 0 to h = n-1 of A[j, h] * B[h, k]
-            for j in range(m):
-                new_row: list[ComplexNumber] = []
-                for k in range(p):
-                    sum_ = ComplexNumber(0, 0)
-                    for h in range(n):
-                        sum_ += self.get_row(j)[h] * other.get_row(h)[k]
-                    new_row.append(sum_)
-                new_matrix.append(new_row)
-            return ComplexMatrix(new_matrix)
+            rows = self._complex_rows()
+            columns = list(zip(*other._complex_rows()))
+            return self._from_packed(
+                complex_to_packed(
+                    sum(map(operator.mul, row, column), 0j)
+                    for row in rows
+                    for column in columns
+                ),
+                m,
+                p,
+            )
         elif _is_complex_matrixable(other):
             return self * ComplexMatrix(other)
         else:
             return NotImplemented
 
     def __rmul__(self, other: object) -> ComplexMatrix:
-        if isinstance(other, ComplexNumber | int | float):
-            new_matrix: list[list[ComplexNumber]] = []
-            for row_index in range(self.get_height()):
-                new_matrix.append([(i * other) for i in self.get_row(row_index)])
-            return ComplexMatrix(new_matrix)
+        if isinstance(other, ComplexNumber | int | float | complex):
+            scalar = complex(other)
+            if use_numpy():
+                return self._from_numpy(self._as_numpy() * scalar)
+            return self._from_packed(
+                complex_to_packed(c * scalar for c in packed_to_complex(self._data)),
+                self._height,
+                self._width,
+            )
         elif _is_complex_matrixable(other):
             return ComplexMatrix(other) * self
         else:
@@ -221,13 +309,7 @@ class ComplexMatrix:
     def identity(cls, n: int) -> ComplexMatrix:
         if n <= 0:
             raise ValueError("Identity size must be a positive integer.")
-        matrix: list[list[ComplexNumber]] = []
-        for i in range(n):
-            row: list[ComplexNumber] = []
-            for j in range(n):
-                if i == j:  # Element on the diagonal
-                    row.append(ComplexNumber(1, 0))
-                else:
-                    row.append(ComplexNumber(0, 0))
-            matrix.append(row)
-        return cls(matrix)
+        data = array("d", bytes(16 * n * n))  # All zeros.
+        for i in range(n):  # Elements on the diagonal
+            data[2 * (i * n + i)] = 1
+        return cls._from_packed(data, n, n)
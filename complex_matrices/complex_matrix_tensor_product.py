@@ -1,29 +1,44 @@
-from typing import Optional
-
-from complex_numbers import ComplexNumber
+from complex_numbers import complex_to_packed, use_numpy
 
 from .complex_matrices import ComplexMatrix
+from .sparse_complex_matrices import SparseComplexMatrix, sparse_tensor_product
+
 
+def tensor_product(
+    m1: ComplexMatrix | SparseComplexMatrix, m2: ComplexMatrix | SparseComplexMatrix
+) -> ComplexMatrix | SparseComplexMatrix:
+    """The result is sparse if either matrix is sparse."""
+    if isinstance(m1, SparseComplexMatrix) or isinstance(m2, SparseComplexMatrix):
+        if isinstance(m1, ComplexMatrix):
+            m1 = SparseComplexMatrix.from_dense(m1)
+        if isinstance(m2, ComplexMatrix):
+            m2 = SparseComplexMatrix.from_dense(m2)
+        return sparse_tensor_product(m1, m2)
 
-def tensor_product(m1: ComplexMatrix, m2: ComplexMatrix) -> ComplexMatrix:
     m1_height = m1.get_height()
     m1_width = m1.get_width()
     m2_height = m2.get_height()
     m2_width = m2.get_width()
 
+    if use_numpy():
+        import numpy
+
+        return ComplexMatrix._from_numpy(numpy.kron(m1._as_numpy(), m2._as_numpy()))
+
     resultant_height = m1_height * m2_height
     resultant_width = m1_width * m2_width
-    new_matrix: list[list[Optional[ComplexNumber]]] = [
-        [None for _ in range(resultant_width)] for _ in range(resultant_height)
-    ]
-    for row1_index in range(m1_height):
-        row1 = m1.get_row(row1_index)
-        for column1_index, value1 in enumerate(row1):
-            for row2_index in range(m2_height):
-                row2 = m2.get_row(row2_index)
-                for column2_index, value2 in enumerate(row2):
-                    new_matrix[row1_index * m2_height + row2_index][
-                        column1_index * m2_width + column2_index
-                    ] = (value1 * value2)
-
-    return ComplexMatrix(new_matrix)  # type: ignore
+    rows1 = m1._complex_rows()
+    rows2 = m2._complex_rows()
+    # Row (row1_index * m2_height + row2_index) of the result is every
+    # row1[column1_index] * row2[column2_index], in that order.
+    return ComplexMatrix._from_packed(
+        complex_to_packed(
+            value1 * value2
+            for row1 in rows1
+            for row2 in rows2
+            for value1 in row1
+            for value2 in row2
+        ),
+        resultant_height,
+        resultant_width,
+    )
@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Iterable, Sequence
+
+from complex_numbers import ComplexNumber, complex_to_packed
+
+from .complex_matrices import ComplexMatrix, _is_complex_matrixable
+
+# A row of a sparse matrix, as (column index, value) pairs in column order.
+_SparseRow = list[tuple[int, complex]]
+
+
+def _to_complex(c: ComplexNumber | int | float | complex) -> complex:
+    if not isinstance(c, ComplexNumber | int | float | complex):
+        raise TypeError(
+            "Elements of a SparseComplexMatrix must be ComplexNumber, int, float or"
+            f" complex, not {type(c).__name__}."
+        )
+    return complex(c)
+
+
+class SparseComplexMatrix:
+    """A matrix that only stores its nonzero elements,
+    in compressed sparse row (CSR) form.
+
+    It supports the same operations as `ComplexMatrix`, and mixes freely with it:
+    combining two sparse matrices gives a sparse matrix,
+    and combining a sparse and a dense matrix gives a dense `ComplexMatrix`
+    (except for `tensor_product`, which stays sparse).
+    Memory and time scale with the number of nonzero elements.
+    """
+
+    # Nonzero elements, packed (see `complex_numbers.pack_complex_numbers`),
+    # in row order then column order.
+    _values: array[float]
+    # Column index of each nonzero element.
+    _column_indices: array[int]
+    # The nonzero elements of row i are those from index _row_pointers[i]
+    # up to (but not including) _row_pointers[i + 1].
+    _row_pointers: array[int]
+    _height: int
+    _width: int
+
+    def __init__(
+        self, matrix: Sequence[Sequence[ComplexNumber | int | float | complex]]
+    ) -> None:
+        """Each inner list is a row, as for `ComplexMatrix`. Zeros are not stored."""
+        try:
+            first_length = len(matrix[0])
+        except IndexError:  # empty list
+            raise TypeError(
+                "SparseComplexMatrix called with empty list (== []) as the matrix."
+            )
+        if first_length == 0:  # this means there is nothing in the items
+            raise ValueError("Cannot call SparseComplexMatrix with lists of length 0.")
+        for row in matrix:
+            if len(row) != first_length:
+                raise ValueError(
+                    "matrix passed to SparseComplexMatrix must have rows of consistent"
+                    " lengths."
+                )
+        rows: list[_SparseRow] = []
+        for row in matrix:
+            complex_row = [(j, _to_complex(c)) for j, c in enumerate(row)]
+            rows.append([(j, c) for j, c in complex_row if c != 0])
+        self._set_rows(rows, len(matrix), first_length)
+
+    def _set_rows(self, rows: list[_SparseRow], height: int, width: int) -> None:
+        self._values = complex_to_packed(c for row in rows for _, c in row)
+        self._column_indices = array("q", [j for row in rows for j, _ in row])
+        row_pointers = array("q", [0])
+        for row in rows:
+            row_pointers.append(row_pointers[-1] + len(row))
+        self._row_pointers = row_pointers
+        self._height = height
+        self._width = width
+
+    @classmethod
+    def _from_rows(
+        cls, rows: list[_SparseRow], height: int, width: int
+    ) -> SparseComplexMatrix:
+        """Create a matrix from its rows of (column index, value) pairs,
+        which must be in column order.
+        """
+        new = cls.__new__(cls)
+        new._set_rows(rows, height, width)
+        return new
+
+    @classmethod
+    def from_coordinates(
+        cls,
+        height: int,
+        width: int,
+        entries: Iterable[tuple[int, int, ComplexNumber | int | float | complex]],
+    ) -> SparseComplexMatrix:
+        """Create a matrix from (row index, column index, value) triples
+        (coordinate, or COO, form). Values given for the same position are summed.
+        """
+        if height <= 0 or width <= 0:
+            raise ValueError("SparseComplexMatrix size must be positive.")
+        row_dicts: list[dict[int, complex]] = [{} for _ in range(height)]
+        for i, j, c in entries:
+            if not (0 <= i < height and 0 <= j < width):
+                raise ValueError("Invalid index.")
+            row_dicts[i][j] = row_dicts[i].get(j, 0) + _to_complex(c)
+        return cls._from_rows(
+            [sorted((j, c) for j, c in d.items() if c != 0) for d in row_dicts],
+            height,
+            width,
+        )
+
+    @classmethod
+    def from_dense(cls, m: ComplexMatrix) -> SparseComplexMatrix:
+        return cls._from_rows(
+            [
+                [(j, c) for j, c in enumerate(row) if c != 0]
+                for row in m.to_complex_list()
+            ],
+            m.get_height(),
+            m.get_width(),
+        )
+
+    def to_dense(self) -> ComplexMatrix:
+        return ComplexMatrix._from_packed(
+            complex_to_packed(c for row in self._dense_rows() for c in row),
+            self._height,
+            self._width,
+        )
+
+    @classmethod
+    def identity(cls, n: int) -> SparseComplexMatrix:
+        if n <= 0:
+            raise ValueError("Identity size must be a positive integer.")
+        return cls._from_rows([[(i, 1 + 0j)] for i in range(n)], n, n)
+
+    def _row(self, i: int) -> _SparseRow:
+        values = self._values
+        column_indices = self._column_indices
+        return [
+            (column_indices[k], complex(values[2 * k], values[2 * k + 1]))
+            for k in range(self._row_pointers[i], self._row_pointers[i + 1])
+        ]
+
+    def _rows(self) -> list[_SparseRow]:
+        return [self._row(i) for i in range(self._height)]
+
+    def _dense_rows(self) -> list[list[complex]]:
+        dense_rows: list[list[complex]] = []
+        for row in self._rows():
+            dense_row = [0j] * self._width
+            for j, c in row:
+                dense_row[j] = c
+            dense_rows.append(dense_row)
+        return dense_rows
+
+    def csr_buffers(self) -> tuple[memoryview, memoryview, memoryview]:
+        """Views of the packed nonzero values, their column indices,
+        and the row pointers (see the class attributes), without copying.
+        """
+        return (
+            memoryview(self._values),
+            memoryview(self._column_indices),
+            memoryview(self._row_pointers),
+        )
+
+    def number_of_nonzeros(self) -> int:
+        return len(self._column_indices)
+
+    def get_width(self) -> int:
+        """Get length of a row."""
+        return self._width
+
+    def get_height(self) -> int:
+        """Get height of a column."""
+        return self._height
+
+    def get_row(self, i: int) -> list[ComplexNumber]:
+        if i < 0 or i >= self.get_height():  # equal to get_height because of 0 indexing
+            raise ValueError("Invalid index.")
+        row = [ComplexNumber(0, 0) for _ in range(self._width)]
+        for j, c in self._row(i):
+            row[j] = ComplexNumber.new_from_complex(c)
+        return row
+
+    def get_column(self, i: int) -> list[ComplexNumber]:
+        if i < 0 or i >= self.get_width():  # equal to get_width because of 0 indexing
+            raise ValueError("Invalid index.")
+        column = [ComplexNumber(0, 0) for _ in range(self._height)]
+        values = self._values
+        for row_index in range(self._height):
+            for k in range(
+                self._row_pointers[row_index], self._row_pointers[row_index + 1]
+            ):
+                if self._column_indices[k] == i:
+                    column[row_index] = ComplexNumber(values[2 * k], values[2 * k + 1])
+        return column
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, SparseComplexMatrix):
+            if (
+                self.get_width() != other.get_width()
+                or self.get_height() != other.get_height()
+            ):
+                return False
+            # Compare as ComplexNumber.__eq__ does, treating missing elements as 0.
+            for row1, row2 in zip(self._rows(), other._rows()):
+                row_dict1 = dict(row1)
+                row_dict2 = dict(row2)
+                for j in row_dict1.keys() | row_dict2.keys():
+                    c1 = row_dict1.get(j, 0j)
+                    c2 = row_dict2.get(j, 0j)
+                    if not (
+                        math.isclose(c1.real, c2.real, abs_tol=1e-8)
+                        and math.isclose(c1.imag, c2.imag, abs_tol=1e-8)
+                    ):
+                        return False
+            return True
+        elif isinstance(other, ComplexMatrix | list):
+            return self.to_dense() == other
+        else:
+            return NotImplemented
+
+    def inverse(self) -> SparseComplexMatrix:
+        return self._from_rows(
+            [[(j, -c) for j, c in row] for row in self._rows()],
+            self._height,
+            self._width,
+        )
+
+    def conjugate(self) -> SparseComplexMatrix:
+        return self._from_rows(
+            [[(j, c.conjugate()) for j, c in row] for row in self._rows()],
+            self._height,
+            self._width,
+        )
+
+    def transpose(self) -> SparseComplexMatrix:
+        new_rows: list[_SparseRow] = [[] for _ in range(self._width)]
+        # Going through the rows in order keeps each new row in column order.
+        for i, row in enumerate(self._rows()):
+            for j, c in row:
+                new_rows[j].append((i, c))
+        return self._from_rows(new_rows, self._width, self._height)
+
+    def adjoint(self) -> SparseComplexMatrix:
+        return self.transpose().conjugate()
+
+    def is_hermitian(self) -> bool:
+        return self == self.adjoint()
+
+    def is_unitary(self) -> bool:
+        self_times_adjoint = self * self.adjoint()
+        return self_times_adjoint == self.identity(self_times_adjoint.get_width())
+
+    def is_square(self) -> bool:
+        return self.get_width() == self.get_height()
+
+    def moduli_squared_matrix(self) -> SparseComplexMatrix:
+        return self._from_rows(
+            [
+                [(j, complex(c.real * c.real + c.imag * c.imag, 0)) for j, c in row]
+                for row in self._rows()
+            ],
+            self._height,
+            self._width,
+        )
+
+    def is_diagonal(self) -> bool:
+        if not self.is_square():
+            return False
+
+        return all(
+            j == i or c == 0 for i, row in enumerate(self._rows()) for j, c in row
+        )
+
+    def __add__(self, other: object) -> SparseComplexMatrix | ComplexMatrix:
+        if isinstance(other, SparseComplexMatrix):
+            if (
+                self.get_width() != other.get_width()
+                or self.get_height() != other.get_height()
+            ):
+                raise ValueError("Cannot add matrices of different sizes.")
+            new_rows: list[_SparseRow] = []
+            for row1, row2 in zip(self._rows(), other._rows()):
+                row_sum = dict(row1)
+                for j, c in row2:
+                    row_sum[j] = row_sum.get(j, 0) + c
+                new_rows.append(sorted((j, c) for j, c in row_sum.items() if c != 0))
+            return self._from_rows(new_rows, self._height, self._width)
+        elif isinstance(other, ComplexMatrix):
+            return self.to_dense() + other
+        elif _is_complex_matrixable(other):
+            return self + ComplexMatrix(other)
+        return NotImplemented
+
+    def __radd__(self, other: object) -> SparseComplexMatrix | ComplexMatrix:
+        return self + other
+
+    def __mul__(self, other: object) -> SparseComplexMatrix | ComplexMatrix:
+        """Multiply an m x n matrix by a n x p matrix, to produce a m x p matrix.
+
+        Raises ValueError if sizes are not correct.
+        """
+        if isinstance(other, SparseComplexMatrix | ComplexMatrix):
+            n1 = self.get_width()  # n according to self
+            n2 = other.get_height()  # n according to other
+            p = other.get_width()
+            if n1 != n2:
+                raise ValueError(
+                    "Cannot multiply matrices due to incorrect sizes: width of first"
+                    f" {n1} is not equal to height of second {n2}"
+                )
+            if isinstance(other, ComplexMatrix):
+                # Row j of the product is the sum of A[j, h] * (row h of B).
+                other_rows = other.to_complex_list()
+                dense_rows: list[list[complex]] = []
+                for row in self._rows():
+                    new_row = [0j] * p
+                    for h, a in row:
+                        for k, b in enumerate(other_rows[h]):
+                            new_row[k] += a * b
+                    dense_rows.append(new_row)
+                return ComplexMatrix._from_packed(
+                    complex_to_packed(c for row in dense_rows for c in row),
+                    self._height,
+                    p,
+                )
+            other_sparse_rows = other._rows()
+            new_rows: list[_SparseRow] = []
+            for row in self._rows():
+                row_product: dict[int, complex] = {}
+                for h, a in row:
+                    for k, b in other_sparse_rows[h]:
+                        row_product[k] = row_product.get(k, 0) + a * b
+                new_rows.append(
+                    sorted((k, c) for k, c in row_product.items() if c != 0)
+                )
+            return self._from_rows(new_rows, self._height, p)
+        elif _is_complex_matrixable(other):
+            return self * ComplexMatrix(other)
+        else:
+            return NotImplemented
+
+    def __rmul__(self, other: object) -> SparseComplexMatrix | ComplexMatrix:
+        if isinstance(other, ComplexNumber | int | float | complex):
+            scalar = complex(other)
+            return self._from_rows(
+                [
+                    [(j, c * scalar) for j, c in row if c * scalar != 0]
+                    for row in self._rows()
+                ],
+                self._height,
+                self._width,
+            )
+        elif isinstance(other, ComplexMatrix):
+            m = other.get_height()
+            n1 = other.get_width()
+            n2 = self.get_height()
+            if n1 != n2:
+                raise ValueError(
+                    "Cannot multiply matrices due to incorrect sizes: width of first"
+                    f" {n1} is not equal to height of second {n2}"
+                )
+            # Column k of the product is the sum of (column h of A) * B[h, k].
+            other_rows = other.to_complex_list()
+            dense_rows = [[0j] * self._width for _ in range(m)]
+            for h, row in enumerate(self._rows()):
+                for k, b in row:
+                    for j in range(m):
+                        dense_rows[j][k] += other_rows[j][h] * b
+            return ComplexMatrix._from_packed(
+                complex_to_packed(c for row in dense_rows for c in row),
+                m,
+                self._width,
+            )
+        elif _is_complex_matrixable(other):
+            return ComplexMatrix(other) * self
+        else:
+            return NotImplemented
+
+
+def sparse_tensor_product(
+    m1: SparseComplexMatrix, m2: SparseComplexMatrix
+) -> SparseComplexMatrix:
+    m2_height = m2.get_height()
+    m2_width = m2.get_width()
+    rows2 = m2._rows()
+    new_rows: list[_SparseRow] = []
+    for row1 in m1._rows():
+        for row2 in rows2:
+            new_rows.append(
+                [
+                    (column1_index * m2_width + column2_index, value1 * value2)
+                    for column1_index, value1 in row1
+                    for column2_index, value2 in row2
+                ]
+            )
+    return SparseComplexMatrix._from_rows(
+        new_rows, m1.get_height() * m2_height, m1.get_width() * m2_width
+    )
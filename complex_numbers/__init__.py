@@ -1,2 +1,14 @@
 # type: ignore
+from .complex_number_arrays import (
+    complex_number_at,
+    complex_to_packed,
+    numpy_to_packed,
+    pack_complex_numbers,
+    packed_all_close,
+    packed_to_complex,
+    packed_to_numpy,
+    packed_view,
+    unpack_complex_numbers,
+    use_numpy,
+)
 from .complex_numbers import ComplexNumber
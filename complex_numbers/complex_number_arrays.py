@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Any, Iterable, Sequence
+
+from .complex_numbers import ComplexNumber
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    # NumPy is optional: everything has a pure Python fallback.
+    numpy = None
+
+
+def pack_complex_numbers(
+    values: Iterable[ComplexNumber | int | float | complex],
+) -> array[float]:
+    """Pack values into a contiguous `array("d")`.
+
+    Real and imaginary parts are interleaved, so element `i` is stored at
+    indices `2 * i` (real part) and `2 * i + 1` (imaginary part).
+    This is the same memory layout as an array of C `double complex`
+    (or NumPy `complex128`) values.
+    """
+    floats: list[float] = []
+    for c in values:
+        if isinstance(c, ComplexNumber):
+            floats.append(c.get_real())
+            floats.append(c.get_imaginary())
+        elif isinstance(c, int | float | complex):
+            floats.append(c.real)
+            floats.append(c.imag)
+        else:
+            raise TypeError(
+                "Values to pack must be ComplexNumber, int, float or complex, not"
+                f" {type(c).__name__}."
+            )
+    return array("d", floats)
+
+
+def packed_view(buffer: Any) -> memoryview:
+    """View an object supporting the buffer protocol as packed data, without copying.
+
+    `buffer` must be C-contiguous and hold interleaved doubles
+    (such as an `array("d")`), complex doubles (such as a NumPy `complex128` array)
+    or raw bytes in that layout (such as a `bytearray` or an `mmap`).
+    """
+    view = memoryview(buffer)
+    if view.format not in ("d", "Zd", "B"):
+        raise TypeError(
+            "Buffer must hold doubles, complex doubles or bytes, not format"
+            f" {view.format!r}."
+        )
+    if not view.c_contiguous:
+        raise ValueError("Buffer must be C-contiguous.")
+    if view.nbytes % 16 != 0:
+        raise ValueError("Buffer must hold a whole number of complex values.")
+    return view.cast("B").cast("d")
+
+
+def complex_number_at(data: Sequence[float], index: int) -> ComplexNumber:
+    """Create the `ComplexNumber` stored at element `index` of packed `data`."""
+    return ComplexNumber(data[2 * index], data[2 * index + 1])
+
+
+def unpack_complex_numbers(data: Sequence[float]) -> list[ComplexNumber]:
+    return [ComplexNumber(data[k], data[k + 1]) for k in range(0, len(data), 2)]
+
+
+def packed_to_complex(data: Sequence[float]) -> list[complex]:
+    """Read packed `data` as a list of builtin `complex`,
+    which is much faster to do arithmetic on than `ComplexNumber`.
+    """
+    return [complex(data[k], data[k + 1]) for k in range(0, len(data), 2)]
+
+
+def complex_to_packed(values: Iterable[complex]) -> array[float]:
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return numpy_to_packed(values)
+    floats: list[float] = []
+    for c in values:
+        floats.append(c.real)
+        floats.append(c.imag)
+    return array("d", floats)
+
+
+def use_numpy() -> bool:
+    """Whether the vectorized NumPy code paths are available."""
+    return numpy is not None
+
+
+def packed_to_numpy(data: array[float], shape: tuple[int, ...]) -> Any:
+    """View packed `data` as a `complex128` NumPy array, without copying.
+
+    Only call this if `use_numpy()`.
+    """
+    assert numpy is not None
+    return numpy.frombuffer(data, dtype=numpy.complex128).reshape(shape)
+
+
+def numpy_to_packed(values: Any) -> array[float]:
+    """Only call this if `use_numpy()`."""
+    assert numpy is not None
+    packed = array("d")
+    packed.frombytes(numpy.ascontiguousarray(values, dtype=numpy.complex128).tobytes())
+    return packed
+
+
+def packed_all_close(data1: array[float], data2: array[float]) -> bool:
+    """Whether every pair of parts is equal to within the tolerance of
+    `ComplexNumber.__eq__`.
+    """
+    if len(data1) != len(data2):
+        return False
+    if numpy is not None:
+        x = numpy.frombuffer(data1)
+        y = numpy.frombuffer(data2)
+        tolerance = numpy.maximum(1e-9 * numpy.maximum(abs(x), abs(y)), 1e-8)
+        return bool(numpy.all(abs(x - y) <= tolerance))
+    return all(math.isclose(x, y, abs_tol=1e-8) for x, y in zip(data1, data2))
@@ -4,6 +4,7 @@ import math
 
 
 class ComplexNumber:
+    __slots__ = ("_re", "_im")
     _re: float
     _im: float
 
@@ -49,9 +50,16 @@ class ComplexNumber:
             return math.isclose(self._re, other._re, abs_tol=1e-8) and math.isclose(
                 self._im, other._im, abs_tol=1e-8
             )
+        elif isinstance(other, complex):
+            return math.isclose(self._re, other.real, abs_tol=1e-8) and math.isclose(
+                self._im, other.imag, abs_tol=1e-8
+            )
         else:
             return False
 
+    def __complex__(self) -> complex:
+        return complex(self._re, self._im)
+
     def modulus(self) -> float:
         return math.sqrt(self.modulus_squared())
 
@@ -70,6 +78,10 @@ class ComplexNumber:
     def new_from_polar(r: float, theta: float) -> ComplexNumber:
         return ComplexNumber(r * math.cos(theta), r * math.sin(theta))
 
+    @staticmethod
+    def new_from_complex(c: complex) -> ComplexNumber:
+        return ComplexNumber(c.real, c.imag)
+
     def inverse(self) -> ComplexNumber:
         return ComplexNumber(-self._re, -self._im)
 
@@ -100,6 +112,8 @@ class ComplexNumber:
             return ComplexNumber(self._re + other._re, self._im + other._im)
         elif isinstance(other, int | float):
             return ComplexNumber(self._re + other, self._im)
+        elif isinstance(other, complex):
+            return ComplexNumber(self._re + other.real, self._im + other.imag)
         else:
             return NotImplemented
 
@@ -108,15 +122,21 @@ class ComplexNumber:
 
     def __sub__(self, other: object) -> ComplexNumber:
         if isinstance(other, ComplexNumber):
-            return self + other.inverse()
+            return ComplexNumber(self._re - other._re, self._im - other._im)
         elif isinstance(other, int | float):
             return ComplexNumber(self._re - other, self._im)
+        elif isinstance(other, complex):
+            return ComplexNumber(self._re - other.real, self._im - other.imag)
         else:
             return NotImplemented
 
     def __rsub__(self, other: object) -> ComplexNumber:
-        if isinstance(other, ComplexNumber | int | float):
-            return other + self.inverse()
+        if isinstance(other, ComplexNumber):
+            return ComplexNumber(other._re - self._re, other._im - self._im)
+        elif isinstance(other, int | float):
+            return ComplexNumber(other - self._re, -self._im)
+        elif isinstance(other, complex):
+            return ComplexNumber(other.real - self._re, other.imag - self._im)
         else:
             return NotImplemented
 
@@ -127,6 +147,11 @@ class ComplexNumber:
             new_real: float = (self._re * other._re) - (self._im * other._im)
             new_imaginary: float = (self._im * other._re) + (self._re * other._im)
             return ComplexNumber(new_real, new_imaginary)
+        elif isinstance(other, complex):
+            return ComplexNumber(
+                (self._re * other.real) - (self._im * other.imag),
+                (self._im * other.real) + (self._re * other.imag),
+            )
         else:
             return NotImplemented
 
@@ -136,14 +161,23 @@ class ComplexNumber:
     def __truediv__(self, other: object) -> ComplexNumber:
         if isinstance(other, int | float):
             return ComplexNumber(self._re / other, self._im / other)
+        if isinstance(other, complex):
+            other = ComplexNumber.new_from_complex(other)
         if not isinstance(other, ComplexNumber):
             return NotImplemented
+        # self * other.conjugate() / |other|^2, without the intermediate objects.
         modulus_squared = other.modulus_squared()
-        return (self * other.conjugate()) / modulus_squared
+        return ComplexNumber(
+            ((self._re * other._re) + (self._im * other._im)) / modulus_squared,
+            ((self._im * other._re) - (self._re * other._im)) / modulus_squared,
+        )
 
     def __rtruediv__(self, other: object) -> ComplexNumber:
         if isinstance(other, int | float):
-            return (other * self.conjugate()) / self.modulus_squared()
+            scale = other / self.modulus_squared()
+            return ComplexNumber(self._re * scale, -self._im * scale)
+        elif isinstance(other, complex):
+            return ComplexNumber.new_from_complex(other) / self
         # other should never ComplexNumber
         else:
             return NotImplemented
@@ -4,14 +4,18 @@ from .complex_vectors import ComplexVector
 
 
 def complex_vector_inner_product(v1: ComplexVector, v2: ComplexVector) -> ComplexNumber:
-    if (size := len(v1)) != len(v2):
+    if len(v1) != len(v2):
         raise ValueError(
             "You can only take the inner product of ComplexVectors of the same length."
         )
-    total = ComplexNumber(0, 0)
-    for i in range(size):
-        total += v1[i].conjugate() * v2[i]
-    return total
+    total = sum(
+        (
+            c1.conjugate() * c2
+            for c1, c2 in zip(v1.to_complex_list(), v2.to_complex_list())
+        ),
+        0j,
+    )
+    return ComplexNumber.new_from_complex(total)
 
 
 def complex_vector_distance(v1: ComplexVector, v2: ComplexVector) -> float:
@@ -21,4 +25,7 @@ def complex_vector_distance(v1: ComplexVector, v2: ComplexVector) -> float:
 def complex_vector_tensor_product(
     v1: ComplexVector, v2: ComplexVector
 ) -> ComplexVector:
-    return ComplexVector([c1 * c2 for c1 in v1 for c2 in v2])
+    values2 = v2.to_complex_list()
+    return ComplexVector.from_complex(
+        c1 * c2 for c1 in v1.to_complex_list() for c2 in values2
+    )
@@ -1,25 +1,77 @@
 from __future__ import annotations
 
 import math
-from typing import Sequence
+import operator
+from array import array
+from typing import Any, Iterable, Iterator, Sequence
 
-from complex_numbers import ComplexNumber
+from complex_numbers import (
+    ComplexNumber,
+    complex_to_packed,
+    pack_complex_numbers,
+    packed_to_complex,
+    packed_view,
+)
 
 
 class ComplexVector:
-    _vector: list[ComplexNumber]
-
-    def __init__(self, complex_values: Sequence[ComplexNumber | float | int]) -> None:
-        self._vector = [
-            ComplexNumber(c, 0) if isinstance(c, int) or isinstance(c, float) else c
-            for c in complex_values
-        ]
+    _data: array[float] | memoryview
+
+    def __init__(
+        self, complex_values: Sequence[ComplexNumber | float | int | complex]
+    ) -> None:
+        """The values are stored packed in a contiguous `array("d")`
+        (see `complex_numbers.pack_complex_numbers`);
+        `ComplexNumber`s are only created when a caller asks for them.
+        """
+        self._data = pack_complex_numbers(complex_values)
+
+    @classmethod
+    def _from_packed(cls, data: array[float] | memoryview) -> ComplexVector:
+        new = cls.__new__(cls)
+        new._data = data
+        return new
+
+    @classmethod
+    def from_complex(cls, values: Iterable[complex]) -> ComplexVector:
+        """Create a vector from builtin `complex` values (or a NumPy array),
+        without creating any `ComplexNumber`s.
+        """
+        return cls._from_packed(complex_to_packed(values))
+
+    @classmethod
+    def from_buffer(cls, buffer: Any) -> ComplexVector:
+        """Create a vector that uses `buffer`'s memory as its storage, without copying.
+
+        See `complex_numbers.packed_view` for which buffers are accepted,
+        e.g. a NumPy `complex128` array.
+        """
+        return cls._from_packed(packed_view(buffer))
+
+    def to_complex_list(self) -> list[complex]:
+        return packed_to_complex(self._data)
+
+    def to_buffer(self) -> memoryview:
+        """A view of the packed storage (interleaved real and imaginary parts,
+        format `"d"`), without copying.
+        """
+        return memoryview(self._data)
 
     def __getitem__(self, n: int) -> ComplexNumber:
-        return self._vector[n]
+        length = len(self)
+        if n < 0:
+            n += length
+        if n < 0 or n >= length:
+            raise IndexError("ComplexVector index out of range.")
+        return ComplexNumber(self._data[2 * n], self._data[2 * n + 1])
+
+    def __iter__(self) -> Iterator[ComplexNumber]:
+        data = self._data
+        for k in range(0, len(data), 2):
+            yield ComplexNumber(data[k], data[k + 1])
 
     def __len__(self) -> int:
-        return len(self._vector)
+        return len(self._data) // 2
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, ComplexVector | list):
@@ -34,13 +86,13 @@ class ComplexVector:
         return True
 
     def inverse(self) -> ComplexVector:
-        return ComplexVector([c.inverse() for c in self._vector])
+        return self._from_packed(array("d", [-x for x in self._data]))
 
     def norm(self) -> float:
         return math.sqrt(self.norm_squared())
 
     def norm_squared(self) -> float:
-        return sum(c.modulus_squared() for c in self)
+        return sum(x * x for x in self._data)
 
     def __add__(self, other: object) -> ComplexVector:
         if isinstance(other, ComplexVector):
@@ -48,9 +100,11 @@ class ComplexVector:
             # other is, since + will take care of this.
             if len(self) != len(other):
                 raise ValueError("You can only add ComplexVectors of the same length.")
-            return ComplexVector([self[i] + other[i] for i in range(len(self))])
+            return self._from_packed(
+                array("d", map(operator.add, self._data, other._data))
+            )
         elif isinstance(other, list):
-            if not all(isinstance(c, ComplexNumber | int | float) for c in other):  # type: ignore
+            if not all(isinstance(c, ComplexNumber | int | float | complex) for c in other):  # type: ignore
                 return NotImplemented
             return self + ComplexVector(other)  # type: ignore
         else:
@@ -63,7 +117,7 @@ class ComplexVector:
         if isinstance(other, ComplexVector):
             return self + other.inverse()
         elif isinstance(other, list):
-            if not all(isinstance(c, ComplexNumber | int | float) for c in other):  # type: ignore
+            if not all(isinstance(c, ComplexNumber | int | float | complex) for c in other):  # type: ignore
                 return NotImplemented
             return self - ComplexVector(other)  # type: ignore
         else:
@@ -74,7 +128,10 @@ class ComplexVector:
 
     def __rmul__(self, other: object) -> ComplexVector:
         """Left multiplication by a scalar. The matrix is on the right of the scalar."""
-        if isinstance(other, ComplexNumber | int | float):
-            return ComplexVector([(c * other) for c in self._vector])
+        if isinstance(other, ComplexNumber | int | float | complex):
+            scalar = complex(other)
+            return self._from_packed(
+                complex_to_packed(c * scalar for c in packed_to_complex(self._data))
+            )
         else:
             return NotImplemented
@@ -1,6 +1,6 @@
 import math
 
-from complex_matrices import ComplexMatrix
+from complex_matrices import ComplexMatrix, SparseComplexMatrix
 from complex_numbers import ComplexNumber
 from complex_vectors import ComplexVector
 from shared import complex_matrix_vector_multiply
@@ -14,7 +14,7 @@ class MarbleGame:
         nodes: int,
         marble_count: int,
         initial_state: ComplexVector,
-        movement_matrix: ComplexMatrix,
+        movement_matrix: ComplexMatrix | SparseComplexMatrix,
     ) -> None:
         """Create marble game.
 
@@ -24,7 +24,8 @@ class MarbleGame:
         where each element is an integer.
         Sum of initial states must be `marble_count`.
         Length must be `nodes`.
-        `movement_matrix`: how marbles move (`ComplexMatrix`).
+        `movement_matrix`: how marbles move (`ComplexMatrix`,
+        or `SparseComplexMatrix` since most of it is zeros).
         There must be exactly one
         `1` per column, everything else must be `0`.
 
@@ -89,14 +90,16 @@ class MarbleGame:
             )
 
     @classmethod
-    def _check_movement_matrix(cls, movement_matrix: ComplexMatrix, nodes: int) -> None:
+    def _check_movement_matrix(
+        cls, movement_matrix: ComplexMatrix | SparseComplexMatrix, nodes: int
+    ) -> None:
         cls._check_movement_matrix_shape_and_size(movement_matrix, nodes)
         cls._check_movement_matrix_legal_values(movement_matrix, nodes)
         cls._check_movement_matrix_column_sum(movement_matrix, nodes)
 
     @staticmethod
     def _check_movement_matrix_shape_and_size(
-        movement_matrix: ComplexMatrix, nodes: int
+        movement_matrix: ComplexMatrix | SparseComplexMatrix, nodes: int
     ) -> None:
         if not movement_matrix.is_square():
             raise ValueError("movement_matrix must be a square matrix.")
@@ -108,7 +111,7 @@ class MarbleGame:
 
     @staticmethod
     def _check_movement_matrix_legal_values(
-        movement_matrix: ComplexMatrix, nodes: int
+        movement_matrix: ComplexMatrix | SparseComplexMatrix, nodes: int
     ) -> None:
         for i in range(nodes):
             if any(
@@ -119,7 +122,7 @@ class MarbleGame:
 
     @staticmethod
     def _check_movement_matrix_column_sum(
-        movement_matrix: ComplexMatrix, nodes: int
+        movement_matrix: ComplexMatrix | SparseComplexMatrix, nodes: int
     ) -> None:
         for column_index in range(nodes):
             column_sum = zero
@@ -132,9 +135,17 @@ class MarbleGame:
         if iterations < 0:
             raise ValueError("Iterations must be positive or 0.")
 
-        new_state = self.initial_state
-        for _ in range(iterations):
-            new_state = complex_matrix_vector_multiply(self.movement_matrix, new_state)
+        if iterations == 0:
+            return self.initial_state
+
+        new_state = complex_matrix_vector_multiply(
+            self.movement_matrix, self.initial_state
+        )
+        # Update new_state in place, rather than creating a vector every iteration.
+        for _ in range(iterations - 1):
+            complex_matrix_vector_multiply(
+                self.movement_matrix, new_state, out=new_state
+            )
 
         return new_state
 
@@ -145,7 +156,7 @@ class ProbabilisticMarbleGame(MarbleGame):
         nodes: int,
         marble_count: int,
         initial_state: ComplexVector,
-        movement_matrix: ComplexMatrix,
+        movement_matrix: ComplexMatrix | SparseComplexMatrix,
     ) -> None:
         super().__init__(nodes, marble_count, initial_state, movement_matrix)
 
@@ -156,7 +167,7 @@ class ProbabilisticMarbleGame(MarbleGame):
 
     @staticmethod
     def _check_movement_matrix_legal_values(
-        movement_matrix: ComplexMatrix, nodes: int
+        movement_matrix: ComplexMatrix | SparseComplexMatrix, nodes: int
     ) -> None:
         for i in range(nodes):
             if any(
@@ -175,7 +186,7 @@ class QuantumMarbleGame(MarbleGame):
         nodes: int,
         marble_count: int,
         initial_state: ComplexVector,
-        movement_matrix: ComplexMatrix,
+        movement_matrix: ComplexMatrix | SparseComplexMatrix,
     ) -> None:
         super().__init__(nodes, marble_count, initial_state, movement_matrix)
 
@@ -198,7 +209,7 @@ class QuantumMarbleGame(MarbleGame):
 
     @staticmethod
     def _check_movement_matrix_legal_values(
-        movement_matrix: ComplexMatrix, nodes: int
+        movement_matrix: ComplexMatrix | SparseComplexMatrix, nodes: int
     ) -> None:
         # All numbers are valid.
         # Size will be verified by column sum.
@@ -206,7 +217,7 @@ class QuantumMarbleGame(MarbleGame):
 
     @staticmethod
     def _check_movement_matrix_column_sum(
-        movement_matrix: ComplexMatrix, nodes: int
+        movement_matrix: ComplexMatrix | SparseComplexMatrix, nodes: int
     ) -> None:
         for column_index in range(nodes):
             column_sum = sum(
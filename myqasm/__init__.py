@@ -3,15 +3,58 @@ from .myqasm import (
     MYQASM,
     InvalidMYQASMSyntaxError,
     KeywordEnum,
+    MYQASM_compile,
     MYQASM_lexer,
     MYQASMCONCATDifferentSizeGatesError,
     MYQASMGateAndRegisterDifferentSizeGatesError,
     MYQASMGateDoesNotExistError,
+    MYQASMInstruction,
+    MYQASMInvalidQubitsError,
+    MYQASMParameterError,
     MYQASMRedefineBuiltinGateError,
     MYQASMRedefineRegisterError,
     MYQASMRedefineUserGateError,
+    MYQASMRegister,
     MYQASMRegisterDoesNotExistError,
+    MYQASMRegisterTypeError,
+    MYQASMResult,
+    MYQASMSession,
+    MYQASMSnapshot,
+    MYQASMUnsupportedGateError,
     TokenNameEnum,
+    clear_builtin_gate_cache,
+    get_builtin_gate_cache_info,
+    get_default_session,
     get_registers,
+    get_subregisters,
     get_user_defined_gates,
 )
+from .myqasm_density import (
+    DensityMatrixRegister,
+    amplitude_damping_channel,
+    dephasing_channel,
+    depolarizing_channel,
+)
+from .myqasm_gates import IdentityGate, KroneckerGate, MYQASMGate
+from .myqasm_mapped import DEFAULT_BLOCK_QUBITS, MappedRegister
+from .myqasm_mps import (
+    DEFAULT_MAX_BOND_DIMENSION,
+    DEFAULT_TRUNCATION_THRESHOLD,
+    MPSRegister,
+)
+from .myqasm_optimiser import DEFAULT_MAX_FUSION_WIDTH, optimise_instructions
+from .myqasm_profiler import MYQASMInstructionProfile, MYQASMProfiler
+from .myqasm_program import (
+    STABILIZER_MIN_QUBITS,
+    MYQASMProgram,
+    is_clifford_program,
+    run_variants,
+)
+from .myqasm_shared_memory import (
+    DEFAULT_SHARED_BLOCK_QUBITS,
+    SHARED_MIN_QUBITS,
+    SharedMemoryRegister,
+    get_worker_pool,
+    shutdown_worker_pools,
+)
+from .myqasm_stabilizer import StabilizerRegister, clifford_decomposition
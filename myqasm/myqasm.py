@@ -1,21 +1,58 @@
+from __future__ import annotations
+
 import math
 import random
+import time
+from array import array
+from collections import Counter
 from enum import Enum, auto
-from typing import Optional
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Mapping, Optional, Sequence
 
-from complex_matrices import ComplexMatrix, tensor_product
+from complex_matrices import ComplexMatrix, SparseComplexMatrix
 from complex_numbers import ComplexNumber
 from complex_vectors import ComplexVector
-from shared import complex_matrix_vector_multiply
+from shared import (
+    outcome_probability,
+    pauli_expectation_values,
+    project_qubits,
+    qubit_count as _qubit_count,
+    qubit_probabilities,
+    sample_outcomes,
+)
+
+from .myqasm_density import (
+    DensityMatrixRegister,
+    amplitude_damping_channel,
+    dephasing_channel,
+    depolarizing_channel,
+)
+from .myqasm_gates import (
+    IdentityGate,
+    MYQASMGate,
+    apply_gate,
+    concat_gates,
+    tensor_gates,
+)
+from .myqasm_mapped import MappedRegister
+from .myqasm_mps import (
+    DEFAULT_MAX_BOND_DIMENSION,
+    DEFAULT_TRUNCATION_THRESHOLD,
+    MPSRegister,
+)
+from .myqasm_shared_memory import SharedMemoryRegister
+from .myqasm_stabilizer import StabilizerRegister
+
+if TYPE_CHECKING:
+    from .myqasm_profiler import MYQASMProfiler
 
 one_over_root_two = 1 / math.sqrt(2)
 _hadamard_matrix = ComplexMatrix(
     [[one_over_root_two, one_over_root_two], [one_over_root_two, -one_over_root_two]]
 )
-_CNOT_matrix = ComplexMatrix([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]])
-
-_registers: dict[str, ComplexVector] = {}
-_user_defined_gates: dict[str, ComplexMatrix] = {}
+_CNOT_matrix = SparseComplexMatrix(
+    [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]]
+)
 
 
 class TokenNameEnum(Enum):
@@ -33,6 +70,20 @@ class KeywordEnum(Enum):
     INVERSE = auto()
     APPLY = auto()
     MEASURE = auto()
+    NOISE = auto()
+    EXPECT = auto()
+    PROB = auto()
+    FORK = auto()
+    # Register types, which can follow INITIALIZE.
+    STABILIZER = auto()
+    MPS = auto()
+    DENSITY = auto()
+    MAPPED = auto()
+    SHARED = auto()
+    # Noise channels, which follow NOISE.
+    DEPOLARIZING = auto()
+    AMPLITUDE_DAMPING = auto()
+    DEPHASING = auto()
 
 
 class InvalidMYQASMSyntaxError(Exception):
@@ -75,15 +126,53 @@ class MYQASMGateAndRegisterDifferentSizeGatesError(Exception):
         super().__init__(*args)
 
 
-def get_registers():
-    return _registers
+class MYQASMInvalidQubitsError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
 
 
-def get_user_defined_gates():
-    return _user_defined_gates
+class MYQASMUnsupportedGateError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
 
 
-def _is_builtin_gate(identifier: str) -> bool:
+class MYQASMRegisterTypeError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+class MYQASMParameterError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+# A register is a state vector, unless another type is given when it is INITIALIZEd.
+MYQASMRegister = (
+    ComplexVector
+    | StabilizerRegister
+    | MPSRegister
+    | DensityMatrixRegister
+    | MappedRegister
+    | SharedMemoryRegister
+)
+
+
+def _register_qubit_count(state: MYQASMRegister) -> int:
+    if isinstance(state, ComplexVector):
+        return _qubit_count(state)
+    return state.get_qubit_count()
+
+
+def _copy_register(state: MYQASMRegister) -> MYQASMRegister:
+    if isinstance(state, ComplexVector):
+        return ComplexVector.from_buffer(array("d", state.to_buffer()))
+    return state.copy()
+
+
+def _is_builtin_gate_name(identifier: str) -> bool:
+    """Whether `identifier` is reserved for builtin gates,
+    so can't name a register or a user-defined gate.
+    """
     if identifier in ["H", "CNOT"]:
         return True
 
@@ -101,173 +190,877 @@ def _is_builtin_gate(identifier: str) -> bool:
         return False
 
 
-def _is_user_defined_gate(identifier: str) -> bool:
-    return identifier in _user_defined_gates.keys()
-
-
-def _gate_exists(identifier: str) -> bool:
-    return _is_builtin_gate(identifier) or _is_user_defined_gate(identifier)
-
-
-def _get_gate_matrix(identifier: str) -> ComplexMatrix:
-    if identifier in _user_defined_gates.keys():
-        return _user_defined_gates[identifier]
-    elif _is_builtin_gate(identifier):
-        if identifier == "H":
-            return _hadamard_matrix
-        elif identifier == "CNOT":
-            return _CNOT_matrix
-        elif identifier[0] == "I":
-            return ComplexMatrix.identity(int(identifier[1:]))
-        elif identifier[0] == "R":
-            return ComplexMatrix(
-                [
-                    [1, 0],
-                    [
-                        0,
-                        ComplexNumber.new_from_polar(
-                            1, math.pi * float(identifier[1:])
-                        ),
-                    ],
-                ]
-            )
-    # This code is not used in reality,
-    # as before this function is called, _gate_exists is called.
-    raise MYQASMGateDoesNotExistError("Invalid gate.")  # pragma: no cover
-
-
-def MYQASM(expression: str) -> Optional[list[int]]:
-    global _registers
-    token_stream = MYQASM_lexer(expression)
-    keyword = None
-    for token in token_stream:
-        if token[0] == TokenNameEnum.KEYWORD:
-            keyword = token[1]
-            assert isinstance(keyword, KeywordEnum)
-            break
-    assert keyword is not None
-    match keyword:
-        case KeywordEnum.INITIALIZE:
-            identifier = token_stream[1][1]
-            qubit_count = token_stream[2][1]
-            assert isinstance(identifier, str)
-            assert isinstance(qubit_count, str)
-            if _is_builtin_gate(identifier):
-                raise MYQASMRedefineBuiltinGateError(
-                    "Cannot create register with the name of a builtin gate."
-                )
-            elif _is_user_defined_gate(identifier):
-                raise MYQASMRedefineUserGateError(
-                    "Cannot create register with the name of an existing gate."
-                )
-            v: list[int] = [1] + [0] * ((2 ** int(qubit_count)) - 1)
-            if len(token_stream) == 6:
-                initial_state = token_stream[4][1]
-                assert isinstance(initial_state, str)
-                v[0] = 0
-                v[int(initial_state, 2)] = 1
-            _registers[identifier] = ComplexVector(v)
+def _is_builtin_gate(identifier: str) -> bool:
+    """Whether `identifier` is a builtin gate: a reserved name (see
+    `_is_builtin_gate_name`) with a number to parse, so not e.g. `R.`.
+    """
+    if not _is_builtin_gate_name(identifier):
+        return False
+    return identifier[0] != "R" or any(char.isdigit() for char in identifier[1:])
+
+
+BUILTIN_GATE_CACHE_SIZE = 256
+
+
+def _get_builtin_gate(identifier: str) -> Optional[MYQASMGate]:
+    """The builtin gate called `identifier`, or None if there isn't one.
+
+    Only builtin gates are looked up in the cache, so other names (of registers
+    and user-defined gates) never push gates out of it or count as misses.
+    """
+    if not _is_builtin_gate(identifier):
+        return None
+    return _cached_builtin_gate(identifier)
+
+
+@lru_cache(maxsize=BUILTIN_GATE_CACHE_SIZE)
+def _cached_builtin_gate(identifier: str) -> MYQASMGate:
+    """The builtin gate called `identifier`, which must be one.
+
+    The most recently used identifiers are cached,
+    so they are only parsed, and their gates only created, once.
+    """
+    if identifier == "H":
+        return _hadamard_matrix
+    elif identifier == "CNOT":
+        return _CNOT_matrix
+    elif identifier[0] == "I":
+        return IdentityGate(int(identifier[1:]))
+    else:
+        return _rotation_gate(float(identifier[1:]))
+
+
+def _rotation_gate(multiple_of_pi: float) -> SparseComplexMatrix:
+    """The gate `R<multiple_of_pi>`, which changes the phase of |1> by that
+    multiple of pi.
+    """
+    return SparseComplexMatrix.from_coordinates(
+        2,
+        2,
+        [(0, 0, 1), (1, 1, ComplexNumber.new_from_polar(1, math.pi * multiple_of_pi))],
+    )
+
+
+def _parameter_name(text: str) -> Optional[str]:
+    """The name of the placeholder `text` is (`{name}`), or None if it isn't one."""
+    if len(text) < 3 or text[0] != "{" or text[-1] != "}":
+        return None
+    return text[1:-1]
+
+
+def _rotation_parameter(gate: str) -> Optional[str]:
+    """The parameter giving the angle of `gate`, if it is `R{name}`."""
+    return _parameter_name(gate[1:]) if gate[:1] == "R" else None
+
+
+def get_builtin_gate_cache_info():
+    """The hits, misses, maximum size and current size of the builtin gate cache."""
+    return _cached_builtin_gate.cache_info()
+
+
+def clear_builtin_gate_cache() -> None:
+    """Empty the builtin gate cache, and reset its hit and miss counts."""
+    _cached_builtin_gate.cache_clear()
+
+
+# What MEASURE (list[int]), EXPECT (list[float]) and PROB (float) return.
+MYQASMResult = list[int] | list[float] | float
+MYQASMInstruction = Callable[["MYQASMSession"], Optional[MYQASMResult]]
+
+
+class MYQASMSnapshot:
+    def __init__(
+        self,
+        registers: dict[str, MYQASMRegister],
+        subregisters: dict[str, tuple[str, list[int]]],
+        user_defined_gates: dict[str, MYQASMGate],
+        max_bond_dimension: int = DEFAULT_MAX_BOND_DIMENSION,
+        truncation_threshold: float = DEFAULT_TRUNCATION_THRESHOLD,
+        mapped_directory: Optional[str] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        """The registers, subregisters and user-defined gates of a session
+        at one point (see `MYQASMSession.snapshot`).
+
+        The registers are shared with the session rather than copied,
+        and are only copied when a session changes one of them,
+        so a snapshot can be restored (or sent to another process) many times
+        without having to simulate the instructions that led to it again.
+        """
+        self._registers = registers
+        self._subregisters = subregisters
+        self._user_defined_gates = user_defined_gates
+        self._max_bond_dimension = max_bond_dimension
+        self._truncation_threshold = truncation_threshold
+        self._mapped_directory = mapped_directory
+        self._workers = workers
+
+
+class MYQASMSession:
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        max_bond_dimension: int = DEFAULT_MAX_BOND_DIMENSION,
+        truncation_threshold: float = DEFAULT_TRUNCATION_THRESHOLD,
+        mapped_directory: Optional[str] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        """A set of registers and user-defined gates to run MYQASM with.
+
+        Sessions are independent of each other, so different sessions can be used
+        at the same time (e.g. in different threads) without interfering.
+        Measurements use the session's own random number generator,
+        seeded with `seed`.
+
+        MPS registers INITIALIZEd in the session use `max_bond_dimension` and
+        `truncation_threshold` (see `MPSRegister`),
+        MAPPED registers store their files in `mapped_directory`
+        (see `MappedRegister`), and SHARED registers split their work between
+        `workers` processes (see `SharedMemoryRegister`).
+        """
+        self._registers: dict[str, MYQASMRegister] = {}
+        self._user_defined_gates: dict[str, MYQASMGate] = {}
+        # Subregister name -> (name of the register it is part of, its qubits).
+        self._subregisters: dict[str, tuple[str, list[int]]] = {}
+        self._random = random.Random(seed)
+        self._max_bond_dimension = max_bond_dimension
+        self._truncation_threshold = truncation_threshold
+        self._mapped_directory = mapped_directory
+        self._workers = workers
+        # The ids of register states that may be shared with a FORKed register,
+        # a snapshot, or another session, so must be copied before being changed.
+        self._shared: set[int] = set()
+        # Parameter name -> the value its placeholders are replaced with.
+        self._parameters: dict[str, float | str] = {}
+        self._profiler: Optional[MYQASMProfiler] = None
+
+    def MYQASM(self, expression: str) -> Optional[MYQASMResult]:
+        if self._profiler is not None:
+            return self._profiler._profile_expression(self, expression)
+        return MYQASM_compile(MYQASM_lexer(expression))(self)
+
+    def get_profiler(self) -> Optional[MYQASMProfiler]:
+        return self._profiler
+
+    def set_profiler(self, profiler: Optional[MYQASMProfiler]) -> None:
+        """Profile every instruction run in this session from now on with `profiler`
+        (see `MYQASMProfiler`), or stop profiling if it is None.
+        """
+        self._profiler = profiler
+
+    def get_registers(self):
+        """The state of each register, by name.
+
+        These are the session's own states, not copies: APPLY and MEASURE change
+        a state in place, so a state got from here shows the instructions run
+        after it (unless it was shared by a FORK or snapshot, which copies it first).
+        To keep a state as it is, FORK the register, or copy the state.
+        """
+        return self._registers
+
+    def get_subregisters(self):
+        return self._subregisters
+
+    def get_user_defined_gates(self):
+        return self._user_defined_gates
+
+    def get_parameters(self):
+        return self._parameters
+
+    def set_parameters(self, parameters: Mapping[str, float | str]) -> None:
+        """Give the placeholders of parametrised expressions the values in
+        `parameters` (replacing any given before): a multiple of pi for each `{name}`
+        in an `R{name}` gate, and a string of 0s and 1s for each `[{name}]` initial
+        state. They are read when each expression is executed.
+        """
+        self._parameters = dict(parameters)
+
+    def _parameter(self, name: str) -> float | str:
+        if name not in self._parameters:
+            raise MYQASMParameterError(f"Parameter {name} has not been given a value.")
+        return self._parameters[name]
+
+    def _rotation_gate_parameter(self, name: str) -> MYQASMGate:
+        try:
+            return _rotation_gate(float(self._parameter(name)))
+        except (TypeError, ValueError):
+            raise MYQASMParameterError(
+                f"Parameter {name} must be a number to be used as an angle."
+            )
+
+    def _initial_state_parameter(self, name: str, qubit_count: int) -> str:
+        initial_state = self._parameter(name)
+        if (
+            not isinstance(initial_state, str)
+            or len(initial_state) != qubit_count
+            or any(char not in "01" for char in initial_state)
+        ):
+            raise MYQASMParameterError(
+                f"Parameter {name} must be a string of {qubit_count} 0s and 1s to be"
+                " used as an initial state."
+            )
+        return initial_state
+
+    def _is_user_defined_gate(self, identifier: str) -> bool:
+        return identifier in self._user_defined_gates.keys()
+
+    def _gate_exists(self, identifier: str) -> bool:
+        return _is_builtin_gate(identifier) or self._is_user_defined_gate(identifier)
+
+    def _register_exists(self, identifier: str) -> bool:
+        return (
+            identifier in self._registers.keys()
+            or identifier in self._subregisters.keys()
+        )
+
+    def _resolve_register(self, identifier: str) -> tuple[str, Optional[list[int]]]:
+        """The register `identifier` is part of, and the indices of its qubits
+        in that register (None if it is the whole register).
+        """
+        if identifier in self._subregisters.keys():
+            return self._subregisters[identifier]
+        return identifier, None
+
+    def _register_qubits(self, identifier: str) -> list[int]:
+        register, qubits = self._resolve_register(identifier)
+        if qubits is None:
+            return list(range(_register_qubit_count(self._registers[register])))
+        return qubits
+
+    def _writable_register(self, root_register: str) -> MYQASMRegister:
+        """The state of `root_register`, to be changed in place.
+
+        If the state may be shared, it is copied first (copy-on-write),
+        so the registers it is shared with keep their state.
+        """
+        state = self._registers[root_register]
+        if id(state) in self._shared:
+            state = self._registers[root_register] = _copy_register(state)
+        return state
+
+    def _share_registers(self) -> None:
+        self._shared.update(id(state) for state in self._registers.values())
+
+    def snapshot(self) -> MYQASMSnapshot:
+        """The current registers, subregisters and user-defined gates,
+        which can be restored later (with `restore`) or in other sessions.
+
+        This does not copy any registers: they are copied the first time
+        anything changes them afterwards.
+        """
+        self._share_registers()
+        return MYQASMSnapshot(
+            dict(self._registers),
+            {
+                name: (root, list(qubits))
+                for name, (root, qubits) in self._subregisters.items()
+            },
+            dict(self._user_defined_gates),
+            self._max_bond_dimension,
+            self._truncation_threshold,
+            self._mapped_directory,
+            self._workers,
+        )
+
+    def restore(self, snapshot: MYQASMSnapshot) -> None:
+        """Replace all the registers, subregisters and user-defined gates of the
+        session with those of `snapshot` (which can be restored again later).
+        """
+        self._registers = dict(snapshot._registers)
+        self._subregisters = {
+            name: (root, list(qubits))
+            for name, (root, qubits) in snapshot._subregisters.items()
+        }
+        self._user_defined_gates = dict(snapshot._user_defined_gates)
+        self._share_registers()
+
+    def fork(self, seed: Optional[int] = None) -> MYQASMSession:
+        """A new session starting with this session's registers, subregisters
+        and user-defined gates, that can then be changed independently
+        (see `snapshot`).
+        """
+        session = MYQASMSession(
+            seed,
+            self._max_bond_dimension,
+            self._truncation_threshold,
+            self._mapped_directory,
+            self._workers,
+        )
+        session.restore(self.snapshot())
+        return session
+
+    @classmethod
+    def from_snapshot(
+        cls, snapshot: MYQASMSnapshot, seed: Optional[int] = None
+    ) -> MYQASMSession:
+        """A new session starting from `snapshot`, with the MPS, MAPPED and SHARED
+        settings of the session it was taken from.
+        """
+        session = cls(
+            seed,
+            snapshot._max_bond_dimension,
+            snapshot._truncation_threshold,
+            snapshot._mapped_directory,
+            snapshot._workers,
+        )
+        session.restore(snapshot)
+        return session
+
+    def _fork_register(self, old_register: str, new_register: str) -> None:
+        if not self._register_exists(old_register):
+            raise MYQASMRegisterDoesNotExistError(
+                "Attempting to FORK a register that does not exist."
+            )
+        if old_register in self._subregisters:
+            raise MYQASMRegisterTypeError(
+                f"Cannot FORK subregister {old_register}, only the register it is"
+                " part of."
+            )
+        if _is_builtin_gate_name(new_register):
+            raise MYQASMRedefineBuiltinGateError(
+                "Cannot create register with the name of a builtin gate."
+            )
+        elif self._is_user_defined_gate(new_register):
+            raise MYQASMRedefineUserGateError(
+                "Cannot create register with the name of an existing gate."
+            )
+        self._subregisters.pop(new_register, None)
+        state = self._registers[old_register]
+        self._shared.add(id(state))
+        self._registers[new_register] = state
+
+    def _get_gate_matrix(self, identifier: str) -> MYQASMGate:
+        if identifier in self._user_defined_gates.keys():
+            return self._user_defined_gates[identifier]
+        builtin_gate = _get_builtin_gate(identifier)
+        if builtin_gate is not None:
+            return builtin_gate
+        # This code is not used in reality,
+        # as before this function is called, _gate_exists is called.
+        raise MYQASMGateDoesNotExistError("Invalid gate.")  # pragma: no cover
+
+    def _initialize(
+        self,
+        identifier: str,
+        qubit_count: int,
+        initial_state: Optional[str],
+        register_type: Optional[KeywordEnum] = None,
+    ) -> None:
+        if _is_builtin_gate_name(identifier):
+            raise MYQASMRedefineBuiltinGateError(
+                "Cannot create register with the name of a builtin gate."
+            )
+        elif self._is_user_defined_gate(identifier):
+            raise MYQASMRedefineUserGateError(
+                "Cannot create register with the name of an existing gate."
+            )
+        self._subregisters.pop(identifier, None)
+        if register_type == KeywordEnum.STABILIZER:
+            self._registers[identifier] = StabilizerRegister(qubit_count, initial_state)
             return
-        case KeywordEnum.CONCAT | KeywordEnum.TENSOR:
-            new_gate_name = token_stream[0][1]
-            old_gate_1 = token_stream[2][1]
-            old_gate_2 = token_stream[3][1]
-            assert isinstance(new_gate_name, str)
-            assert isinstance(old_gate_1, str)
-            assert isinstance(old_gate_2, str)
-            if not (_gate_exists(old_gate_1) and _gate_exists(old_gate_2)):
-                error_keyword = "CONCAT" if keyword == KeywordEnum.CONCAT else "TENSOR"
-                raise MYQASMGateDoesNotExistError(
-                    f"Attempting to {error_keyword} gates that do not exist."
-                )
+        if register_type == KeywordEnum.DENSITY:
+            self._registers[identifier] = DensityMatrixRegister(
+                qubit_count, initial_state
+            )
+            return
+        if register_type == KeywordEnum.MAPPED:
+            self._registers[identifier] = MappedRegister(
+                qubit_count, initial_state, self._mapped_directory
+            )
+            return
+        if register_type == KeywordEnum.SHARED:
+            self._registers[identifier] = SharedMemoryRegister(
+                qubit_count, initial_state, self._workers
+            )
+            return
+        if register_type == KeywordEnum.MPS:
+            self._registers[identifier] = MPSRegister(
+                qubit_count,
+                initial_state,
+                self._max_bond_dimension,
+                self._truncation_threshold,
+            )
+            return
+        v: list[int] = [1] + [0] * ((2**qubit_count) - 1)
+        if initial_state is not None:
+            v[0] = 0
+            v[int(initial_state, 2)] = 1
+        self._registers[identifier] = ComplexVector(v)
+
+    def _select(
+        self, new_register: str, old_register: str, offset: int, number: int
+    ) -> None:
+        if not self._register_exists(old_register):
+            raise MYQASMRegisterDoesNotExistError(
+                "Attempting to SELECT from a register that does not exist."
+            )
+        if _is_builtin_gate_name(new_register):
+            raise MYQASMRedefineBuiltinGateError(
+                "Cannot create register with the name of a builtin gate."
+            )
+        elif self._is_user_defined_gate(new_register):
+            raise MYQASMRedefineUserGateError(
+                "Cannot create register with the name of an existing gate."
+            )
+        elif new_register in self._registers.keys():
+            raise MYQASMRedefineRegisterError(
+                "Cannot replace a register with a subregister."
+            )
+        qubits = self._register_qubits(old_register)
+        end = offset + number
+        if number == 0 or end > len(qubits):
+            raise MYQASMInvalidQubitsError(
+                f"Cannot SELECT qubits {offset} to {end - 1} of register"
+                f" {old_register}, which has {len(qubits)} qubits."
+            )
+        root_register, _ = self._resolve_register(old_register)
+        self._subregisters[new_register] = (root_register, qubits[offset:end])
+
+    def _check_new_gate_name(self, new_gate_name: str) -> None:
+        if _is_builtin_gate_name(new_gate_name):
+            raise MYQASMRedefineBuiltinGateError("Attempting to redefine builtin gate.")
+        if self._register_exists(new_gate_name):
+            raise MYQASMRedefineRegisterError(
+                "Attempting to redefine a user-defined register."
+            )
 
-            if _is_builtin_gate(new_gate_name):
-                raise MYQASMRedefineBuiltinGateError(
-                    "Attempting to redefine builtin gate."
-                )
-            if new_gate_name in _registers.keys():
-                raise MYQASMRedefineRegisterError(
-                    "Attempting to redefine a user-defined register."
-                )
-            if keyword == KeywordEnum.CONCAT:
-                try:
-                    _user_defined_gates[new_gate_name] = _get_gate_matrix(
-                        old_gate_1
-                    ) * _get_gate_matrix(old_gate_2)
-                except ValueError:
-                    raise MYQASMCONCATDifferentSizeGatesError(
-                        "Cannot CONCAT gates that act on different number of qubits."
-                    )
-                return
-            else:
-                _user_defined_gates[new_gate_name] = tensor_product(
-                    _get_gate_matrix(old_gate_1), _get_gate_matrix(old_gate_2)
-                )
-        case KeywordEnum.INVERSE:
-            new_gate_name = token_stream[0][1]
-            old_gate = token_stream[2][1]
-            assert isinstance(new_gate_name, str)
-            assert isinstance(old_gate, str)
-            if not _gate_exists(old_gate):
-                raise MYQASMGateDoesNotExistError(
-                    "Attempting to INVERSE a gate that does not exist."
-                )
+    def _concat(self, new_gate_name: str, old_gate_1: str, old_gate_2: str) -> None:
+        if not (self._gate_exists(old_gate_1) and self._gate_exists(old_gate_2)):
+            raise MYQASMGateDoesNotExistError(
+                "Attempting to CONCAT gates that do not exist."
+            )
+        self._check_new_gate_name(new_gate_name)
+        try:
+            self._user_defined_gates[new_gate_name] = concat_gates(
+                self._get_gate_matrix(old_gate_1), self._get_gate_matrix(old_gate_2)
+            )
+        except ValueError:
+            raise MYQASMCONCATDifferentSizeGatesError(
+                "Cannot CONCAT gates that act on different number of qubits."
+            )
 
-            if _is_builtin_gate(new_gate_name):
-                raise MYQASMRedefineBuiltinGateError(
-                    "Attempting to redefine builtin gate."
-                )
-            if new_gate_name in _registers.keys():
-                raise MYQASMRedefineRegisterError(
-                    "Attempting to redefine a user-defined register."
-                )
-            _user_defined_gates[new_gate_name] = _get_gate_matrix(old_gate).adjoint()
-        case KeywordEnum.MEASURE:
-            register_name = token_stream[1][1]
-            assert isinstance(register_name, str)
-            if register_name not in _registers.keys():
-                raise MYQASMRegisterDoesNotExistError(
-                    "Attempting to measure a register that does not exist."
-                )
-            vector_representing_state = _registers[register_name]
-            vector_norm_squared = vector_representing_state.norm_squared()
-            number_states = len(vector_representing_state)
-            probabilities = [
-                c.modulus_squared() / vector_norm_squared
-                for c in vector_representing_state
-            ]
-            chosen_state_list = random.choices(
-                range(number_states), weights=probabilities, k=1
-            )
-            chosen_state = chosen_state_list[0]
-            binary_representation = bin(chosen_state).removeprefix("0b")
-            number_in_binary_rep = len(binary_representation)
-            extra_chars = "0" * (int(math.log(number_states, 2)) - number_in_binary_rep)
-            return [int(char) for char in (extra_chars + binary_representation)]
-        case KeywordEnum.APPLY:
-            gate = token_stream[1][1]
-            register = token_stream[2][1]
-            assert isinstance(gate, str)
-            assert isinstance(register, str)
-            if not _gate_exists(gate):
+    def _tensor(self, new_gate_name: str, old_gate_1: str, old_gate_2: str) -> None:
+        if not (self._gate_exists(old_gate_1) and self._gate_exists(old_gate_2)):
+            raise MYQASMGateDoesNotExistError(
+                "Attempting to TENSOR gates that do not exist."
+            )
+        self._check_new_gate_name(new_gate_name)
+        self._user_defined_gates[new_gate_name] = tensor_gates(
+            self._get_gate_matrix(old_gate_1), self._get_gate_matrix(old_gate_2)
+        )
+
+    def _inverse(self, new_gate_name: str, old_gate: str) -> None:
+        if not self._gate_exists(old_gate):
+            raise MYQASMGateDoesNotExistError(
+                "Attempting to INVERSE a gate that does not exist."
+            )
+        self._check_new_gate_name(new_gate_name)
+        self._user_defined_gates[new_gate_name] = self._get_gate_matrix(
+            old_gate
+        ).adjoint()
+
+    def _apply(
+        self,
+        gate: str,
+        register: str,
+        indices: list[int],
+        gate_matrix: Optional[MYQASMGate] = None,
+    ) -> None:
+        """`gate_matrix` is the matrix of `gate`, if it is already known."""
+        if self._profiler is not None:
+            started = time.perf_counter()
+        if gate_matrix is None:
+            if not self._gate_exists(gate):
                 raise MYQASMGateDoesNotExistError(
                     "Attempting to APPLY a gate that does not exist."
                 )
-            if register not in _registers.keys():
-                raise MYQASMRegisterDoesNotExistError(
-                    "Attempting to APPLY a gate to a register that does not exist."
-                )
+            gate_matrix = self._get_gate_matrix(gate)
+        if self._profiler is not None:
+            self._profiler._note_gate(
+                time.perf_counter() - started, gate_matrix.get_height()
+            )
+        if not self._register_exists(register):
+            raise MYQASMRegisterDoesNotExistError(
+                "Attempting to APPLY a gate to a register that does not exist."
+            )
+        root_register, selected_qubits = self._resolve_register(register)
+        state = self._writable_register(root_register)
+        if selected_qubits is None and not indices and isinstance(state, ComplexVector):
             try:
-                _registers[register] = complex_matrix_vector_multiply(
-                    _get_gate_matrix(gate), _registers[register]
-                )
+                apply_gate(gate_matrix, state)
             except ValueError:
                 raise MYQASMGateAndRegisterDifferentSizeGatesError(
                     "Cannot APPLY to a gate to a different number of qubits that it"
                     " acts on."
                 )
-        case KeywordEnum.SELECT:  # pragma: no cover
-            pass  # pragma: no cover
+            return
+
+        # Apply the gate to only some qubits of the register,
+        # without building the matrix acting on the whole register.
+        qubits = self._register_qubits(register)
+        if indices:
+            if any(q >= len(qubits) for q in indices):
+                raise MYQASMInvalidQubitsError(
+                    f"Register {register} only has {len(qubits)} qubits."
+                )
+            qubits = [qubits[q] for q in indices]
+        if len(set(qubits)) != len(qubits):
+            raise MYQASMInvalidQubitsError(
+                "Cannot APPLY a gate to the same qubit twice."
+            )
+        if gate_matrix.get_height() != 2 ** len(qubits):
+            raise MYQASMGateAndRegisterDifferentSizeGatesError(
+                "Cannot APPLY to a gate to a different number of qubits that it acts"
+                " on."
+            )
+        # The register may have been re-initialized with fewer qubits
+        # since the subregister was selected.
+        error = MYQASMInvalidQubitsError(
+            f"Subregister {register} is no longer part of register {root_register}."
+        )
+        if not isinstance(state, ComplexVector):
+            if any(q >= state.get_qubit_count() for q in qubits):
+                raise error
+            try:
+                state.apply_gate(gate_matrix, qubits)
+            except ValueError as apply_error:
+                raise MYQASMUnsupportedGateError(
+                    f"Cannot APPLY {gate} to register {root_register}: {apply_error}"
+                )
+            return
+        try:
+            apply_gate(gate_matrix, state, qubits)
+        except ValueError:
+            raise error
+
+    def seed(self, seed: Optional[int]) -> None:
+        """Seed the random number generator used for measurements in this session,
+        so that runs can be reproduced.
+        """
+        self._random.seed(seed)
+
+    def _sample(self, register_name: str, shots: int) -> tuple[list[int], int]:
+        """Measure a register `shots` times, without changing its state.
+
+        Returns the packed outcomes, and the number of qubits measured.
+        """
+        if not self._register_exists(register_name):
+            raise MYQASMRegisterDoesNotExistError(
+                "Attempting to measure a register that does not exist."
+            )
+        root_register, selected_qubits = self._resolve_register(register_name)
+        state = self._registers[root_register]
+        error = MYQASMInvalidQubitsError(
+            f"Subregister {register_name} is no longer part of register"
+            f" {root_register}."
+        )
+        if not isinstance(state, ComplexVector):
+            qubits = self._register_qubits(register_name)
+            if any(q >= state.get_qubit_count() for q in qubits):
+                raise error
+            return state.sample(qubits, shots, self._random), len(qubits)
+        try:
+            probabilities = qubit_probabilities(state, selected_qubits)
+        except ValueError:
+            raise error
+        outcomes = sample_outcomes(probabilities, shots, self._random)
+        return outcomes, len(probabilities).bit_length() - 1
+
+    def sample(self, register_name: str, shots: int) -> array[int] | list[int]:
+        """Measure a register `shots` times, without changing its state.
+
+        Each outcome is packed into an integer, whose most significant bit
+        is the first qubit of the register (so `[0, 1, 1]` is 3).
+        For a state vector register, the probabilities are only calculated once,
+        however many shots are taken.
+
+        The outcomes are an `array("Q")`, or a list if more than 64 qubits are
+        measured (which is only possible for stabilizer and MPS registers).
+        """
+        outcomes, qubits_measured = self._sample(register_name, shots)
+        if qubits_measured > 64:
+            return outcomes
+        return array("Q", outcomes)
+
+    def sample_counts(self, register_name: str, shots: int) -> dict[str, int]:
+        """Measure a register `shots` times, and count how many times each outcome
+        occurs, keyed by the outcome as a string of 0s and 1s (e.g. `"011"`).
+        """
+        outcomes, qubits_measured = self._sample(register_name, shots)
+        counts = Counter(outcomes)
+        return {
+            format(outcome, f"0{qubits_measured}b"): count
+            for outcome, count in sorted(counts.items())
+        }
+
+    def _measure_qubits(self, register_name: str, indices: list[int]) -> list[int]:
+        """Measure the qubits `indices` of a register, collapsing the register to
+        the outcome, which is returned (in the order of `indices`).
+        """
+        if not self._register_exists(register_name):
+            raise MYQASMRegisterDoesNotExistError(
+                "Attempting to measure a register that does not exist."
+            )
+        root_register, _ = self._resolve_register(register_name)
+        state = self._registers[root_register]
+        register_qubits = self._register_qubits(register_name)
+        if any(q >= len(register_qubits) for q in indices):
+            raise MYQASMInvalidQubitsError(
+                f"Register {register_name} only has {len(register_qubits)} qubits."
+            )
+        if len(set(indices)) != len(indices):
+            raise MYQASMInvalidQubitsError("Cannot measure the same qubit twice.")
+        qubits = [register_qubits[q] for q in indices]
+        if any(q >= _register_qubit_count(state) for q in qubits):
+            raise MYQASMInvalidQubitsError(
+                f"Subregister {register_name} is no longer part of register"
+                f" {root_register}."
+            )
+        state = self._writable_register(root_register)
+        if isinstance(state, ComplexVector):
+            probabilities = qubit_probabilities(state, qubits)
+            (outcome,) = sample_outcomes(probabilities, 1, self._random)
+            project_qubits(state, qubits, outcome)
+        else:
+            outcome = state.measure(qubits, self._random)
+        return [(outcome >> (len(qubits) - 1 - b)) & 1 for b in range(len(qubits))]
+
+    def _query_register(self, register_name: str) -> tuple[MYQASMRegister, list[int]]:
+        """The state a register is part of, and the register's qubits of it."""
+        if not self._register_exists(register_name):
+            raise MYQASMRegisterDoesNotExistError(
+                "Attempting to query a register that does not exist."
+            )
+        root_register, _ = self._resolve_register(register_name)
+        state = self._registers[root_register]
+        qubits = self._register_qubits(register_name)
+        if any(q >= _register_qubit_count(state) for q in qubits):
+            raise MYQASMInvalidQubitsError(
+                f"Subregister {register_name} is no longer part of register"
+                f" {root_register}."
+            )
+        return state, qubits
+
+    def expectation_values(
+        self, register_name: str, pauli_strings: Sequence[str]
+    ) -> list[float]:
+        """The exact expectation value of each Pauli string (e.g. `"ZZIX"`,
+        whose first Pauli acts on the register's first qubit),
+        without changing the register or sampling.
+
+        For a state vector, all of the strings are found together
+        (see `shared.pauli_expectation_values`).
+        Raises ValueError if a string has anything other than I, X, Y and Z.
+        """
+        state, qubits = self._query_register(register_name)
+        for pauli_string in pauli_strings:
+            if len(pauli_string) != len(qubits):
+                raise MYQASMInvalidQubitsError(
+                    f"Pauli string {pauli_string} must have one Pauli for each of"
+                    f" the {len(qubits)} qubits of {register_name}."
+                )
+        if isinstance(state, ComplexVector):
+            return pauli_expectation_values(state, pauli_strings, qubits)
+        return state.expectation_values(pauli_strings, qubits)
+
+    def probability(self, register_name: str, outcome: str) -> float:
+        """The exact probability that measuring a register gives `outcome`
+        (e.g. `"0101"`, whose first bit is the register's first qubit),
+        without changing the register or sampling.
+
+        Raises ValueError if `outcome` has anything other than 0 and 1.
+        """
+        state, qubits = self._query_register(register_name)
+        if len(outcome) != len(qubits):
+            raise MYQASMInvalidQubitsError(
+                f"Outcome {outcome} must have one bit for each of the {len(qubits)}"
+                f" qubits of {register_name}."
+            )
+        if any(bit not in "01" for bit in outcome):
+            raise ValueError("Outcomes can only contain 0 and 1.")
+        if isinstance(state, ComplexVector):
+            return outcome_probability(state, qubits, int(outcome, 2))
+        return state.probability(qubits, int(outcome, 2))
+
+    def _noise(
+        self,
+        register: str,
+        kraus_operators: list[ComplexMatrix],
+        indices: list[int],
+    ) -> None:
+        """Apply the single qubit channel with `kraus_operators` to each of the
+        qubits `indices` of `register` (by default, all of them).
+        """
+        if not self._register_exists(register):
+            raise MYQASMRegisterDoesNotExistError(
+                "Attempting to apply noise to a register that does not exist."
+            )
+        root_register, _ = self._resolve_register(register)
+        state = self._registers[root_register]
+        if not isinstance(state, DensityMatrixRegister):
+            raise MYQASMRegisterTypeError(
+                f"Cannot apply noise to {register}, as it is not a DENSITY register."
+            )
+        qubits = self._register_qubits(register)
+        if indices:
+            if any(q >= len(qubits) for q in indices):
+                raise MYQASMInvalidQubitsError(
+                    f"Register {register} only has {len(qubits)} qubits."
+                )
+            qubits = [qubits[q] for q in indices]
+        if any(q >= state.get_qubit_count() for q in qubits):
+            raise MYQASMInvalidQubitsError(
+                f"Subregister {register} is no longer part of register"
+                f" {root_register}."
+            )
+        state = self._writable_register(root_register)
+        assert isinstance(state, DensityMatrixRegister)
+        for qubit in qubits:
+            state.apply_channel(kraus_operators, [qubit])
+
+    def _measure(self, register_name: str, shots: Optional[int]) -> list[int]:
+        if shots is not None:
+            return list(self.sample(register_name, shots))
+        (outcome,), qubits_measured = self._sample(register_name, 1)
+        return [
+            (outcome >> (qubits_measured - 1 - q)) & 1 for q in range(qubits_measured)
+        ]
+
+
+def _split_tokens(
+    token_stream: list[tuple[TokenNameEnum, str | KeywordEnum]],
+) -> tuple[KeywordEnum, list[str], list[str], list[KeywordEnum]]:
+    """The keyword, identifiers, literals and options (later keywords, e.g. the type
+    of register to INITIALIZE) of an expression's tokens.
+    """
+    keyword = None
+    names: list[str] = []
+    literals: list[str] = []
+    options: list[KeywordEnum] = []
+    for token_name, value in token_stream:
+        if isinstance(value, KeywordEnum):
+            if keyword is None:
+                keyword = value
+            else:
+                options.append(value)
+        elif token_name == TokenNameEnum.IDENTIFIER:
+            names.append(value)
+        elif token_name == TokenNameEnum.LITERAL:
+            literals.append(value)
+    assert keyword is not None
+    return keyword, names, literals, options
+
+
+def MYQASM_compile(
+    token_stream: list[tuple[TokenNameEnum, str | KeywordEnum]],
+) -> MYQASMInstruction:
+    """Turn the tokens of one expression into a function that executes it
+    in the session it is given.
+
+    Numbers are parsed, and builtin gates looked up, here rather than every time the
+    instruction is executed.
+    """
+    keyword, names, literals, options = _split_tokens(token_stream)
+    match keyword:
+        case KeywordEnum.INITIALIZE:
+            qubit_count = int(literals[0])
+            initial_state = literals[1] if len(literals) == 2 else None
+            register_type = options[0] if options else None
+            state_parameter = _parameter_name(initial_state or "")
+            if state_parameter is not None:
+                return lambda session: session._initialize(
+                    names[0],
+                    qubit_count,
+                    session._initial_state_parameter(state_parameter, qubit_count),
+                    register_type,
+                )
+            return lambda session: session._initialize(
+                names[0], qubit_count, initial_state, register_type
+            )
+        case KeywordEnum.SELECT:
+            offset, number = int(literals[0]), int(literals[1])
+            return lambda session: session._select(names[0], names[1], offset, number)
+        case KeywordEnum.CONCAT:
+            return lambda session: session._concat(names[0], names[1], names[2])
+        case KeywordEnum.TENSOR:
+            return lambda session: session._tensor(names[0], names[1], names[2])
+        case KeywordEnum.INVERSE:
+            return lambda session: session._inverse(names[0], names[1])
+        case KeywordEnum.APPLY:
+            indices = [int(literal) for literal in literals]
+            angle_parameter = _rotation_parameter(names[0])
+            if angle_parameter is not None:
+                return lambda session: session._apply(
+                    names[0],
+                    names[1],
+                    indices,
+                    session._rotation_gate_parameter(angle_parameter),
+                )
+            # Builtin gates can't be redefined, so their matrices never change.
+            gate_matrix = _get_builtin_gate(names[0])
+            return lambda session: session._apply(
+                names[0], names[1], indices, gate_matrix
+            )
+        case KeywordEnum.MEASURE:
+            if (TokenNameEnum.SEPARATOR, "[") in token_stream:
+                indices = [int(literal) for literal in literals]
+                return lambda session: session._measure_qubits(names[0], indices)
+            shots = int(literals[0]) if literals else None
+            return lambda session: session._measure(names[0], shots)
+        case KeywordEnum.EXPECT:
+            return lambda session: session.expectation_values(names[0], literals)
+        case KeywordEnum.PROB:
+            return lambda session: session.probability(names[0], literals[0])
+        case KeywordEnum.FORK:
+            return lambda session: session._fork_register(names[0], names[1])
+        case KeywordEnum.NOISE:
+            channel = {
+                KeywordEnum.DEPOLARIZING: depolarizing_channel,
+                KeywordEnum.AMPLITUDE_DAMPING: amplitude_damping_channel,
+                KeywordEnum.DEPHASING: dephasing_channel,
+            }[options[0]]
+            kraus_operators = channel(float(literals[0]))
+            indices = [int(literal) for literal in literals[1:]]
+            return lambda session: session._noise(names[0], kraus_operators, indices)
+
+
+_default_session = MYQASMSession()
+
+
+def get_default_session() -> MYQASMSession:
+    """The session used by `MYQASM`, `get_registers` and `get_user_defined_gates`."""
+    return _default_session
+
+
+def MYQASM(expression: str) -> Optional[MYQASMResult]:
+    return _default_session.MYQASM(expression)
+
+
+def get_registers():
+    return _default_session.get_registers()
+
+
+def get_subregisters():
+    return _default_session.get_subregisters()
+
+
+def get_user_defined_gates():
+    return _default_session.get_user_defined_gates()
+
+
+# The register types that can be given at the end of an INITIALIZE.
+_REGISTER_TYPES = {
+    "STABILIZER": KeywordEnum.STABILIZER,
+    "MPS": KeywordEnum.MPS,
+    "DENSITY": KeywordEnum.DENSITY,
+    "MAPPED": KeywordEnum.MAPPED,
+    "SHARED": KeywordEnum.SHARED,
+}
+_NOISE_CHANNELS = {
+    "DEPOLARIZING": KeywordEnum.DEPOLARIZING,
+    "AMPLITUDE_DAMPING": KeywordEnum.AMPLITUDE_DAMPING,
+    "DEPHASING": KeywordEnum.DEPHASING,
+}
 
 
 def _valid_identifier(identifier: str) -> None:
@@ -275,11 +1068,29 @@ def _valid_identifier(identifier: str) -> None:
         raise InvalidMYQASMSyntaxError("Invalid identifier name.")
 
 
+def _valid_parameter(placeholder: str) -> None:
+    name = _parameter_name(placeholder)
+    if name is None or not all(char.isalnum() or char == "_" for char in name):
+        raise InvalidMYQASMSyntaxError(
+            "Placeholders must be a name (of letters, digits and `_`) wrapped in"
+            " braces (`{` and `}`)."
+        )
+
+
 def _valid_number(number: str, error_message: str = "Invalid number.") -> None:
     if not number.isdigit():
         raise InvalidMYQASMSyntaxError(error_message)
 
 
+def _valid_probability(probability: str) -> None:
+    try:
+        valid = 0 <= float(probability) <= 1
+    except ValueError:
+        valid = False
+    if not valid:
+        raise InvalidMYQASMSyntaxError("Probability must be a number from 0 to 1.")
+
+
 def MYQASM_lexer(
     expression: str,
 ) -> list[tuple[TokenNameEnum, str | KeywordEnum]]:
@@ -289,9 +1100,14 @@ def MYQASM_lexer(
     match (a := string_list[0]):
         case "INITIALIZE":
             token_list.append((TokenNameEnum.KEYWORD, KeywordEnum.INITIALIZE))
+            register_type = None
+            if number_of_strings > 3 and string_list[-1] in _REGISTER_TYPES:
+                register_type = _REGISTER_TYPES[string_list.pop()]
+                number_of_strings -= 1
             if number_of_strings not in [3, 4]:
                 raise InvalidMYQASMSyntaxError(
-                    "INITIALIZE must be followed by followed by 2 or 3 strings."
+                    "INITIALIZE must be followed by 2 or 3 strings,"
+                    " and optionally a register type."
                 )
 
             identifier = string_list[1]
@@ -313,12 +1129,13 @@ def MYQASM_lexer(
                     )
 
                 numbers = initial_state[1:-1]
-                if any(char not in ["0", "1"] for char in numbers):
+                if numbers[:1] == "{":
+                    _valid_parameter(numbers)
+                elif any(char not in ["0", "1"] for char in numbers):
                     raise InvalidMYQASMSyntaxError(
                         "Each qubit's initial state must be either 0 or 1."
                     )
-
-                if len(numbers) != int(qubit_count):
+                elif len(numbers) != int(qubit_count):
                     raise InvalidMYQASMSyntaxError(
                         "Qubit register's initial state's length must match number of"
                         " qubits."
@@ -327,12 +1144,13 @@ def MYQASM_lexer(
                 token_list.append((TokenNameEnum.SEPARATOR, "["))
                 token_list.append((TokenNameEnum.LITERAL, numbers))
                 token_list.append((TokenNameEnum.SEPARATOR, "]"))
+
+            if register_type is not None:
+                token_list.append((TokenNameEnum.KEYWORD, register_type))
         case "SELECT":
             token_list.append((TokenNameEnum.KEYWORD, KeywordEnum.SELECT))
             if number_of_strings != 5:
-                raise InvalidMYQASMSyntaxError(
-                    "INITIALIZE must be followed by followed by 4 strings."
-                )
+                raise InvalidMYQASMSyntaxError("SELECT must be followed by 4 strings.")
             identifier1 = string_list[1]
             identifier2 = string_list[2]
             _valid_identifier(identifier1)
@@ -353,25 +1171,142 @@ def MYQASM_lexer(
             token_list.append((TokenNameEnum.LITERAL, number2))
         case "APPLY":
             token_list.append((TokenNameEnum.KEYWORD, KeywordEnum.APPLY))
-            if number_of_strings != 3:
-                raise InvalidMYQASMSyntaxError("APPLY must be followed by 2 strings.")
+            if number_of_strings < 3:
+                raise InvalidMYQASMSyntaxError(
+                    "APPLY must be followed by 2 strings, then optionally qubit"
+                    " indices."
+                )
 
             identifier1 = string_list[1]
             identifier2 = string_list[2]
+            if identifier1[:2] == "R{":
+                # The angle is a placeholder, given when the expression is executed.
+                _valid_parameter(identifier1[1:])
+            else:
+                _valid_identifier(identifier1)
+            _valid_identifier(identifier2)
+
+            token_list.append((TokenNameEnum.IDENTIFIER, identifier1))
+            token_list.append((TokenNameEnum.IDENTIFIER, identifier2))
+
+            for qubit_index in string_list[3:]:
+                _valid_number(
+                    qubit_index,
+                    f"`{a} {identifier1} {identifier2}` must be followed by qubit"
+                    " indices.",
+                )
+                token_list.append((TokenNameEnum.LITERAL, qubit_index))
+        case "NOISE":
+            token_list.append((TokenNameEnum.KEYWORD, KeywordEnum.NOISE))
+            if number_of_strings < 4:
+                raise InvalidMYQASMSyntaxError(
+                    "NOISE must be followed by a channel, a register and a"
+                    " probability, then optionally qubit indices."
+                )
+
+            channel = string_list[1]
+            if channel not in _NOISE_CHANNELS:
+                raise InvalidMYQASMSyntaxError(
+                    f"Noise channel must be one of {', '.join(_NOISE_CHANNELS)}."
+                )
+            token_list.append((TokenNameEnum.KEYWORD, _NOISE_CHANNELS[channel]))
+
+            identifier = string_list[2]
+            _valid_identifier(identifier)
+            token_list.append((TokenNameEnum.IDENTIFIER, identifier))
+
+            probability = string_list[3]
+            _valid_probability(probability)
+            token_list.append((TokenNameEnum.LITERAL, probability))
+
+            for qubit_index in string_list[4:]:
+                _valid_number(
+                    qubit_index,
+                    f"`{a} {channel} {identifier} {probability}` must be followed by"
+                    " qubit indices.",
+                )
+                token_list.append((TokenNameEnum.LITERAL, qubit_index))
+        case "EXPECT":
+            token_list.append((TokenNameEnum.KEYWORD, KeywordEnum.EXPECT))
+            if number_of_strings < 3:
+                raise InvalidMYQASMSyntaxError(
+                    "EXPECT must be followed by a register, then one or more Pauli"
+                    " strings."
+                )
+
+            identifier = string_list[1]
+            _valid_identifier(identifier)
+            token_list.append((TokenNameEnum.IDENTIFIER, identifier))
+
+            for pauli_string in string_list[2:]:
+                if not pauli_string or any(c not in "IXYZ" for c in pauli_string):
+                    raise InvalidMYQASMSyntaxError(
+                        "Pauli strings can only contain I, X, Y and Z."
+                    )
+                token_list.append((TokenNameEnum.LITERAL, pauli_string))
+        case "FORK":
+            token_list.append((TokenNameEnum.KEYWORD, KeywordEnum.FORK))
+            if number_of_strings != 3:
+                raise InvalidMYQASMSyntaxError(
+                    "FORK must be followed by a register and the name of the new"
+                    " register."
+                )
+            identifier1 = string_list[1]
+            identifier2 = string_list[2]
             _valid_identifier(identifier1)
             _valid_identifier(identifier2)
 
             token_list.append((TokenNameEnum.IDENTIFIER, identifier1))
             token_list.append((TokenNameEnum.IDENTIFIER, identifier2))
+        case "PROB":
+            token_list.append((TokenNameEnum.KEYWORD, KeywordEnum.PROB))
+            if number_of_strings != 3:
+                raise InvalidMYQASMSyntaxError(
+                    "PROB must be followed by a register and an outcome."
+                )
+
+            identifier = string_list[1]
+            _valid_identifier(identifier)
+            token_list.append((TokenNameEnum.IDENTIFIER, identifier))
+
+            outcome = string_list[2]
+            if not outcome or any(c not in "01" for c in outcome):
+                raise InvalidMYQASMSyntaxError("Outcomes can only contain 0 and 1.")
+            token_list.append((TokenNameEnum.LITERAL, outcome))
         case "MEASURE":
             token_list.append((TokenNameEnum.KEYWORD, KeywordEnum.MEASURE))
-            if number_of_strings != 2:
-                raise InvalidMYQASMSyntaxError("APPLY must be followed by 1 string.")
+            if number_of_strings not in [2, 3]:
+                raise InvalidMYQASMSyntaxError(
+                    "MEASURE must be followed by 1 or 2 strings."
+                )
 
             identifier1 = string_list[1]
             _valid_identifier(identifier1)
 
             token_list.append((TokenNameEnum.IDENTIFIER, identifier1))
+
+            if number_of_strings == 3 and string_list[2][:1] == "[":
+                qubit_indices = string_list[2]
+                if qubit_indices[-1] != "]":
+                    raise InvalidMYQASMSyntaxError(
+                        "Qubit indices to measure must be wrapped in square brackets"
+                        " (`[` and `]`)."
+                    )
+                token_list.append((TokenNameEnum.SEPARATOR, "["))
+                for qubit_index in qubit_indices[1:-1].split(","):
+                    _valid_number(
+                        qubit_index,
+                        "Qubit indices to measure must be numbers separated by"
+                        " commas.",
+                    )
+                    token_list.append((TokenNameEnum.LITERAL, qubit_index))
+                token_list.append((TokenNameEnum.SEPARATOR, "]"))
+            elif number_of_strings == 3:
+                shots = string_list[2]
+                _valid_number(
+                    shots, f"`{a} {identifier1}` must be followed by a number of shots."
+                )
+                token_list.append((TokenNameEnum.LITERAL, shots))
         case _:
             _valid_identifier(a)
             token_list.append((TokenNameEnum.IDENTIFIER, a))
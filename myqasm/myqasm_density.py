@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import math
+import random
+from array import array
+from typing import Sequence
+
+from complex_matrices import ComplexMatrix, tensor_product
+from complex_vectors import ComplexVector
+from shared import (
+    complex_matrix_apply_to_qubits,
+    marginal_probabilities,
+    outcome_mask,
+    pauli_masks,
+    project_qubits,
+    sample_outcomes,
+)
+
+from .myqasm_gates import IdentityGate, KroneckerGate, MYQASMGate, apply_gate
+
+_PAULIS = [
+    ComplexMatrix([[0, 1], [1, 0]]),
+    ComplexMatrix([[0, -1j], [1j, 0]]),
+    ComplexMatrix([[1, 0], [0, -1]]),
+]
+
+
+def _check_probability(p: float) -> None:
+    if not 0 <= p <= 1:
+        raise ValueError("Channel probabilities must be between 0 and 1.")
+
+
+def depolarizing_channel(p: float) -> list[ComplexMatrix]:
+    """The Kraus operators of the single qubit channel that replaces the state with
+    the maximally mixed state with probability `p`.
+    """
+    _check_probability(p)
+    return [math.sqrt(1 - 3 * p / 4) * ComplexMatrix.identity(2)] + [
+        math.sqrt(p / 4) * pauli for pauli in _PAULIS
+    ]
+
+
+def amplitude_damping_channel(gamma: float) -> list[ComplexMatrix]:
+    """The Kraus operators of the single qubit channel that decays |1> to |0>
+    with probability `gamma`.
+    """
+    _check_probability(gamma)
+    return [
+        ComplexMatrix([[1, 0], [0, math.sqrt(1 - gamma)]]),
+        ComplexMatrix([[0, math.sqrt(gamma)], [0, 0]]),
+    ]
+
+
+def dephasing_channel(p: float) -> list[ComplexMatrix]:
+    """The Kraus operators of the single qubit channel that applies Z
+    with probability `p`.
+    """
+    _check_probability(p)
+    return [
+        math.sqrt(1 - p) * ComplexMatrix.identity(2),
+        math.sqrt(p) * _PAULIS[2],
+    ]
+
+
+def _conjugate_gate(gate: MYQASMGate) -> MYQASMGate:
+    if isinstance(gate, IdentityGate):
+        return gate
+    if isinstance(gate, KroneckerGate):
+        factors = [_conjugate_gate(factor) for factor in gate.get_factors()]
+        return KroneckerGate(factors)  # type: ignore
+    return gate.conjugate()
+
+
+class DensityMatrixRegister:
+    def __init__(self, qubit_count: int, initial_state: str | None = None) -> None:
+        """A register stored as a density matrix, so it can be in a mixed state,
+        e.g. after noise channels.
+
+        The 2^n x 2^n matrix rho is stored row by row as a vector of 4^n elements,
+        which is the state of 2n qubits: the first n index the row,
+        and the last n the column.
+        So a gate U on some qubits (rho -> U rho U^dagger) is U applied to those row
+        qubits, and the conjugate of U applied to the same column qubits,
+        and a channel with Kraus operators K is the superoperator
+        sum(K tensor conjugate(K)) applied to both,
+        without ever making a 4^n x 4^n matrix.
+        """
+        self._n = qubit_count
+        basis_state = int(initial_state, 2) if initial_state else 0
+        elements = [0] * (4**qubit_count)
+        elements[basis_state * 2**qubit_count + basis_state] = 1
+        self._rho = ComplexVector(elements)
+
+    def copy(self) -> DensityMatrixRegister:
+        new = DensityMatrixRegister.__new__(DensityMatrixRegister)
+        new._n = self._n
+        new._rho = ComplexVector.from_buffer(array("d", self._rho.to_buffer()))
+        return new
+
+    def get_qubit_count(self) -> int:
+        return self._n
+
+    def get_density_matrix(self) -> ComplexMatrix:
+        size = 2**self._n
+        return ComplexMatrix.from_buffer(array("d", self._rho.to_buffer()), size, size)
+
+    def _column_qubits(self, qubits: Sequence[int]) -> list[int]:
+        return [self._n + q for q in qubits]
+
+    def apply_gate(self, gate: MYQASMGate, qubits: Sequence[int]) -> None:
+        """Apply `gate` to `qubits` (qubit 0 being the leftmost).
+
+        Raises ValueError if `gate` is not the right size.
+        """
+        apply_gate(gate, self._rho, qubits)
+        apply_gate(_conjugate_gate(gate), self._rho, self._column_qubits(qubits))
+
+    def apply_channel(
+        self, kraus_operators: Sequence[ComplexMatrix], qubits: Sequence[int]
+    ) -> None:
+        """Apply the channel with `kraus_operators` (each acting on all of `qubits`),
+        i.e. rho -> sum(K rho K^dagger), in one pass over the register.
+        """
+        terms = [tensor_product(kraus, kraus.conjugate()) for kraus in kraus_operators]
+        superoperator = terms[0]
+        for term in terms[1:]:
+            superoperator = superoperator + term
+        complex_matrix_apply_to_qubits(
+            superoperator, self._rho, list(qubits) + self._column_qubits(qubits)
+        )
+
+    def probabilities(self) -> list[float]:
+        """The probability of each outcome of measuring every qubit
+        (the diagonal of rho).
+        """
+        data = self._rho.to_buffer()
+        step = 2 * (2**self._n + 1)
+        return [data[k] for k in range(0, len(data), step)]
+
+    def sample(
+        self, qubits: Sequence[int], shots: int, rng: random.Random
+    ) -> list[int]:
+        """Measure `qubits` `shots` times without changing the state,
+        with each outcome packed into an integer whose most significant bit
+        is `qubits[0]`.
+        """
+        probabilities = marginal_probabilities(self.probabilities(), qubits)
+        return sample_outcomes(probabilities, shots, rng)
+
+    def measure(self, qubits: Sequence[int], rng: random.Random) -> int:
+        """Measure `qubits`, collapsing the state, with the outcome packed into
+        an integer whose most significant bit is `qubits[0]`.
+        """
+        probabilities = marginal_probabilities(self.probabilities(), qubits)
+        (outcome,) = sample_outcomes(probabilities, 1, rng)
+        # Keep the rows and columns where the qubits are outcome (P rho P),
+        # then divide by the trace, rather than the norm project_qubits uses.
+        project_qubits(
+            self._rho,
+            list(qubits) + self._column_qubits(qubits),
+            (outcome << len(qubits)) | outcome,
+        )
+        self._rho = (1 / sum(self.probabilities())) * self._rho
+        return outcome
+
+    def expectation_values(
+        self, pauli_strings: Sequence[str], qubits: Sequence[int]
+    ) -> list[float]:
+        """The expectation value (the trace of rho P) of each Pauli string P,
+        whose first Pauli acts on `qubits[0]`.
+        """
+        size = 2**self._n
+        data = self._rho.to_buffer()
+        values: list[float] = []
+        for pauli_string in pauli_strings:
+            flip, sign, ys = pauli_masks(pauli_string, qubits, self._n)
+            total = 0j
+            for j in range(size):
+                k = 2 * ((j ^ flip) * size + j)
+                element = complex(data[k], data[k + 1])
+                total += -element if (j & sign).bit_count() & 1 else element
+            values.append((total * (-1j) ** ys).real)
+        trace = sum(self.probabilities())
+        return [value / trace for value in values]
+
+    def probability(self, qubits: Sequence[int], outcome: int) -> float:
+        """The probability that measuring `qubits` gives `outcome`
+        (with `qubits[0]` as its most significant bit).
+        """
+        mask, target = outcome_mask(qubits, outcome, self._n)
+        probabilities = self.probabilities()
+        matching = sum(p for i, p in enumerate(probabilities) if i & mask == target)
+        return matching / sum(probabilities)
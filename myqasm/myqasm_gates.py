@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import math
+from typing import Optional, Sequence
+
+from complex_matrices import ComplexMatrix, SparseComplexMatrix, tensor_product
+from complex_vectors import ComplexVector
+from shared import (
+    complex_matrix_apply_to_qubits,
+    complex_matrix_vector_multiply,
+    qubit_count,
+)
+
+
+class IdentityGate:
+    def __init__(self, size: int) -> None:
+        """The `size` x `size` identity gate.
+
+        None of its elements are stored, so e.g. `I1024` costs nothing to create,
+        and applying it does nothing.
+        """
+        self._size = size
+
+    def get_height(self) -> int:
+        return self._size
+
+    def get_width(self) -> int:
+        return self._size
+
+    def to_matrix(self) -> SparseComplexMatrix:
+        return SparseComplexMatrix.identity(self._size)
+
+    def adjoint(self) -> IdentityGate:
+        return self
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, IdentityGate):
+            return self._size == other._size
+        elif isinstance(other, ComplexMatrix | SparseComplexMatrix):
+            return self.to_matrix() == other
+        return NotImplemented
+
+
+def _is_power_of_two(n: int) -> bool:
+    return n > 0 and n & (n - 1) == 0
+
+
+class KroneckerGate:
+    def __init__(
+        self, factors: Sequence[ComplexMatrix | SparseComplexMatrix | IdentityGate]
+    ) -> None:
+        """The tensor product of `factors`, which is never calculated.
+
+        Each factor must act on a whole number of qubits (i.e. its size is a power
+        of 2), and is applied to its own qubits of a state in turn,
+        so memory and the time to apply the gate are proportional to the sizes of
+        the factors rather than the size of their product.
+        """
+        self._factors: list[ComplexMatrix | SparseComplexMatrix | IdentityGate] = []
+        for factor in factors:
+            if not _is_power_of_two(factor.get_height()):
+                raise ValueError("Factors must act on a whole number of qubits.")
+            previous = self._factors[-1] if self._factors else None
+            if isinstance(factor, IdentityGate) and isinstance(previous, IdentityGate):
+                # Neighbouring identities are one bigger identity.
+                self._factors[-1] = IdentityGate(
+                    previous.get_height() * factor.get_height()
+                )
+            else:
+                self._factors.append(factor)
+
+    def get_factors(self) -> list[ComplexMatrix | SparseComplexMatrix | IdentityGate]:
+        return self._factors
+
+    def get_height(self) -> int:
+        return math.prod(factor.get_height() for factor in self._factors)
+
+    def get_width(self) -> int:
+        return self.get_height()
+
+    def to_matrix(self) -> ComplexMatrix | SparseComplexMatrix:
+        matrix = gate_to_matrix(self._factors[0])
+        for factor in self._factors[1:]:
+            matrix = tensor_product(matrix, gate_to_matrix(factor))
+        return matrix
+
+    def adjoint(self) -> KroneckerGate:
+        return KroneckerGate([factor.adjoint() for factor in self._factors])
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(
+            other, ComplexMatrix | SparseComplexMatrix | IdentityGate | KroneckerGate
+        ):
+            return self.to_matrix() == gate_to_matrix(other)
+        return NotImplemented
+
+
+MYQASMGate = ComplexMatrix | SparseComplexMatrix | IdentityGate | KroneckerGate
+
+
+def gate_to_matrix(gate: MYQASMGate) -> ComplexMatrix | SparseComplexMatrix:
+    if isinstance(gate, IdentityGate | KroneckerGate):
+        return gate.to_matrix()
+    return gate
+
+
+def concat_gates(gate1: MYQASMGate, gate2: MYQASMGate) -> MYQASMGate:
+    """The gate that does `gate2` then `gate1` (i.e. their product).
+
+    Raises ValueError if the gates are different sizes.
+    """
+    if isinstance(gate1, IdentityGate) or isinstance(gate2, IdentityGate):
+        if gate1.get_height() != gate2.get_height():
+            raise ValueError("Cannot CONCAT gates of different sizes.")
+        return gate2 if isinstance(gate1, IdentityGate) else gate1
+    if isinstance(gate1, KroneckerGate) and isinstance(gate2, KroneckerGate):
+        factors1 = gate1.get_factors()
+        factors2 = gate2.get_factors()
+        if [f.get_height() for f in factors1] == [f.get_height() for f in factors2]:
+            # (A TENSOR B) CONCAT (C TENSOR D) = (A CONCAT C) TENSOR (B CONCAT D)
+            factors = [concat_gates(f1, f2) for f1, f2 in zip(factors1, factors2)]
+            return KroneckerGate(factors)  # type: ignore
+    return gate_to_matrix(gate1) * gate_to_matrix(gate2)
+
+
+def tensor_gates(gate1: MYQASMGate, gate2: MYQASMGate) -> MYQASMGate:
+    """The gate that does `gate1` and `gate2` in parallel.
+
+    If both act on a whole number of qubits, this is a `KroneckerGate`,
+    so the product is never calculated.
+    """
+    if isinstance(gate1, IdentityGate) and isinstance(gate2, IdentityGate):
+        return IdentityGate(gate1.get_height() * gate2.get_height())
+    if _is_power_of_two(gate1.get_height()) and _is_power_of_two(gate2.get_height()):
+        factors: list[ComplexMatrix | SparseComplexMatrix | IdentityGate] = []
+        for gate in [gate1, gate2]:
+            if isinstance(gate, KroneckerGate):
+                factors.extend(gate.get_factors())
+            else:
+                factors.append(gate)
+        return KroneckerGate(factors)
+    return tensor_product(gate_to_matrix(gate1), gate_to_matrix(gate2))
+
+
+def apply_gate(
+    gate: MYQASMGate, state: ComplexVector, qubits: Optional[Sequence[int]] = None
+) -> None:
+    """Apply `gate` to `qubits` of `state` (by default, all of them), in place.
+
+    Raises ValueError if `gate` is not the right size, or `qubits` are not valid.
+    """
+    if isinstance(gate, IdentityGate | KroneckerGate):
+        size = len(state) if qubits is None else 2 ** len(qubits)
+        if gate.get_height() != size:
+            raise ValueError("Gate and state are different sizes.")
+    if isinstance(gate, IdentityGate):
+        return
+    elif isinstance(gate, KroneckerGate):
+        if qubits is None:
+            qubits = list(range(qubit_count(state)))
+        offset = 0
+        for factor in gate.get_factors():
+            k = factor.get_height().bit_length() - 1
+            apply_gate(factor, state, qubits[offset : offset + k])
+            offset += k
+    elif qubits is None:
+        complex_matrix_vector_multiply(gate, state, out=state)
+    else:
+        complex_matrix_apply_to_qubits(gate, state, qubits)
@@ -0,0 +1,544 @@
+from __future__ import annotations
+
+import bisect
+import itertools
+import math
+import mmap
+import random
+import tempfile
+from array import array
+from typing import Any, Callable, Optional, Sequence
+
+from complex_numbers import packed_view, use_numpy
+from complex_vectors import ComplexVector
+from shared import marginal_probabilities, outcome_mask, pauli_masks, sample_outcomes
+
+from .myqasm_gates import IdentityGate, KroneckerGate, MYQASMGate, apply_gate
+
+# Each block is 2^16 amplitudes (1 MiB), a whole number of pages.
+DEFAULT_BLOCK_QUBITS = 16
+
+# Bytes of one amplitude (a real and an imaginary double).
+_AMPLITUDE_SIZE = 16
+
+
+def _insert_zero_bits(value: int, positions: Sequence[int]) -> int:
+    """`value` with a 0 bit inserted at each of `positions` (in increasing order)."""
+    for position in positions:
+        low = value & ((1 << position) - 1)
+        value = ((value >> position) << (position + 1)) | low
+    return value
+
+
+def _block_probabilities(block: ComplexVector) -> Sequence[float]:
+    data = block.to_buffer()
+    if use_numpy():
+        import numpy
+
+        state = numpy.frombuffer(data, dtype=numpy.complex128)
+        return state.real**2 + state.imag**2
+    return [
+        data[k] * data[k] + data[k + 1] * data[k + 1] for k in range(0, len(data), 2)
+    ]
+
+
+def _block_total(block: ComplexVector) -> float:
+    """The sum of the probabilities of the amplitudes of `block`."""
+    probabilities = _block_probabilities(block)
+    if use_numpy():
+        return float(probabilities.sum())  # type: ignore
+    return sum(probabilities)
+
+
+def _pick_in_block(probabilities: Sequence[float], positions: list[float]) -> list[int]:
+    """The index of the amplitude that each of `positions` (between 0 and the total
+    of `probabilities`) lands on, when the probabilities are laid end to end.
+
+    A position rounded up to the total lands on the last amplitude that isn't 0,
+    so an outcome of probability 0 is never picked.
+    """
+    if use_numpy():
+        import numpy
+
+        cumulative = numpy.cumsum(probabilities)
+        chosen = numpy.searchsorted(cumulative, positions, side="right")
+        last = numpy.searchsorted(cumulative, cumulative[-1], side="left")
+        return numpy.minimum(chosen, last).tolist()
+
+    cumulative = list(itertools.accumulate(probabilities))
+    last = bisect.bisect_left(cumulative, cumulative[-1])
+    return [min(bisect.bisect_right(cumulative, u), last) for u in positions]
+
+
+def _block_overlap(a: ComplexVector, b: ComplexVector, flip: int, sign: int) -> complex:
+    """The sum of conjugate(a[j]) * b[j ^ flip], negated where `j & sign`
+    has an odd number of bits set.
+    """
+    if use_numpy():
+        import numpy
+
+        x = numpy.frombuffer(a.to_buffer(), dtype=numpy.complex128)
+        y = numpy.frombuffer(b.to_buffer(), dtype=numpy.complex128)
+        indices = numpy.arange(len(x))
+        parity = numpy.zeros(len(x), dtype=indices.dtype)
+        for position in range(sign.bit_length()):
+            if (sign >> position) & 1:
+                parity ^= (indices >> position) & 1
+        return complex((x.conj() * y[indices ^ flip] * (1 - 2 * parity)).sum())
+
+    x_values, y_values = a.to_complex_list(), b.to_complex_list()
+    total = 0j
+    for j, x in enumerate(x_values):
+        if x == 0:
+            continue
+        product = x.conjugate() * y_values[j ^ flip]
+        total += -product if (j & sign).bit_count() & 1 else product
+    return total
+
+
+def _project_block(block: ComplexVector, mask: int, target: int, scale: float) -> None:
+    """Zero the amplitudes of `block` whose index `i` has `i & mask != target`,
+    and multiply the rest by `scale`, in place.
+    """
+    data = block.to_buffer()
+    if use_numpy():
+        import numpy
+
+        state = numpy.frombuffer(data, dtype=numpy.complex128)
+        state[(numpy.arange(len(state)) & mask) != target] = 0
+        state *= scale
+        return
+    for i in range(len(data) // 2):
+        if i & mask == target:
+            data[2 * i] *= scale
+            data[2 * i + 1] *= scale
+        else:
+            data[2 * i] = data[2 * i + 1] = 0
+
+
+def _block(data: memoryview, block_qubits: int, k: int) -> ComplexVector:
+    """The kth block of the amplitudes `data`, as a vector using its memory."""
+    doubles = 2 << block_qubits
+    return ComplexVector.from_buffer(data[k * doubles : (k + 1) * doubles])
+
+
+# The kernels below each do their part of an operation on the blocks (or groups of
+# blocks) `units` of the 2^n amplitudes `data`, so the units can be split up
+# between processes (see `myqasm_shared_memory`).
+
+
+def _gate_layout(
+    n: int, block_qubits: int, qubits: Sequence[int]
+) -> tuple[list[int], list[int], list[int]]:
+    """For a gate on `qubits`: the gate's qubits in the 2^h blocks it acts on at
+    once (h being the number of `qubits` that choose the block),
+    laid out one after another; the offsets of those blocks from the first;
+    and the bits of the block number that are those qubits.
+    """
+    high = n - block_qubits
+    high_qubits = sorted(q for q in qubits if q < high)
+    h = len(high_qubits)
+    local_qubits = [high_qubits.index(q) if q < high else h + q - high for q in qubits]
+    offsets = [
+        sum(
+            1 << (high - 1 - q)
+            for b, q in enumerate(high_qubits)
+            if (g >> (h - 1 - b)) & 1
+        )
+        for g in range(1 << h)
+    ]
+    positions = sorted(high - 1 - q for q in high_qubits)
+    return local_qubits, offsets, positions
+
+
+def _apply_kernel(
+    data: memoryview,
+    n: int,
+    block_qubits: int,
+    units: range,
+    gate: MYQASMGate,
+    qubits: Sequence[int],
+) -> None:
+    """Apply `gate` to each group of 2^h blocks in `units`."""
+    local_qubits, offsets, positions = _gate_layout(n, block_qubits, qubits)
+    step = 2 << block_qubits
+    for rest in units:
+        base = _insert_zero_bits(rest, positions)
+        if len(offsets) == 1:
+            apply_gate(gate, _block(data, block_qubits, base), local_qubits)
+            continue
+        blocks = array("d")
+        for offset in offsets:
+            start = (base + offset) * step
+            blocks.frombytes(data[start : start + step].cast("B"))
+        apply_gate(gate, ComplexVector.from_buffer(blocks), local_qubits)
+        for g, offset in enumerate(offsets):
+            start = (base + offset) * step
+            data[start : start + step] = blocks[g * step : (g + 1) * step]
+
+
+def _marginal_kernel(
+    data: memoryview, n: int, block_qubits: int, units: range, qubits: Sequence[int]
+) -> list[float]:
+    """The (unnormalized) probability of each outcome of measuring `qubits`,
+    from the blocks `units`.
+    """
+    m = len(qubits)
+    high = n - block_qubits
+    low_qubits = [q for q in qubits if q >= high]
+    # Where the bits of each outcome of measuring the block's qubits go.
+    spread = [0]
+    for q in low_qubits:
+        bit = 1 << (m - 1 - list(qubits).index(q))
+        spread = [outcome | b for outcome in spread for b in (0, bit)]
+    # (Bit of the block number, bit of the outcome) for each other qubit.
+    high_bits = [(high - 1 - q, m - 1 - b) for b, q in enumerate(qubits) if q < high]
+    bases = []
+    for k in units:
+        base = 0
+        for position, bit in high_bits:
+            if (k >> position) & 1:
+                base |= 1 << bit
+        bases.append(base)
+    block_marginals = (
+        marginal_probabilities(
+            _block_probabilities(_block(data, block_qubits, k)),
+            [q - high for q in low_qubits],
+        )
+        for k in units
+    )
+
+    if use_numpy():
+        import numpy
+
+        marginal = numpy.zeros(1 << m)
+        spread_indices = numpy.array(spread)
+        for base, block_marginal in zip(bases, block_marginals):
+            marginal[base | spread_indices] += block_marginal
+        return marginal.tolist()
+
+    totals = [0.0] * (1 << m)
+    for base, block_marginal in zip(bases, block_marginals):
+        for low_outcome, p in enumerate(block_marginal):
+            totals[base | spread[low_outcome]] += p
+    return totals
+
+
+def _project_kernel(
+    data: memoryview,
+    n: int,
+    block_qubits: int,
+    units: range,
+    mask: int,
+    target: int,
+    scale: float,
+) -> None:
+    """Zero the amplitudes of the blocks `units` whose index `i` has
+    `i & mask != target`, and multiply the rest by `scale`.
+    """
+    block_mask = (1 << block_qubits) - 1
+    step = 2 << block_qubits
+    zeros = array("d", bytes(8 * step))
+    for k in units:
+        if (k & (mask >> block_qubits)) != target >> block_qubits:
+            data[k * step : (k + 1) * step] = zeros
+        else:
+            _project_block(
+                _block(data, block_qubits, k),
+                mask & block_mask,
+                target & block_mask,
+                scale,
+            )
+
+
+def _norm_kernel(data: memoryview, n: int, block_qubits: int, units: range) -> float:
+    """The sum of the probabilities of the blocks `units`."""
+    return sum(_block_total(_block(data, block_qubits, k)) for k in units)
+
+
+def _block_totals_kernel(
+    data: memoryview, n: int, block_qubits: int, units: range
+) -> list[float]:
+    """The total probability of each of the blocks `units`."""
+    return [_block_total(_block(data, block_qubits, k)) for k in units]
+
+
+def _masked_probability_kernel(
+    data: memoryview,
+    n: int,
+    block_qubits: int,
+    units: range,
+    mask: int,
+    target: int,
+) -> tuple[float, float]:
+    """The sum of the probabilities of the amplitudes of the blocks `units` whose
+    index `i` has `i & mask == target`, and the sum of all of their probabilities.
+    """
+    block_mask = (1 << block_qubits) - 1
+    low_mask, low_target = mask & block_mask, target & block_mask
+    matching = total = 0.0
+    for k in units:
+        probabilities = _block_probabilities(_block(data, block_qubits, k))
+        if use_numpy():
+            import numpy
+
+            total += float(probabilities.sum())  # type: ignore
+            if (k & (mask >> block_qubits)) == target >> block_qubits:
+                kept = (numpy.arange(len(probabilities)) & low_mask) == low_target
+                matching += float(probabilities[kept].sum())  # type: ignore
+            continue
+        total += sum(probabilities)
+        if (k & (mask >> block_qubits)) == target >> block_qubits:
+            matching += sum(
+                p for i, p in enumerate(probabilities) if i & low_mask == low_target
+            )
+    return matching, total
+
+
+def _overlap_kernel(
+    data: memoryview,
+    n: int,
+    block_qubits: int,
+    units: range,
+    flip: int,
+    sign: int,
+) -> complex:
+    """The part of <psi|P|psi> from the blocks `units`, where P is the Pauli string
+    with bit masks `flip` and `sign` (see `shared.pauli_masks`), without its phase.
+    """
+    block_mask = (1 << block_qubits) - 1
+    total = 0j
+    for k in units:
+        overlap = _block_overlap(
+            _block(data, block_qubits, k),
+            _block(data, block_qubits, k ^ (flip >> block_qubits)),
+            flip & block_mask,
+            sign & block_mask,
+        )
+        total += -overlap if (k & (sign >> block_qubits)).bit_count() & 1 else overlap
+    return total
+
+
+class _BlockRegister:
+    """A state vector split into blocks of 2^block_qubits consecutive amplitudes
+    (the states of the last `block_qubits` qubits),
+    which gates and measurements work on a few at a time.
+
+    Subclasses provide the storage (`_data`, the packed amplitudes)
+    and can override `_run` to run the kernels' units elsewhere.
+    """
+
+    _n: int
+    _block_qubits: int
+    _data: memoryview
+
+    def _run(self, kernel: Callable[..., Any], units: int, *args: Any) -> list[Any]:
+        """The results of running `kernel` on `units` units, with `args`
+        (one result for each part the units are split into).
+        """
+        return [kernel(self._data, self._n, self._block_qubits, range(units), *args)]
+
+    def get_qubit_count(self) -> int:
+        return self._n
+
+    def get_block_qubits(self) -> int:
+        return self._block_qubits
+
+    def _block_count(self) -> int:
+        return 1 << (self._n - self._block_qubits)
+
+    def to_state_vector(self) -> ComplexVector:
+        """The 2^n amplitudes of the state, in memory (so only for small registers)."""
+        return ComplexVector.from_buffer(array("d", self._data))
+
+    def apply_gate(self, gate: MYQASMGate, qubits: Sequence[int]) -> None:
+        """Apply `gate` to `qubits` (qubit 0 being the leftmost).
+
+        Raises ValueError if `gate` is not the right size.
+        """
+        if gate.get_height() != 2 ** len(qubits):
+            raise ValueError("Gate and qubits are different sizes.")
+        if isinstance(gate, IdentityGate):
+            return
+        if isinstance(gate, KroneckerGate):
+            # Apply each factor separately, so only a few blocks are needed at once.
+            offset = 0
+            for factor in gate.get_factors():
+                k = factor.get_height().bit_length() - 1
+                self.apply_gate(factor, qubits[offset : offset + k])
+                offset += k
+            return
+        _, offsets, _ = _gate_layout(self._n, self._block_qubits, qubits)
+        self._run(_apply_kernel, self._block_count() // len(offsets), gate, qubits)
+
+    def _marginal_probabilities(self, qubits: Sequence[int]) -> list[float]:
+        """The (unnormalized) probability of each outcome of measuring `qubits`,
+        in one pass over the blocks.
+
+        Only for qubits that `_fits_marginal` (for more, see `_sample_indices`).
+        """
+        parts = self._run(_marginal_kernel, self._block_count(), qubits)
+        if len(parts) == 1:
+            return parts[0]
+        if use_numpy():
+            import numpy
+
+            return numpy.sum(parts, axis=0).tolist()
+        return [sum(ps) for ps in zip(*parts)]
+
+    def _fits_marginal(self, qubits: Sequence[int]) -> bool:
+        """Whether the probabilities of the 2^m outcomes of measuring `qubits`
+        are small enough to find in one pass: no more than a block's amplitudes.
+        """
+        return len(qubits) <= self._block_qubits
+
+    def _sample_indices(self, shots: int, rng: random.Random) -> list[int]:
+        """Measure every qubit `shots` times without changing the state,
+        streaming over the blocks: one pass for the total probability of each block,
+        then each shot picks a block, and an amplitude in that block,
+        so only the blocks picked are read again.
+        """
+        totals = [
+            total
+            for part in self._run(_block_totals_kernel, self._block_count())
+            for total in part
+        ]
+        cumulative = list(itertools.accumulate(totals))
+        last = bisect.bisect_left(cumulative, cumulative[-1])
+        # The shots that pick each block, and how far into its probability they land.
+        picks: dict[int, list[tuple[int, float]]] = {}
+        for shot in range(shots):
+            u = rng.random() * cumulative[-1]
+            k = min(bisect.bisect_right(cumulative, u), last)
+            picks.setdefault(k, []).append((shot, u - (cumulative[k - 1] if k else 0)))
+        indices = [0] * shots
+        for k, landed in picks.items():
+            probabilities = _block_probabilities(
+                _block(self._data, self._block_qubits, k)
+            )
+            chosen = _pick_in_block(probabilities, [u for _, u in landed])
+            for (shot, _), i in zip(landed, chosen):
+                indices[shot] = (k << self._block_qubits) | i
+        return indices
+
+    def _outcome(self, index: int, qubits: Sequence[int]) -> int:
+        """The outcome of measuring `qubits` in the basis state `index`."""
+        outcome = 0
+        for q in qubits:
+            outcome = (outcome << 1) | ((index >> (self._n - 1 - q)) & 1)
+        return outcome
+
+    def sample(
+        self, qubits: Sequence[int], shots: int, rng: random.Random
+    ) -> list[int]:
+        """Measure `qubits` `shots` times without changing the state,
+        with each outcome packed into an integer whose most significant bit
+        is `qubits[0]`.
+
+        Qubits that don't `_fits_marginal` are sampled with `_sample_indices`,
+        so the 2^m outcomes' probabilities are never all in memory.
+        """
+        if self._fits_marginal(qubits):
+            return sample_outcomes(self._marginal_probabilities(qubits), shots, rng)
+        return [self._outcome(i, qubits) for i in self._sample_indices(shots, rng)]
+
+    def measure(self, qubits: Sequence[int], rng: random.Random) -> int:
+        """Measure `qubits`, collapsing the state, with the outcome packed into
+        an integer whose most significant bit is `qubits[0]`.
+
+        Takes two passes over the blocks: one for the probabilities,
+        and one to collapse and renormalize each block.
+        Qubits that don't `_fits_marginal` take a third pass, as the outcome is
+        sampled with `_sample_indices` before its probability is found.
+        """
+        if self._fits_marginal(qubits):
+            marginal = self._marginal_probabilities(qubits)
+            (outcome,) = sample_outcomes(marginal, 1, rng)
+            probability = marginal[outcome]
+            mask, target = outcome_mask(qubits, outcome, self._n)
+        else:
+            (index,) = self._sample_indices(1, rng)
+            outcome = self._outcome(index, qubits)
+            mask, target = outcome_mask(qubits, outcome, self._n)
+            probability = sum(
+                matching
+                for matching, _ in self._run(
+                    _masked_probability_kernel, self._block_count(), mask, target
+                )
+            )
+        scale = 1 / math.sqrt(probability)
+        self._run(_project_kernel, self._block_count(), mask, target, scale)
+        return outcome
+
+    def expectation_values(
+        self, pauli_strings: Sequence[str], qubits: Sequence[int]
+    ) -> list[float]:
+        """The expectation value of each Pauli string, whose first Pauli acts on
+        `qubits[0]`, with one pass over the blocks (pairing up the blocks the string
+        flips between) for each string.
+        """
+        norm = sum(self._run(_norm_kernel, self._block_count()))
+        values: list[float] = []
+        for pauli_string in pauli_strings:
+            flip, sign, ys = pauli_masks(pauli_string, qubits, self._n)
+            total = sum(self._run(_overlap_kernel, self._block_count(), flip, sign))
+            values.append((total * (-1j) ** ys).real / norm)
+        return values
+
+    def probability(self, qubits: Sequence[int], outcome: int) -> float:
+        """The probability that measuring `qubits` gives `outcome`
+        (with `qubits[0]` as its most significant bit), in one pass over the blocks.
+        """
+        mask, target = outcome_mask(qubits, outcome, self._n)
+        parts = self._run(_masked_probability_kernel, self._block_count(), mask, target)
+        return sum(matching for matching, _ in parts) / sum(total for _, total in parts)
+
+
+class MappedRegister(_BlockRegister):
+    def __init__(
+        self,
+        qubit_count: int,
+        initial_state: str | None = None,
+        directory: Optional[str] = None,
+        block_qubits: int = DEFAULT_BLOCK_QUBITS,
+    ) -> None:
+        """A state vector register stored in a memory-mapped temporary file
+        (in `directory`, by default the system's temporary directory),
+        so it can be larger than physical memory.
+
+        The 2^n amplitudes are split into blocks of 2^`block_qubits` consecutive
+        amplitudes (the states of the last `block_qubits` qubits).
+        Gates and measurements stream over the file a few blocks at a time,
+        so only those pages need to be in memory at once:
+        a gate acting on h of the other qubits works on 2^h blocks at a time.
+
+        The file starts sparse (all zeros), so creating a register is quick
+        whatever its size, and is deleted when the register is.
+        """
+        self._n = qubit_count
+        self._block_qubits = min(block_qubits, qubit_count)
+        self._open(directory)
+        basis_state = int(initial_state, 2) if initial_state else 0
+        self._data[2 * basis_state] = 1
+
+    def _open(self, directory: Optional[str]) -> None:
+        self._directory = directory
+        size = _AMPLITUDE_SIZE << self._n
+        # The map keeps its own handle on the (already unlinked) file.
+        with tempfile.TemporaryFile(dir=directory) as file:
+            file.truncate(size)
+            self._map = mmap.mmap(file.fileno(), size)
+        self._data = packed_view(self._map)
+
+    def copy(self) -> MappedRegister:
+        """A new register (with its own file) in the same state,
+        copied a block at a time.
+        """
+        new = MappedRegister.__new__(MappedRegister)
+        new._n = self._n
+        new._block_qubits = self._block_qubits
+        new._open(self._directory)
+        step = _AMPLITUDE_SIZE << self._block_qubits
+        for start in range(0, len(self._map), step):
+            new._map[start : start + step] = self._map[start : start + step]
+        return new
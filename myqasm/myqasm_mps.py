@@ -0,0 +1,468 @@
+from __future__ import annotations
+
+import math
+import random
+from typing import Sequence
+
+from complex_matrices import SparseComplexMatrix
+from complex_numbers import use_numpy
+from complex_vectors import ComplexVector
+
+from .myqasm_gates import IdentityGate, KroneckerGate, MYQASMGate, gate_to_matrix
+
+DEFAULT_MAX_BOND_DIMENSION = 64
+DEFAULT_TRUNCATION_THRESHOLD = 1e-10
+
+# The tensor of one site, indexed [left bond][physical index][right bond].
+_Tensor = list[list[list[complex]]]
+
+_SWAP: list[list[complex]] = [[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]]
+
+_PAULIS: dict[str, list[list[complex]]] = {
+    "X": [[0, 1], [1, 0]],
+    "Y": [[0, -1j], [1j, 0]],
+    "Z": [[1, 0], [0, -1]],
+}
+
+
+def _adjoint(rows: list[list[complex]]) -> list[list[complex]]:
+    return [[row[j].conjugate() for row in rows] for j in range(len(rows[0]))]
+
+
+def _jacobi_svd(
+    rows: list[list[complex]],
+) -> tuple[list[list[complex]], list[float], list[list[complex]]]:
+    """One-sided Jacobi SVD: rotate pairs of columns until they are orthogonal,
+    when the columns are the left singular vectors times the singular values.
+    """
+    height, width = len(rows), len(rows[0])
+    if width > height:
+        # Decompose the adjoint, which has fewer columns.
+        u, s, vh = _jacobi_svd(_adjoint(rows))
+        return _adjoint(vh), s, _adjoint(u)
+    columns = [[complex(row[j]) for row in rows] for j in range(width)]
+    v_columns = [[complex(i == j) for i in range(width)] for j in range(width)]
+    for _ in range(100):
+        rotated = False
+        for i in range(width - 1):
+            for j in range(i + 1, width):
+                a, b = columns[i], columns[j]
+                alpha = sum(x.real * x.real + x.imag * x.imag for x in a)
+                beta = sum(y.real * y.real + y.imag * y.imag for y in b)
+                gamma = sum(x.conjugate() * y for x, y in zip(a, b))
+                if abs(gamma) <= 1e-13 * math.sqrt(alpha * beta):
+                    continue
+                rotated = True
+                # Rotate a and the phase-corrected b = b * conj(phase),
+                # whose inner product is then real.
+                phase = (gamma / abs(gamma)).conjugate()
+                zeta = (beta - alpha) / (2 * abs(gamma))
+                t = math.copysign(1, zeta) / (abs(zeta) + math.sqrt(1 + zeta * zeta))
+                c = 1 / math.sqrt(1 + t * t)
+                s = c * t
+                for vectors in [columns, v_columns]:
+                    a, b = vectors[i], vectors[j]
+                    vectors[i] = [c * x - s * phase * y for x, y in zip(a, b)]
+                    vectors[j] = [s * x + c * phase * y for x, y in zip(a, b)]
+        if not rotated:
+            break
+    norms = [math.sqrt(sum(abs(x) ** 2 for x in column)) for column in columns]
+    order = [k for k in sorted(range(width), key=lambda k: -norms[k]) if norms[k]]
+    u = [[columns[k][i] / norms[k] for k in order] for i in range(height)]
+    vh = [[v_columns[k][j].conjugate() for j in range(width)] for k in order]
+    return u, [norms[k] for k in order], vh
+
+
+def _svd(
+    rows: list[list[complex]],
+) -> tuple[list[list[complex]], list[float], list[list[complex]]]:
+    """`rows = u diag(s) vh`, with the singular values `s` in decreasing order."""
+    if use_numpy():
+        import numpy
+
+        u, s, vh = numpy.linalg.svd(
+            numpy.array(rows, dtype=complex), full_matrices=False
+        )
+        return u.tolist(), s.tolist(), vh.tolist()
+    return _jacobi_svd(rows)
+
+
+def _contract(theta: _Tensor, site: _Tensor) -> _Tensor:
+    """Join `site` onto the right of `theta`, whose physical index becomes the
+    more significant part of the new physical index.
+    """
+    right = range(len(site[0][0]))
+    return [
+        [
+            [sum(vector[m] * site[m][t][r] for m in range(len(vector))) for r in right]
+            for vector in row
+            for t in range(2)
+        ]
+        for row in theta
+    ]
+
+
+def _gate_rows(gate: MYQASMGate) -> list[list[complex]]:
+    matrix = gate_to_matrix(gate)
+    if isinstance(matrix, SparseComplexMatrix):
+        matrix = matrix.to_dense()
+    return matrix.to_complex_list()
+
+
+def _move_orthogonality_center(sites: list[_Tensor], center: int, site: int) -> int:
+    """Move the orthogonality center of `sites` from `center` to `site`, without
+    truncating, and return it. The tensors are replaced in the list, never changed,
+    so a copy of the list can be moved without changing the original.
+    """
+    while center < site:
+        c = center
+        tensor = sites[c]
+        u, s, vh = _svd([vector for row in tensor for vector in row])
+        sites[c] = [[u[l * 2 + t] for t in range(2)] for l in range(len(tensor))]
+        rest = [[s_k * x for x in row] for s_k, row in zip(s, vh)]
+        sites[c + 1] = _contract([[row] for row in rest], sites[c + 1])
+        center += 1
+    while center > site:
+        c = center
+        tensor = sites[c]
+        right = len(tensor[0][0])
+        u, s, vh = _svd([[x for vector in row for x in vector] for row in tensor])
+        sites[c] = [[row[t * right : (t + 1) * right] for t in range(2)] for row in vh]
+        left = sites[c - 1]
+        sites[c - 1] = [
+            [
+                [
+                    sum(vector[m] * u[m][k] for m in range(len(vector))) * s_k
+                    for k, s_k in enumerate(s)
+                ]
+                for vector in row
+            ]
+            for row in left
+        ]
+        center -= 1
+    return center
+
+
+class MPSRegister:
+    def __init__(
+        self,
+        qubit_count: int,
+        initial_state: str | None = None,
+        max_bond_dimension: int = DEFAULT_MAX_BOND_DIMENSION,
+        truncation_threshold: float = DEFAULT_TRUNCATION_THRESHOLD,
+    ) -> None:
+        """A register stored as a matrix product state: one small tensor per qubit,
+        joined to its neighbours by bonds of at most `max_bond_dimension`.
+
+        Memory is O(n * max_bond_dimension^2) rather than O(2^n), so circuits with
+        little entanglement (e.g. shallow, nearest neighbour circuits) can be run on
+        many more qubits than a state vector allows.
+
+        After each gate on more than one qubit, the smallest singular values are
+        dropped while their total weight (the sum of their squares) is at most
+        `truncation_threshold`, and then down to `max_bond_dimension` of them.
+        The total weight dropped is kept as `get_truncation_error`, which bounds
+        how far the state is from the exact one.
+
+        Gates on qubits that aren't next to each other swap the sites of the qubits
+        until they are. The qubits are left in their new sites, rather than swapped
+        back, so `_positions` is the site of each qubit,
+        and `_qubits` the qubit at each site.
+        """
+        if max_bond_dimension < 1:
+            raise ValueError("The maximum bond dimension must be at least 1.")
+        self._n = qubit_count
+        self._max_bond_dimension = max_bond_dimension
+        self._truncation_threshold = truncation_threshold
+        self._truncation_error = 0.0
+        bits = initial_state if initial_state is not None else "0" * qubit_count
+        self._sites: list[_Tensor] = [
+            [[[complex(s == int(bit))] for s in range(2)]] for bit in bits
+        ]
+        # Every site apart from this one is left canonical (if to its left)
+        # or right canonical (if to its right).
+        self._center = 0
+        self._positions = list(range(qubit_count))
+        self._qubits = list(range(qubit_count))
+
+    def copy(self) -> MPSRegister:
+        new = MPSRegister.__new__(MPSRegister)
+        new.__dict__.update(self.__dict__)
+        new._sites = [
+            [[vector[:] for vector in row] for row in site] for site in self._sites
+        ]
+        new._positions = self._positions[:]
+        new._qubits = self._qubits[:]
+        return new
+
+    def get_qubit_count(self) -> int:
+        return self._n
+
+    def get_max_bond_dimension(self) -> int:
+        return self._max_bond_dimension
+
+    def get_truncation_threshold(self) -> float:
+        return self._truncation_threshold
+
+    def get_truncation_error(self) -> float:
+        """The total weight of the singular values dropped so far,
+        an upper bound on 1 - fidelity with the exact state (to first order).
+        """
+        return self._truncation_error
+
+    def get_bond_dimensions(self) -> list[int]:
+        """The dimension of the bond between each pair of neighbouring sites."""
+        return [len(site[0][0]) for site in self._sites[:-1]]
+
+    def _move_center(self, site: int) -> None:
+        """Move the orthogonality center to `site`, without truncating."""
+        self._center = _move_orthogonality_center(self._sites, self._center, site)
+
+    def _truncate(self, s: list[float]) -> tuple[int, float]:
+        """How many singular values to keep, and what to scale them by to keep the
+        state normalized, adding the weight dropped to the truncation error.
+        """
+        weights = [s_k * s_k for s_k in s]
+        total = sum(weights)
+        keep = len(s)
+        dropped = 0.0
+        while keep > 1 and (
+            weights[keep - 1] == 0
+            or dropped + weights[keep - 1] <= self._truncation_threshold * total
+            or keep > self._max_bond_dimension
+        ):
+            keep -= 1
+            dropped += weights[keep]
+        self._truncation_error += dropped / total
+        return keep, math.sqrt(total / (total - dropped))
+
+    def _apply_to_sites(self, start: int, k: int, gate: list[list[complex]]) -> None:
+        """Apply the 2^k x 2^k `gate` to sites `start` to `start + k - 1`."""
+        if k == 1:
+            # A unitary on one site keeps it canonical.
+            self._sites[start] = [
+                [
+                    [
+                        sum(gate[s][t] * vector[t][r] for t in range(2))
+                        for r in range(len(vector[0]))
+                    ]
+                    for s in range(2)
+                ]
+                for vector in self._sites[start]
+            ]
+            return
+        self._move_center(start)
+        theta = self._sites[start]
+        for site in self._sites[start + 1 : start + k]:
+            theta = _contract(theta, site)
+        nonzeros = [[(t, g) for t, g in enumerate(row) if g != 0] for row in gate]
+        theta = [
+            [
+                [sum(g * row[t][r] for t, g in entries) for r in range(len(row[0]))]
+                for entries in nonzeros
+            ]
+            for row in theta
+        ]
+        # Split theta back into k sites, left to right.
+        for offset in range(k - 1):
+            left, half, right = len(theta), len(theta[0]) // 2, len(theta[0][0])
+            u, s, vh = _svd(
+                [
+                    [x for vector in row[t * half : (t + 1) * half] for x in vector]
+                    for row in theta
+                    for t in range(2)
+                ]
+            )
+            keep, scale = self._truncate(s)
+            self._sites[start + offset] = [
+                [u[l * 2 + t][:keep] for t in range(2)] for l in range(left)
+            ]
+            theta = [
+                [
+                    [scale * s[c] * x for x in vh[c][p * right : (p + 1) * right]]
+                    for p in range(half)
+                ]
+                for c in range(keep)
+            ]
+        self._sites[start + k - 1] = theta
+        self._center = start + k - 1
+
+    def _swap_sites(self, site: int) -> None:
+        """Swap the qubits at `site` and `site + 1`."""
+        self._apply_to_sites(site, 2, _SWAP)
+        a, b = self._qubits[site], self._qubits[site + 1]
+        self._qubits[site], self._qubits[site + 1] = b, a
+        self._positions[a], self._positions[b] = site + 1, site
+
+    def apply_gate(self, gate: MYQASMGate, qubits: Sequence[int]) -> None:
+        """Apply `gate` to `qubits` (qubit 0 being the leftmost).
+
+        Raises ValueError if `gate` is not the right size.
+        """
+        if gate.get_height() != 2 ** len(qubits):
+            raise ValueError("Gate and qubits are different sizes.")
+        if isinstance(gate, IdentityGate):
+            return
+        if isinstance(gate, KroneckerGate):
+            offset = 0
+            for factor in gate.get_factors():
+                k = factor.get_height().bit_length() - 1
+                self.apply_gate(factor, qubits[offset : offset + k])
+                offset += k
+            return
+        # Move each qubit to the site after the one before it.
+        for previous, qubit in zip(qubits, qubits[1:]):
+            while self._positions[qubit] != self._positions[previous] + 1:
+                position = self._positions[qubit]
+                if position > self._positions[previous]:
+                    self._swap_sites(position - 1)
+                else:
+                    self._swap_sites(position)
+        self._apply_to_sites(self._positions[qubits[0]], len(qubits), _gate_rows(gate))
+
+    def measure(self, qubits: Sequence[int], rng: random.Random) -> int:
+        """Measure `qubits`, collapsing the state, with the outcome packed into
+        an integer whose most significant bit is `qubits[0]`.
+
+        Each qubit is measured at the orthogonality center, where the probabilities
+        (and the collapse) only involve its own site.
+        """
+        outcome = 0
+        for q in qubits:
+            site = self._positions[q]
+            self._move_center(site)
+            tensor = self._sites[site]
+            p0, p1 = (
+                sum(abs(x) ** 2 for row in tensor for x in row[t]) for t in range(2)
+            )
+            t = 0 if rng.random() * (p0 + p1) < p0 else 1
+            norm = math.sqrt(p1 if t else p0)
+            self._sites[site] = [
+                [[x / norm if s == t else 0j for x in row[s]] for s in range(2)]
+                for row in tensor
+            ]
+            outcome = (outcome << 1) | t
+        return outcome
+
+    def sample(
+        self, qubits: Sequence[int], shots: int, rng: random.Random
+    ) -> list[int]:
+        """Measure `qubits` `shots` times without changing the state,
+        with each outcome packed into an integer whose most significant bit
+        is `qubits[0]`.
+
+        Each shot measures every site in turn, from the left,
+        which only needs the sites to the right to be right canonical.
+        They are made so in a list of their own, as the register may be shared
+        (by a FORK or snapshot), so must only be read.
+        """
+        sites = self._sites[:]
+        _move_orthogonality_center(sites, self._center, 0)
+        outcomes: list[int] = []
+        for _ in range(shots):
+            bits = [0] * self._n
+            environment: list[complex] = [1]
+            for site, tensor in enumerate(sites):
+                right = range(len(tensor[0][0]))
+                vectors = [
+                    [
+                        sum(e * tensor[l][t][r] for l, e in enumerate(environment))
+                        for r in right
+                    ]
+                    for t in range(2)
+                ]
+                p0, p1 = (sum(abs(x) ** 2 for x in vector) for vector in vectors)
+                t = 0 if rng.random() * (p0 + p1) < p0 else 1
+                norm = math.sqrt(p1 if t else p0)
+                environment = [x / norm for x in vectors[t]]
+                bits[self._qubits[site]] = t
+            outcome = 0
+            for q in qubits:
+                outcome = (outcome << 1) | bits[q]
+            outcomes.append(outcome)
+        return outcomes
+
+    def to_state_vector(self) -> ComplexVector:
+        """The 2^n amplitudes of the state (so only for small registers)."""
+        theta: _Tensor = [[[1]]]
+        for site in self._sites:
+            theta = _contract(theta, site)
+        amplitudes = [vector[0] for vector in theta[0]]
+        state = [0j] * len(amplitudes)
+        for i, amplitude in enumerate(amplitudes):
+            index = 0
+            for site, qubit in enumerate(self._qubits):
+                if (i >> (self._n - 1 - site)) & 1:
+                    index |= 1 << (self._n - 1 - qubit)
+            state[index] = amplitude
+        return ComplexVector.from_complex(state)
+
+    def _expectation(self, operators: dict[int, list[list[complex]]]) -> complex:
+        """<psi|O|psi>, where O is `operators[site]` on each of those sites
+        (and the identity on the others), contracted site by site from the left.
+        """
+        environment: list[list[complex]] = [[1]]
+        for site, tensor in enumerate(self._sites):
+            operator = operators.get(site)
+            left, right = range(len(tensor)), range(len(tensor[0][0]))
+            ket = tensor
+            if operator is not None:
+                ket = [
+                    [
+                        [
+                            sum(operator[s][t] * row[t][r] for t in range(2))
+                            for r in right
+                        ]
+                        for s in range(2)
+                    ]
+                    for row in tensor
+                ]
+            half = [
+                [
+                    [sum(environment[l][m] * ket[m][s][r] for m in left) for r in right]
+                    for s in range(2)
+                ]
+                for l in left
+            ]
+            environment = [
+                [
+                    sum(
+                        tensor[l][s][r].conjugate() * half[l][s][r2]
+                        for l in left
+                        for s in range(2)
+                    )
+                    for r2 in right
+                ]
+                for r in right
+            ]
+        return environment[0][0]
+
+    def expectation_values(
+        self, pauli_strings: Sequence[str], qubits: Sequence[int]
+    ) -> list[float]:
+        """The expectation value of each Pauli string, whose first Pauli acts on
+        `qubits[0]`, in O(n * max_bond_dimension^3) time each.
+        """
+        values: list[float] = []
+        for pauli_string in pauli_strings:
+            if len(pauli_string) != len(qubits):
+                raise ValueError("Pauli string and qubits are different sizes.")
+            if any(pauli not in "IXYZ" for pauli in pauli_string):
+                raise ValueError("Pauli strings can only contain I, X, Y and Z.")
+            operators = {
+                self._positions[q]: _PAULIS[pauli]
+                for pauli, q in zip(pauli_string, qubits)
+                if pauli != "I"
+            }
+            values.append(self._expectation(operators).real)
+        return values
+
+    def probability(self, qubits: Sequence[int], outcome: int) -> float:
+        """The probability that measuring `qubits` gives `outcome`
+        (with `qubits[0]` as its most significant bit).
+        """
+        projectors: dict[int, list[list[complex]]] = {}
+        for b, q in enumerate(qubits):
+            bit = (outcome >> (len(qubits) - 1 - b)) & 1
+            projectors[self._positions[q]] = [[1 - bit, 0], [0, bit]]
+        return self._expectation(projectors).real
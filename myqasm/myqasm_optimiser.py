@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from complex_matrices import ComplexMatrix
+from complex_vectors import ComplexVector
+
+from .myqasm import (
+    KeywordEnum,
+    MYQASM_compile,
+    MYQASMInstruction,
+    TokenNameEnum,
+    _get_builtin_gate,
+    _split_tokens,
+)
+from .myqasm_gates import (
+    IdentityGate,
+    MYQASMGate,
+    apply_gate,
+    concat_gates,
+    tensor_gates,
+)
+
+DEFAULT_MAX_FUSION_WIDTH = 4
+
+
+def _qubits_acted_on(gate: MYQASMGate) -> Optional[int]:
+    """The number of qubits `gate` acts on, or None if it isn't a whole number."""
+    size = gate.get_height()
+    if size & (size - 1) != 0:
+        return None
+    return size.bit_length() - 1
+
+
+class _FusedBlock:
+    def __init__(self, register: str) -> None:
+        """Gates applied one after another to qubits of `register`,
+        to be replaced by a single gate acting on all of their qubits.
+        """
+        self.register = register
+        self.qubits: list[int] = []
+        self.steps: list[tuple[MYQASMGate, list[int]]] = []
+        self.instructions: list[MYQASMInstruction] = []
+        # The positions of the expressions the steps came from.
+        self.positions: list[int] = []
+
+    def width_with(self, qubits: list[int]) -> int:
+        return len(set(self.qubits) | set(qubits))
+
+    def add(
+        self,
+        gate: MYQASMGate,
+        qubits: list[int],
+        instruction: MYQASMInstruction,
+        position: int,
+    ) -> None:
+        self.qubits = sorted(set(self.qubits) | set(qubits))
+        self.steps.append((gate, qubits))
+        self.instructions.append(instruction)
+        self.positions.append(position)
+
+    def matrix(self) -> ComplexMatrix:
+        """The single gate, acting on `self.qubits` (in increasing order),
+        that does every step.
+
+        Each column is found by applying the steps to a basis state,
+        which is cheap since the block is only a few qubits wide.
+        """
+        size = 2 ** len(self.qubits)
+        positions = {q: i for i, q in enumerate(self.qubits)}
+        columns: list[list[complex]] = []
+        for j in range(size):
+            state = ComplexVector.from_complex(1 if i == j else 0 for i in range(size))
+            for gate, qubits in self.steps:
+                apply_gate(gate, state, [positions[q] for q in qubits])
+            columns.append(state.to_complex_list())
+        return ComplexMatrix([[column[i] for column in columns] for i in range(size)])
+
+    def to_instructions(self) -> list[tuple[MYQASMInstruction, list[int]]]:
+        """The instructions to run instead of the block's APPLYs
+        (none if the gates cancel out), with the positions of the expressions
+        each one does.
+        """
+        if len(self.steps) == 1:
+            return [(self.instructions[0], self.positions)]
+        matrix = self.matrix()
+        if matrix == ComplexMatrix.identity(matrix.get_height()):
+            return []
+        register, qubits = self.register, self.qubits
+        return [
+            (
+                lambda session: session._apply("fused gate", register, qubits, matrix),
+                self.positions,
+            )
+        ]
+
+
+class _KnownGates:
+    def __init__(self) -> None:
+        """The gates a program can use, as far as they can be known without running
+        it: builtin gates, and gates the program defines from known gates.
+        """
+        # What the program has defined so far: None if it can't be known in advance.
+        self._gates: dict[str, Optional[MYQASMGate]] = {}
+
+    def get(self, name: str) -> Optional[MYQASMGate]:
+        if name in self._gates:
+            return self._gates[name]
+        return _get_builtin_gate(name)
+
+    def define(self, keyword: KeywordEnum, names: list[str]) -> None:
+        """Record the gate defined by a CONCAT, TENSOR or INVERSE."""
+        operands = [self.get(name) for name in names[1:]]
+        new_gate: Optional[MYQASMGate] = None
+        if all(operand is not None for operand in operands):
+            try:
+                if keyword == KeywordEnum.CONCAT:
+                    new_gate = concat_gates(*operands)  # type: ignore
+                elif keyword == KeywordEnum.TENSOR:
+                    new_gate = tensor_gates(*operands)  # type: ignore
+                else:
+                    new_gate = operands[0].adjoint()  # type: ignore
+            except ValueError:
+                pass
+        self._gates[names[0]] = new_gate
+
+
+def optimise_instructions(
+    token_streams: list[list[tuple[TokenNameEnum, str | KeywordEnum]]],
+    max_fusion_width: int = DEFAULT_MAX_FUSION_WIDTH,
+    start: int = 0,
+) -> tuple[list[MYQASMInstruction], int]:
+    """Compile the expressions, fusing runs of APPLYs to the same register into
+    single gates acting on at most `max_fusion_width` qubits,
+    and dropping any that turn out to do nothing
+    (identities, and gates followed by their INVERSE).
+
+    Returns the instructions, and how many APPLYs (i.e. passes over a register)
+    were saved.
+
+    Only APPLYs whose gates and registers are known from the program itself
+    (builtin gates, gates defined from them, and registers INITIALIZEd by the
+    program) are fused. Any other instruction that uses a register is run in order,
+    after all the APPLYs before it.
+
+    Only the expressions from `start` on are compiled; the ones before it are only
+    used to find out which gates and registers the later ones use
+    (e.g. to compile the rest of a program whose start has already been run).
+    """
+    instructions, _, passes_saved = _optimise_instructions(
+        token_streams, max_fusion_width, start
+    )
+    return instructions, passes_saved
+
+
+def _optimise_instructions(
+    token_streams: list[list[tuple[TokenNameEnum, str | KeywordEnum]]],
+    max_fusion_width: int,
+    start: int,
+) -> tuple[list[MYQASMInstruction], list[list[int]], int]:
+    """`optimise_instructions`, also returning the positions of the expressions
+    each instruction does.
+    """
+    instructions: list[MYQASMInstruction] = []
+    sources: list[list[int]] = []
+    gates = _KnownGates()
+    register_sizes: dict[str, int] = {}
+    blocks: dict[str, _FusedBlock] = {}
+    applies_before = 0
+    applies_after = 0
+
+    def flush(register: Optional[str] = None) -> None:
+        nonlocal applies_after
+        for name in list(blocks) if register is None else [register]:
+            if name in blocks:
+                block_instructions = blocks.pop(name).to_instructions()
+                applies_after += len(block_instructions)
+                for instruction, positions in block_instructions:
+                    instructions.append(instruction)
+                    sources.append(positions)
+
+    def learn(
+        keyword: KeywordEnum,
+        names: list[str],
+        literals: list[str],
+        options: list[KeywordEnum],
+    ) -> None:
+        """Record the gate or register an expression defines."""
+        match keyword:
+            case KeywordEnum.CONCAT | KeywordEnum.TENSOR | KeywordEnum.INVERSE:
+                gates.define(keyword, names)
+            case KeywordEnum.FORK:
+                if names[0] in register_sizes:
+                    register_sizes[names[1]] = register_sizes[names[0]]
+                else:
+                    register_sizes.pop(names[1], None)
+            case KeywordEnum.INITIALIZE:
+                if options and options[0] not in [
+                    KeywordEnum.MAPPED,
+                    KeywordEnum.SHARED,
+                ]:
+                    # Only state vector registers can have fused gates applied.
+                    register_sizes.pop(names[0], None)
+                else:
+                    register_sizes[names[0]] = int(literals[0])
+
+    for position, token_stream in enumerate(token_streams):
+        keyword, names, literals, options = _split_tokens(token_stream)
+        if position < start:
+            learn(keyword, names, literals, options)
+            continue
+        instruction = MYQASM_compile(token_stream)
+        match keyword:
+            case KeywordEnum.CONCAT | KeywordEnum.TENSOR | KeywordEnum.INVERSE:
+                learn(keyword, names, literals, options)
+                instructions.append(instruction)
+                sources.append([position])
+                continue
+            case KeywordEnum.APPLY:
+                applies_before += 1
+                gate_name, register = names
+                gate = gates.get(gate_name)
+                qubit_count = register_sizes.get(register)
+                indices = [int(literal) for literal in literals]
+                if not indices and qubit_count is not None:
+                    indices = list(range(qubit_count))
+                if (
+                    gate is not None
+                    and qubit_count is not None
+                    and _qubits_acted_on(gate) == len(indices)
+                    and len(set(indices)) == len(indices)
+                    and all(q < qubit_count for q in indices)
+                ):
+                    if isinstance(gate, IdentityGate):
+                        continue
+                    if len(indices) <= max_fusion_width:
+                        block = blocks.get(register)
+                        if block is not None and (
+                            block.width_with(indices) > max_fusion_width
+                        ):
+                            flush(register)
+                            block = None
+                        if block is None:
+                            block = blocks[register] = _FusedBlock(register)
+                        block.add(gate, indices, instruction, position)
+                        continue
+                # It can't be fused, but it still needs to come after earlier APPLYs.
+                applies_after += 1
+            case KeywordEnum.FORK | KeywordEnum.INITIALIZE:
+                flush()
+                learn(keyword, names, literals, options)
+                instructions.append(instruction)
+                sources.append([position])
+                continue
+        flush()
+        instructions.append(instruction)
+        sources.append([position])
+    flush()
+    return instructions, sources, applies_before - applies_after
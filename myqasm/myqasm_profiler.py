@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional
+
+from .myqasm import (
+    KeywordEnum,
+    MYQASM_compile,
+    MYQASM_lexer,
+    MYQASMInstruction,
+    MYQASMResult,
+    MYQASMSession,
+    TokenNameEnum,
+    _register_qubit_count,
+    _split_tokens,
+    get_builtin_gate_cache_info,
+)
+
+
+@dataclass
+class MYQASMInstructionProfile:
+    """What running one instruction cost.
+
+    `expression` is the expression the instruction does (or the expressions, joined
+    with `; `, if an optimised program fused them), and `line` the line number of
+    the first in its program (None if it was run with `MYQASMSession.MYQASM`).
+
+    The times are in seconds: `run_seconds` is the time to execute the instruction,
+    which includes `gate_seconds`, the time spent finding the matrix of the gate
+    it APPLYs. Programs are lexed and compiled before they are run,
+    so their instructions' `lex_seconds` and `compile_seconds` are 0.
+
+    `allocated_bytes` is the most memory allocated while it ran, above what was
+    allocated before (only if the profiler traces memory).
+    `register_qubits` is the number of qubits in the (whole) register it uses,
+    `gate_dimension` the height of the gate it APPLYs or defines,
+    and `cache_hits` and `cache_misses` the lookups in the builtin gate cache.
+    """
+
+    expression: str
+    keyword: str
+    line: Optional[int] = None
+    lex_seconds: float = 0.0
+    compile_seconds: float = 0.0
+    gate_seconds: float = 0.0
+    run_seconds: float = 0.0
+    allocated_bytes: Optional[int] = None
+    register_qubits: Optional[int] = None
+    gate_dimension: Optional[int] = None
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    def total_seconds(self) -> float:
+        return self.lex_seconds + self.compile_seconds + self.run_seconds
+
+
+def _aggregate(profiles: list[MYQASMInstructionProfile]) -> dict[str, Any]:
+    allocated = [p.allocated_bytes for p in profiles if p.allocated_bytes is not None]
+    return {
+        "count": len(profiles),
+        "total_seconds": sum(p.total_seconds() for p in profiles),
+        "max_seconds": max(p.total_seconds() for p in profiles),
+        "lex_seconds": sum(p.lex_seconds for p in profiles),
+        "compile_seconds": sum(p.compile_seconds for p in profiles),
+        "gate_seconds": sum(p.gate_seconds for p in profiles),
+        "run_seconds": sum(p.run_seconds for p in profiles),
+        "max_allocated_bytes": max(allocated) if allocated else None,
+        "cache_hits": sum(p.cache_hits for p in profiles),
+        "cache_misses": sum(p.cache_misses for p in profiles),
+    }
+
+
+def _subject(
+    token_stream: list[tuple[TokenNameEnum, str | KeywordEnum]],
+) -> tuple[str, Optional[str], Optional[str]]:
+    """The keyword of an expression, the register it uses,
+    and the gate it defines (if any).
+    """
+    keyword, names, _, _ = _split_tokens(token_stream)
+    match keyword:
+        case KeywordEnum.CONCAT | KeywordEnum.TENSOR | KeywordEnum.INVERSE:
+            return keyword.name, None, names[0]
+        case KeywordEnum.APPLY:
+            return keyword.name, names[1], None
+        case _:
+            return keyword.name, names[0], None
+
+
+class MYQASMProfiler:
+    def __init__(
+        self,
+        callback: Optional[Callable[[MYQASMInstructionProfile], None]] = None,
+        trace_memory: bool = False,
+    ) -> None:
+        """Records what each instruction run in the sessions it is set on
+        (see `MYQASMSession.set_profiler`) costs, calling `callback` with each
+        `MYQASMInstructionProfile` as it is made.
+        The profiles can be summed up with `report`, or written as JSON with `to_json`.
+
+        If `trace_memory` is True, the memory allocated by each instruction is traced
+        with `tracemalloc`, which makes them several times slower.
+
+        Sessions without a profiler only check that they don't have one,
+        so cost next to nothing.
+        """
+        self._callback = callback
+        self._trace_memory = trace_memory
+        self._profiles: list[MYQASMInstructionProfile] = []
+        # The profile of the instruction being run, which APPLYs add the gate to.
+        self._current: Optional[MYQASMInstructionProfile] = None
+
+    def get_profiles(self) -> list[MYQASMInstructionProfile]:
+        return self._profiles
+
+    def clear(self) -> None:
+        self._profiles = []
+
+    def report(self) -> dict[str, Any]:
+        """The profiles summed up: in total, for each keyword,
+        and for each expression (slowest first).
+        """
+        by_keyword: dict[str, list[MYQASMInstructionProfile]] = {}
+        by_expression: dict[
+            tuple[str, Optional[int]], list[MYQASMInstructionProfile]
+        ] = {}
+        for profile in self._profiles:
+            by_keyword.setdefault(profile.keyword, []).append(profile)
+            by_expression.setdefault((profile.expression, profile.line), []).append(
+                profile
+            )
+        expressions = [
+            {
+                "expression": expression,
+                "line": line,
+                "keyword": profiles[0].keyword,
+                "register_qubits": profiles[-1].register_qubits,
+                "gate_dimension": profiles[-1].gate_dimension,
+                **_aggregate(profiles),
+            }
+            for (expression, line), profiles in by_expression.items()
+        ]
+        expressions.sort(key=lambda summary: summary["total_seconds"], reverse=True)
+        return {
+            "instructions": len(self._profiles),
+            "total_seconds": sum(p.total_seconds() for p in self._profiles),
+            "by_keyword": {
+                keyword: _aggregate(profiles)
+                for keyword, profiles in by_keyword.items()
+            },
+            "by_expression": expressions,
+        }
+
+    def to_json(
+        self,
+        path: Optional[str | os.PathLike[str]] = None,
+        include_profiles: bool = False,
+    ) -> str:
+        """The report as JSON (with every profile, if `include_profiles` is True),
+        which is also written to `path` if it is given.
+        """
+        report = self.report()
+        if include_profiles:
+            report["profiles"] = [asdict(profile) for profile in self._profiles]
+        text = json.dumps(report, indent=2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
+
+    def _note_gate(self, seconds: float, dimension: int) -> None:
+        if self._current is not None:
+            self._current.gate_seconds += seconds
+            self._current.gate_dimension = dimension
+
+    def _profile_expression(
+        self, session: MYQASMSession, expression: str
+    ) -> Optional[MYQASMResult]:
+        """Lex, compile and run `expression` in `session`, profiling each step."""
+        cache_before = get_builtin_gate_cache_info()
+        started = time.perf_counter()
+        token_stream = MYQASM_lexer(expression)
+        lexed = time.perf_counter()
+        instruction = MYQASM_compile(token_stream)
+        compiled = time.perf_counter()
+        profile = MYQASMInstructionProfile(
+            expression,
+            _subject(token_stream)[0],
+            lex_seconds=lexed - started,
+            compile_seconds=compiled - lexed,
+        )
+        return self._profile_instruction(
+            session, instruction, token_stream, profile, cache_before
+        )
+
+    def _profile_instruction(
+        self,
+        session: MYQASMSession,
+        instruction: MYQASMInstruction,
+        token_stream: list[tuple[TokenNameEnum, str | KeywordEnum]],
+        profile: MYQASMInstructionProfile,
+        cache_before: Optional[Any] = None,
+    ) -> Optional[MYQASMResult]:
+        """Run a compiled `instruction` (of the expression `token_stream`,
+        or the first of the expressions it does) in `session`, filling in `profile`.
+        """
+        if cache_before is None:
+            cache_before = get_builtin_gate_cache_info()
+        started_tracing = False
+        if self._trace_memory:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        self._current = profile
+        started = time.perf_counter()
+        try:
+            return instruction(session)
+        finally:
+            profile.run_seconds = time.perf_counter() - started
+            self._current = None
+            if self._trace_memory:
+                profile.allocated_bytes = max(
+                    tracemalloc.get_traced_memory()[1] - memory_before, 0
+                )
+                if started_tracing:
+                    tracemalloc.stop()
+            cache_after = get_builtin_gate_cache_info()
+            profile.cache_hits = cache_after.hits - cache_before.hits
+            profile.cache_misses = cache_after.misses - cache_before.misses
+            _, register, gate = _subject(token_stream)
+            if register is not None and session._register_exists(register):
+                root_register, _ = session._resolve_register(register)
+                profile.register_qubits = _register_qubit_count(
+                    session.get_registers()[root_register]
+                )
+            if gate is not None and gate in session.get_user_defined_gates():
+                profile.gate_dimension = session.get_user_defined_gates()[
+                    gate
+                ].get_height()
+            self._profiles.append(profile)
+            if self._callback is not None:
+                self._callback(profile)
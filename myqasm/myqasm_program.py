@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Mapping, Optional, Sequence
+
+from .myqasm import (
+    InvalidMYQASMSyntaxError,
+    KeywordEnum,
+    MYQASM_compile,
+    MYQASM_lexer,
+    MYQASMInstruction,
+    MYQASMResult,
+    MYQASMSession,
+    MYQASMSnapshot,
+    TokenNameEnum,
+    _parameter_name,
+    _rotation_parameter,
+    _split_tokens,
+    get_default_session,
+)
+from .myqasm_optimiser import (
+    DEFAULT_MAX_FUSION_WIDTH,
+    _KnownGates,
+    _optimise_instructions,
+)
+from .myqasm_profiler import MYQASMInstructionProfile, MYQASMProfiler
+from .myqasm_stabilizer import clifford_decomposition
+
+# A Clifford-only program with a register of at least this many qubits is run with
+# stabilizer registers, as below it the state vector is small enough to be quicker.
+STABILIZER_MIN_QUBITS = 16
+
+
+def is_clifford_program(
+    token_streams: list[list[tuple[TokenNameEnum, str | KeywordEnum]]],
+) -> bool:
+    """Whether every gate the expressions APPLY is known in advance and is a Clifford
+    gate (see `clifford_decomposition`), so they can be run with stabilizer registers.
+    """
+    gates = _KnownGates()
+    for token_stream in token_streams:
+        keyword, names, _, _ = _split_tokens(token_stream)
+        match keyword:
+            case KeywordEnum.CONCAT | KeywordEnum.TENSOR | KeywordEnum.INVERSE:
+                gates.define(keyword, names)
+            case KeywordEnum.APPLY:
+                gate = gates.get(names[0])
+                if gate is None or clifford_decomposition(gate) is None:
+                    return False
+    return True
+
+
+def _parameters_used(
+    token_stream: list[tuple[TokenNameEnum, str | KeywordEnum]],
+) -> list[str]:
+    """The names of the parameters whose placeholders are in the expression."""
+    keyword, names, literals, _ = _split_tokens(token_stream)
+    if keyword == KeywordEnum.APPLY:
+        name = _rotation_parameter(names[0])
+    elif keyword == KeywordEnum.INITIALIZE and len(literals) == 2:
+        name = _parameter_name(literals[1])
+    else:
+        name = None
+    return [] if name is None else [name]
+
+
+class MYQASMProgram:
+    def __init__(
+        self,
+        source: str | os.PathLike[str] | Iterable[str],
+        stabilizer: Optional[bool] = None,
+    ) -> None:
+        """A whole MYQASM program, lexed and checked once, that can be run many times.
+
+        `source` is either the program as a string (one expression per line),
+        the path of a file containing the program, or an iterable of lines.
+        Blank lines are ignored.
+
+        If `stabilizer` is True, every register the program INITIALIZEs without a
+        register type is a STABILIZER register, so the program can only APPLY
+        Clifford gates. By default, this is done if the program only uses Clifford
+        gates and INITIALIZEs a register of at least `STABILIZER_MIN_QUBITS` qubits.
+
+        The program can have placeholders, `R{name}` gates and `[{name}]` initial
+        states, whose values are given each time it is run (see `run` and `sweep`).
+
+        Raises InvalidMYQASMSyntaxError (with the line number) if any line is invalid.
+        Errors that depend on the state of the registers and gates
+        (e.g. applying a gate that does not exist) are raised when the program is run.
+        """
+        if isinstance(source, os.PathLike):
+            with open(source) as file:
+                lines = file.read().splitlines()
+        elif isinstance(source, str):
+            lines = source.splitlines()
+        else:
+            lines = list(source)
+
+        self._token_streams: list[list[tuple[TokenNameEnum, str | KeywordEnum]]] = []
+        # The text and line number of each expression, for profiling.
+        self._expressions: list[str] = []
+        self._line_numbers: list[int] = []
+        for line_number, line in enumerate(lines, start=1):
+            expression = line.strip()
+            if not expression:
+                continue
+            try:
+                token_stream = MYQASM_lexer(expression)
+            except InvalidMYQASMSyntaxError as error:
+                raise InvalidMYQASMSyntaxError(f"Line {line_number}: {error}")
+            self._token_streams.append(token_stream)
+            self._expressions.append(expression)
+            self._line_numbers.append(line_number)
+        if stabilizer is None:
+            stabilizer = is_clifford_program(self._token_streams) and any(
+                int(literals[0]) >= STABILIZER_MIN_QUBITS
+                for keyword, _, literals, _ in map(_split_tokens, self._token_streams)
+                if keyword == KeywordEnum.INITIALIZE
+            )
+        if stabilizer:
+            for token_stream in self._token_streams:
+                keyword, _, _, options = _split_tokens(token_stream)
+                if keyword == KeywordEnum.INITIALIZE and not options:
+                    token_stream.append((TokenNameEnum.KEYWORD, KeywordEnum.STABILIZER))
+        self._compile()
+
+    def _compile(self) -> None:
+        self._instructions: list[MYQASMInstruction] = [
+            MYQASM_compile(token_stream) for token_stream in self._token_streams
+        ]
+        # The positions of the expressions each instruction does.
+        self._sources = [[position] for position in range(len(self._instructions))]
+        self._max_fusion_width: Optional[int] = None
+        # The expressions before the first placeholder are the same for every
+        # value of the parameters, so `sweep` only runs their instructions once.
+        self._parameter_free_expressions = next(
+            (
+                position
+                for position, token_stream in enumerate(self._token_streams)
+                if _parameters_used(token_stream)
+            ),
+            len(self._token_streams),
+        )
+        self._parameter_free_instructions = self._parameter_free_expressions
+
+    def __getstate__(self) -> dict[str, object]:
+        # The compiled instructions can't be pickled, so are compiled again
+        # (e.g. when a program is sent to another process).
+        return {
+            "token_streams": self._token_streams,
+            "expressions": self._expressions,
+            "line_numbers": self._line_numbers,
+            "max_fusion_width": self._max_fusion_width,
+        }
+
+    def __setstate__(self, state: dict[str, object]) -> None:
+        self._token_streams = state["token_streams"]  # type: ignore
+        self._expressions = state["expressions"]  # type: ignore
+        self._line_numbers = state["line_numbers"]  # type: ignore
+        self._compile()
+        if state["max_fusion_width"] is not None:
+            self.optimise(state["max_fusion_width"])  # type: ignore
+
+    @classmethod
+    def from_file(
+        cls, path: str | os.PathLike[str], stabilizer: Optional[bool] = None
+    ) -> MYQASMProgram:
+        with open(path) as file:
+            return cls(file.read(), stabilizer)
+
+    def __len__(self) -> int:
+        """The number of instructions in the program."""
+        return len(self._instructions)
+
+    def get_parameters(self) -> list[str]:
+        """The names of the program's parameters, in the order they are first used."""
+        parameters: dict[str, None] = {}
+        for token_stream in self._token_streams:
+            parameters.update(dict.fromkeys(_parameters_used(token_stream)))
+        return list(parameters)
+
+    def optimise(self, max_fusion_width: int = DEFAULT_MAX_FUSION_WIDTH) -> int:
+        """Fuse runs of APPLYs into single gates acting on at most
+        `max_fusion_width` qubits, and drop APPLYs that do nothing
+        (see `optimise_instructions`).
+
+        Returns the number of APPLYs (i.e. passes over a register) saved each run.
+
+        APPLYs are not fused across the first placeholder,
+        so that `sweep` can still run the expressions before it once.
+        """
+        split = self._parameter_free_expressions
+        parameter_free, parameter_free_sources, parameter_free_saved = (
+            _optimise_instructions(self._token_streams[:split], max_fusion_width, 0)
+        )
+        rest, rest_sources, rest_saved = _optimise_instructions(
+            self._token_streams, max_fusion_width, split
+        )
+        self._instructions = parameter_free + rest
+        self._sources = parameter_free_sources + rest_sources
+        self._parameter_free_instructions = len(parameter_free)
+        self._max_fusion_width = max_fusion_width
+        return parameter_free_saved + rest_saved
+
+    def run(
+        self,
+        session: Optional[MYQASMSession] = None,
+        parameters: Optional[Mapping[str, float | str]] = None,
+    ) -> list[MYQASMResult]:
+        """Run the program once in `session` (by default, the default session),
+        returning the result of each MEASURE, EXPECT and PROB in order.
+
+        If `parameters` is given, the session's parameters are set to it first
+        (see `MYQASMSession.set_parameters`).
+        """
+        if session is None:
+            session = get_default_session()
+        if parameters is not None:
+            session.set_parameters(parameters)
+        return self._run_instructions(session, 0, len(self._instructions))
+
+    def _run_instructions(
+        self, session: MYQASMSession, start: int, stop: int
+    ) -> list[MYQASMResult]:
+        """Run instructions `start` to `stop - 1` in `session`,
+        returning the results of the ones that have one.
+        """
+        profiler = session.get_profiler()
+        results: list[MYQASMResult] = []
+        for position in range(start, stop):
+            if profiler is None:
+                result = self._instructions[position](session)
+            else:
+                result = self._profile_instruction(profiler, session, position)
+            if result is not None:
+                results.append(result)
+        return results
+
+    def _profile_instruction(
+        self, profiler: MYQASMProfiler, session: MYQASMSession, position: int
+    ) -> Optional[MYQASMResult]:
+        sources = self._sources[position]
+        token_stream = self._token_streams[sources[0]]
+        keyword, _, _, _ = _split_tokens(token_stream)
+        profile = MYQASMInstructionProfile(
+            "; ".join(self._expressions[source] for source in sources),
+            keyword.name,
+            self._line_numbers[sources[0]],
+        )
+        return profiler._profile_instruction(
+            session, self._instructions[position], token_stream, profile
+        )
+
+    def _run_with_parameters(
+        self,
+        snapshot: MYQASMSnapshot,
+        parameters: Mapping[str, float | str],
+        seed: Optional[int],
+        profiler: Optional[MYQASMProfiler] = None,
+    ) -> list[MYQASMResult]:
+        """Run the instructions from the first placeholder on, in a new session
+        starting from `snapshot` (taken after the instructions before it).
+        """
+        session = MYQASMSession.from_snapshot(snapshot, seed)
+        session.set_parameters(parameters)
+        session.set_profiler(profiler)
+        return self._run_instructions(
+            session, self._parameter_free_instructions, len(self._instructions)
+        )
+
+    def sweep(
+        self,
+        table: Sequence[Mapping[str, float | str]],
+        session: Optional[MYQASMSession] = None,
+        max_workers: Optional[int] = 1,
+        seed: Optional[int] = None,
+    ) -> list[list[MYQASMResult]]:
+        """Run the program once for each row of `table` (the values of its
+        parameters), starting from a fork of `session` (by default, a new session),
+        returning the results of each run in order.
+
+        The instructions before the first placeholder don't depend on the parameters,
+        so are run once (and their results repeated in every run);
+        every row then starts from a snapshot of the registers after them.
+        The rows are run in this process, or if `max_workers` is not 1, in up to
+        `max_workers` worker processes (by default, one per CPU).
+        If `seed` is given, the run of `table[i]` is seeded with `seed + i`,
+        so the results can be reproduced, however many processes are used.
+        `session` is not changed, but if it has a profiler, the runs in this process
+        are profiled with it.
+        """
+        profiler = None if session is None else session.get_profiler()
+        session = MYQASMSession() if session is None else session.fork()
+        session.seed(seed)
+        session.set_profiler(profiler)
+        shared_results = self._run_instructions(
+            session, 0, self._parameter_free_instructions
+        )
+        snapshot = session.snapshot()
+        seeds = [None if seed is None else seed + i for i in range(len(table))]
+        if max_workers == 1:
+            results = [
+                self._run_with_parameters(snapshot, parameters, row_seed, profiler)
+                for parameters, row_seed in zip(table, seeds)
+            ]
+        else:
+            with ProcessPoolExecutor(
+                max_workers,
+                initializer=_set_worker_sweep,
+                initargs=(snapshot, self),
+            ) as executor:
+                results = list(executor.map(_run_sweep_row_in_worker, table, seeds))
+        return [shared_results + row_results for row_results in results]
+
+    def run_many(
+        self, times: int, session: Optional[MYQASMSession] = None
+    ) -> list[list[MYQASMResult]]:
+        """Run the program `times` times in `session`,
+        returning the results of each run.
+
+        Each run starts from the registers and gates left by the previous run,
+        so a program that should start from scratch should INITIALIZE its registers
+        (or be run in a new session each time).
+        """
+        return [self.run(session) for _ in range(times)]
+
+
+# The snapshot each worker process of `run_variants` and `MYQASMProgram.sweep`
+# starts its sessions from (and the program being swept),
+# so they are only sent to each process once.
+_worker_snapshot: Optional[MYQASMSnapshot] = None
+_worker_program: Optional[MYQASMProgram] = None
+
+
+def _set_worker_snapshot(snapshot: MYQASMSnapshot) -> None:
+    global _worker_snapshot
+    _worker_snapshot = snapshot
+
+
+def _set_worker_sweep(snapshot: MYQASMSnapshot, program: MYQASMProgram) -> None:
+    global _worker_snapshot, _worker_program
+    _worker_snapshot = snapshot
+    _worker_program = program
+
+
+def _run_sweep_row_in_worker(
+    parameters: Mapping[str, float | str], seed: Optional[int]
+) -> list[MYQASMResult]:
+    assert _worker_snapshot is not None and _worker_program is not None
+    return _worker_program._run_with_parameters(_worker_snapshot, parameters, seed)
+
+
+def _run_in_worker(program: MYQASMProgram, seed: Optional[int]) -> list[MYQASMResult]:
+    assert _worker_snapshot is not None
+    return program.run(MYQASMSession.from_snapshot(_worker_snapshot, seed))
+
+
+def run_variants(
+    snapshot: MYQASMSnapshot,
+    programs: Sequence[MYQASMProgram],
+    max_workers: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> list[list[MYQASMResult]]:
+    """Run each of `programs` in a new session starting from `snapshot`,
+    in up to `max_workers` worker processes (by default, one per CPU),
+    returning the results of each program in order.
+
+    This lets variants of a circuit that share a long prefix simulate the prefix
+    once (before taking the snapshot), rather than once for each variant.
+    If `seed` is given, the session of `programs[i]` is seeded with `seed + i`,
+    so the results can be reproduced.
+    """
+    seeds = [None if seed is None else seed + i for i in range(len(programs))]
+    with ProcessPoolExecutor(
+        max_workers, initializer=_set_worker_snapshot, initargs=(snapshot,)
+    ) as executor:
+        return list(executor.map(_run_in_worker, programs, seeds))
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Optional, Sequence
+
+from complex_numbers import packed_view
+
+from .myqasm_mapped import _AMPLITUDE_SIZE, _BlockRegister
+
+# Each block is 2^12 amplitudes (64 KiB), so a 20 qubit register has enough blocks
+# to share between many processes.
+DEFAULT_SHARED_BLOCK_QUBITS = 12
+
+# Registers with fewer qubits than this are quicker to run in one process.
+SHARED_MIN_QUBITS = 16
+
+# Worker processes -> the pool with that many processes,
+# kept running so that each kernel only has to send the pool its arguments.
+_pools: dict[int, ProcessPoolExecutor] = {}
+
+
+def get_worker_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """The persistent pool of `workers` processes (by default, one per CPU)
+    that SHARED registers split their work between.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(workers)
+    return _pools[workers]
+
+
+def shutdown_worker_pools() -> None:
+    """Stop the worker processes of every pool (they start again when needed)."""
+    for pool in _pools.values():
+        pool.shutdown()
+    _pools.clear()
+
+
+def _release_memory(data: memoryview, memory: SharedMemory) -> None:
+    # The memory can only be closed once nothing is viewing it.
+    data.release()
+    memory.close()
+    memory.unlink()
+
+
+def _run_in_worker(
+    kernel: Callable[..., Any],
+    name: str,
+    n: int,
+    block_qubits: int,
+    units: range,
+    args: tuple[Any, ...],
+) -> Any:
+    memory = SharedMemory(name)
+    data = packed_view(memory.buf[: _AMPLITUDE_SIZE << n])
+    try:
+        return kernel(data, n, block_qubits, units, *args)
+    finally:
+        data.release()
+        memory.close()
+
+
+class SharedMemoryRegister(_BlockRegister):
+    def __init__(
+        self,
+        qubit_count: int,
+        initial_state: str | None = None,
+        workers: Optional[int] = None,
+        block_qubits: int = DEFAULT_SHARED_BLOCK_QUBITS,
+    ) -> None:
+        """A state vector register held in shared memory, whose gates and
+        measurements are split between `workers` processes
+        (by default, one per CPU) by ranges of blocks.
+
+        The amplitudes are split into blocks as in `MappedRegister`,
+        and each process works on its own blocks in place, so the state is never
+        copied between processes; only the gate and the range of blocks are sent,
+        and measurements send back no more than a probability for each block.
+        The processes are kept running between operations (see `get_worker_pool`).
+        Registers with fewer than `SHARED_MIN_QUBITS` qubits (or one worker)
+        are run in this process, as they are quicker than sending the work.
+        """
+        self._n = qubit_count
+        self._block_qubits = min(block_qubits, qubit_count)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self._workers = workers
+        # New shared memory is all zeros.
+        self._memory = SharedMemory(create=True, size=_AMPLITUDE_SIZE << qubit_count)
+        self._data = packed_view(self._memory.buf[: _AMPLITUDE_SIZE << qubit_count])
+        # Unlinked when the register is garbage collected, or at exit if it isn't.
+        weakref.finalize(self, _release_memory, self._data, self._memory)
+        basis_state = int(initial_state, 2) if initial_state else 0
+        self._data[2 * basis_state] = 1
+
+    def copy(self) -> SharedMemoryRegister:
+        new = SharedMemoryRegister(
+            self._n, workers=self._workers, block_qubits=self._block_qubits
+        )
+        new._data[:] = self._data
+        return new
+
+    def get_workers(self) -> int:
+        return self._workers
+
+    def _fits_marginal(self, qubits: Sequence[int]) -> bool:
+        # Each process sends back the probability of every outcome,
+        # so there can be no more outcomes than blocks.
+        return 1 << len(qubits) <= self._block_count()
+
+    def _run(self, kernel: Callable[..., Any], units: int, *args: Any) -> list[Any]:
+        parts = min(self._workers, units)
+        if parts <= 1 or self._n < SHARED_MIN_QUBITS:
+            return super()._run(kernel, units, *args)
+        # Contiguous ranges of units, as equal in size as possible.
+        bounds = [units * part // parts for part in range(parts + 1)]
+        futures = [
+            get_worker_pool(self._workers).submit(
+                _run_in_worker,
+                kernel,
+                self._memory.name,
+                self._n,
+                self._block_qubits,
+                range(start, stop),
+                args,
+            )
+            for start, stop in zip(bounds, bounds[1:])
+        ]
+        return [future.result() for future in futures]
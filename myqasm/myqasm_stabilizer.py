@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import cmath
+import random
+from typing import Callable, Iterable, Optional, Sequence
+
+from complex_matrices import SparseComplexMatrix
+
+from .myqasm_gates import IdentityGate, KroneckerGate, MYQASMGate, gate_to_matrix
+
+# A Clifford gate as a list of ("H", [qubit]), ("S", [qubit])
+# and ("CNOT", [control, target]) steps, on the gate's own qubits.
+CliffordSteps = list[tuple[str, list[int]]]
+
+_H = [[1 / 2**0.5, 1 / 2**0.5], [1 / 2**0.5, -1 / 2**0.5]]
+_S = [[1, 0], [0, 1j]]
+_CNOT = [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]]
+# CNOT with qubit 1 as the control and qubit 0 as the target.
+_REVERSED_CNOT = [[1, 0, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0], [0, 1, 0, 0]]
+
+
+def _multiply(m1: list[list[complex]], m2: list[list[complex]]) -> list[list[complex]]:
+    return [
+        [sum(m1[i][k] * m2[k][j] for k in range(len(m2))) for j in range(len(m2[0]))]
+        for i in range(len(m1))
+    ]
+
+
+def _equal_up_to_phase(m1: list[list[complex]], m2: list[list[complex]]) -> bool:
+    """Whether `m1` is `m2` times some complex number of modulus 1."""
+    phase: Optional[complex] = None
+    for row1, row2 in zip(m1, m2):
+        for c1, c2 in zip(row1, row2):
+            if abs(c2) > 1e-8 and phase is None:
+                phase = c1 / c2
+            if phase is None:
+                if abs(c1) > 1e-8:
+                    return False
+            elif not cmath.isclose(c1, phase * c2, abs_tol=1e-8):
+                return False
+    return phase is not None and cmath.isclose(abs(phase), 1)
+
+
+def _single_qubit_cliffords() -> list[tuple[list[list[complex]], list[str]]]:
+    """Each of the 24 single qubit Clifford gates (up to global phase),
+    with a shortest list of H and S gates that makes it (applied in order).
+    """
+    identity: list[list[complex]] = [[1, 0], [0, 1]]
+    found: list[tuple[list[list[complex]], list[str]]] = [(identity, [])]
+    frontier = found[:]
+    while frontier:
+        new_frontier = []
+        for matrix, steps in frontier:
+            for name, gate in [("H", _H), ("S", _S)]:
+                product = _multiply(gate, matrix)
+                if not any(_equal_up_to_phase(product, m) for m, _ in found):
+                    new_frontier.append((product, steps + [name]))
+                    found.append(new_frontier[-1])
+        frontier = new_frontier
+    return found
+
+
+_single_qubit_clifford_table = _single_qubit_cliffords()
+
+
+def clifford_decomposition(gate: MYQASMGate) -> Optional[CliffordSteps]:
+    """Write `gate` as H, S and CNOT steps (up to global phase),
+    or None if it isn't a Clifford gate this can recognise:
+    any single qubit Clifford, CNOT (either way round),
+    and tensor products (`KroneckerGate`s) of those.
+    """
+    if isinstance(gate, IdentityGate):
+        return [] if gate.get_height() & (gate.get_height() - 1) == 0 else None
+    if isinstance(gate, KroneckerGate):
+        steps: CliffordSteps = []
+        offset = 0
+        for factor in gate.get_factors():
+            factor_steps = clifford_decomposition(factor)
+            if factor_steps is None:
+                return None
+            steps.extend(
+                (name, [q + offset for q in qubits]) for name, qubits in factor_steps
+            )
+            offset += factor.get_height().bit_length() - 1
+        return steps
+    matrix = gate_to_matrix(gate)
+    if matrix.get_height() != matrix.get_width():
+        return None
+    if isinstance(matrix, SparseComplexMatrix):
+        matrix = matrix.to_dense()
+    values = matrix.to_complex_list()
+    if matrix.get_height() == 2:
+        for clifford, names in _single_qubit_clifford_table:
+            if _equal_up_to_phase(values, clifford):
+                return [(name, [0]) for name in names]
+    elif matrix.get_height() == 4:
+        if _equal_up_to_phase(values, _CNOT):
+            return [("CNOT", [0, 1])]
+        if _equal_up_to_phase(values, _REVERSED_CNOT):
+            return [("CNOT", [1, 0])]
+    return None
+
+
+def _row_product(
+    x1: int, z1: int, r1: int, x2: int, z2: int, r2: int
+) -> tuple[int, int, int]:
+    """The product of the tableau rows `(x2, z2, r2)` and `(x1, z1, r1)`,
+    including its sign.
+    """
+    # The power of i from multiplying the Paulis on each qubit,
+    # counted by bit masks rather than qubit by qubit.
+    y1 = x1 & z1
+    only_x1 = x1 & ~z1
+    only_z1 = z1 & ~x1
+    plus = ((y1 & z2 & ~x2) | (only_x1 & z2 & x2) | (only_z1 & x2 & ~z2)).bit_count()
+    minus = ((y1 & x2 & ~z2) | (only_x1 & z2 & ~x2) | (only_z1 & x2 & z2)).bit_count()
+    # plus - minus is always 0 or 2 (mod 4), and 2 flips the sign.
+    return x2 ^ x1, z2 ^ z1, r2 ^ r1 ^ (((plus - minus) >> 1) & 1)
+
+
+class StabilizerRegister:
+    def __init__(self, qubit_count: int, initial_state: Optional[str] = None) -> None:
+        """A register that only supports Clifford gates, stored as a stabilizer
+        tableau (Aaronson and Gottesman, "Improved simulation of stabilizer
+        circuits", 2004) rather than 2^n amplitudes.
+
+        It takes O(n^2) bits of memory, applying a gate takes O(n) time,
+        and measuring a qubit takes O(n^2) time,
+        so registers of hundreds or thousands of qubits can be simulated.
+
+        Rows `0` to `n - 1` are the destabilizers and rows `n` to `2n - 1` the
+        stabilizers. The X and Z parts of each row are stored as integers,
+        where bit `q` is for qubit `q`, and `_r` holds the sign bit of each row.
+        """
+        self._n = qubit_count
+        self._x = [1 << i for i in range(qubit_count)] + [0] * qubit_count
+        self._z = [0] * qubit_count + [1 << i for i in range(qubit_count)]
+        self._r = [0] * (2 * qubit_count)
+        if initial_state is not None:
+            for q, bit in enumerate(initial_state):
+                if bit == "1":
+                    self._x_gate(q)
+
+    def copy(self) -> StabilizerRegister:
+        new = StabilizerRegister.__new__(StabilizerRegister)
+        new._n = self._n
+        new._x = self._x[:]
+        new._z = self._z[:]
+        new._r = self._r[:]
+        return new
+
+    def get_qubit_count(self) -> int:
+        return self._n
+
+    def _x_gate(self, a: int) -> None:
+        bit = 1 << a
+        self._r = [r ^ bool(z & bit) for r, z in zip(self._r, self._z)]
+
+    def _hadamard(self, a: int) -> None:
+        bit = 1 << a
+        x, z, r = self._x, self._z, self._r
+        for i in range(2 * self._n):
+            xa = x[i] & bit
+            za = z[i] & bit
+            if xa and za:
+                r[i] ^= 1
+            if bool(xa) != bool(za):
+                x[i] ^= bit
+                z[i] ^= bit
+
+    def _phase(self, a: int) -> None:
+        bit = 1 << a
+        x, z, r = self._x, self._z, self._r
+        for i in range(2 * self._n):
+            if x[i] & bit:
+                if z[i] & bit:
+                    r[i] ^= 1
+                z[i] ^= bit
+
+    def _cnot(self, a: int, b: int) -> None:
+        bit_a = 1 << a
+        bit_b = 1 << b
+        x, z, r = self._x, self._z, self._r
+        for i in range(2 * self._n):
+            xa = bool(x[i] & bit_a)
+            zb = bool(z[i] & bit_b)
+            if xa and zb and bool(x[i] & bit_b) == bool(z[i] & bit_a):
+                r[i] ^= 1
+            if xa:
+                x[i] ^= bit_b
+            if zb:
+                z[i] ^= bit_a
+
+    def apply_gate(self, gate: MYQASMGate, qubits: Sequence[int]) -> None:
+        """Apply `gate` to `qubits` (qubit 0 being the leftmost).
+
+        Raises ValueError if `gate` is not a Clifford gate it can recognise
+        (see `clifford_decomposition`), or is not the right size.
+        """
+        if gate.get_height() != 2 ** len(qubits):
+            raise ValueError("Gate and qubits are different sizes.")
+        steps = clifford_decomposition(gate)
+        if steps is None:
+            raise ValueError("A stabilizer register can only apply Clifford gates.")
+        for name, gate_qubits in steps:
+            targets = [qubits[q] for q in gate_qubits]
+            if name == "H":
+                self._hadamard(targets[0])
+            elif name == "S":
+                self._phase(targets[0])
+            else:
+                self._cnot(targets[0], targets[1])
+
+    def _rowsum(self, h: int, i: int) -> None:
+        """Set row `h` to the product of rows `h` and `i`, including its sign."""
+        self._x[h], self._z[h], self._r[h] = _row_product(
+            self._x[i], self._z[i], self._r[i], self._x[h], self._z[h], self._r[h]
+        )
+
+    def _stabilizer_product(self, rows: Iterable[int]) -> int:
+        """The sign bit of the product of the stabilizers of the destabilizer
+        `rows`, found in a scratch row of its own (so the tableau, which may be
+        shared, is only read).
+        """
+        n = self._n
+        x = z = r = 0
+        for i in rows:
+            x, z, r = _row_product(
+                self._x[i + n], self._z[i + n], self._r[i + n], x, z, r
+            )
+        return r
+
+    def _measure(self, a: int, random_outcome: Callable[[], int]) -> int:
+        """Measure qubit `a`, collapsing the state, where `random_outcome` gives the
+        outcome if it is random.
+
+        The signs in `_r` only ever get XORed together, so they (and the outcomes)
+        can also be bit masks of which random outcomes they are the XOR of.
+        """
+        n = self._n
+        bit = 1 << a
+        p = next((i for i in range(n, 2 * n) if self._x[i] & bit), None)
+        if p is not None:
+            # The outcome is random.
+            for i in range(2 * n):
+                if i != p and self._x[i] & bit:
+                    self._rowsum(i, p)
+            self._x[p - n], self._z[p - n], self._r[p - n] = (
+                self._x[p],
+                self._z[p],
+                self._r[p],
+            )
+            outcome = random_outcome()
+            self._x[p], self._z[p], self._r[p] = 0, bit, outcome
+            return outcome
+        # The outcome is determined: find the sign of Z_a from the stabilizers.
+        return self._stabilizer_product(i for i in range(n) if self._x[i] & bit)
+
+    def measure_qubit(self, a: int, rng: random.Random) -> int:
+        """Measure qubit `a`, collapsing the state."""
+        return self._measure(a, lambda: rng.getrandbits(1))
+
+    def measure(self, qubits: Sequence[int], rng: random.Random) -> int:
+        """Measure `qubits`, collapsing the state, with the outcome packed into
+        an integer whose most significant bit is `qubits[0]`.
+        """
+        outcome = 0
+        for q in qubits:
+            outcome = (outcome << 1) | self.measure_qubit(q, rng)
+        return outcome
+
+    def sample(
+        self, qubits: Sequence[int], shots: int, rng: random.Random
+    ) -> list[int]:
+        """Measure `qubits` `shots` times without changing the state,
+        with each outcome packed into an integer whose most significant bit
+        is `qubits[0]`.
+
+        The qubits are only measured once, on a copy of the tableau, keeping each
+        outcome as the XOR of a constant and some of the random outcomes
+        (bit 0 of a mask is the constant, and bit `k` the `k`th random outcome).
+        Each shot then just chooses the random outcomes,
+        rather than measuring again.
+        """
+        copy = self.copy()
+        random_outcomes = 0
+
+        def new_random_outcome() -> int:
+            nonlocal random_outcomes
+            random_outcomes += 1
+            return 1 << random_outcomes
+
+        masks = [copy._measure(q, new_random_outcome) for q in qubits]
+        outcomes: list[int] = []
+        for _ in range(shots):
+            chosen = (rng.getrandbits(random_outcomes) << 1) | 1
+            outcome = 0
+            for mask in masks:
+                outcome = (outcome << 1) | ((mask & chosen).bit_count() & 1)
+            outcomes.append(outcome)
+        return outcomes
+
+    def expectation_values(
+        self, pauli_strings: Sequence[str], qubits: Sequence[int]
+    ) -> list[float]:
+        """The expectation value of each Pauli string, whose first Pauli acts on
+        `qubits[0]`: 0 if it anticommutes with a stabilizer,
+        and otherwise +1 or -1, as it is plus or minus a product of stabilizers.
+        """
+        n = self._n
+        values: list[float] = []
+        for pauli_string in pauli_strings:
+            if len(pauli_string) != len(qubits):
+                raise ValueError("Pauli string and qubits are different sizes.")
+            x = z = 0
+            for pauli, q in zip(pauli_string, qubits):
+                if pauli not in "IXYZ":
+                    raise ValueError("Pauli strings can only contain I, X, Y and Z.")
+                if pauli in "XY":
+                    x |= 1 << q
+                if pauli in "YZ":
+                    z |= 1 << q
+
+            def anticommutes(i: int) -> bool:
+                return bool(((x & self._z[i]) ^ (z & self._x[i])).bit_count() & 1)
+
+            if any(anticommutes(i) for i in range(n, 2 * n)):
+                values.append(0.0)
+                continue
+            # The stabilizers whose destabilizers anticommute with the string
+            # multiply to give it, up to sign.
+            sign = self._stabilizer_product(i for i in range(n) if anticommutes(i))
+            values.append(-1.0 if sign else 1.0)
+        return values
+
+    def probability(self, qubits: Sequence[int], outcome: int) -> float:
+        """The probability that measuring `qubits` gives `outcome`
+        (with `qubits[0]` as its most significant bit).
+
+        The qubits are measured on a copy of the tableau, choosing `outcome`:
+        each random measurement halves the probability.
+        """
+        copy = self.copy()
+        probability = 1.0
+        for b, q in enumerate(qubits):
+            bit = (outcome >> (len(qubits) - 1 - b)) & 1
+            random_measurements = 0
+
+            def choose_bit() -> int:
+                nonlocal random_measurements
+                random_measurements += 1
+                return bit
+
+            if copy._measure(q, choose_bit) != bit:
+                return 0.0
+            probability /= 2**random_measurements
+        return probability
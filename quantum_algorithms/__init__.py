@@ -0,0 +1,2 @@
+# type: ignore
+from .grover_search import GroverResult, grover_search, optimal_grover_iterations
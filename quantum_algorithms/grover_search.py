@@ -0,0 +1,76 @@
+import math
+import random
+from array import array
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from complex_vectors import ComplexVector
+from shared import (
+    invert_about_mean,
+    phase_flip,
+    probability_of_indices,
+    qubit_probabilities,
+    sample_outcomes,
+)
+
+
+class GroverResult(NamedTuple):
+    # The index measured from the final state.
+    found: int
+    state: ComplexVector
+    marked: list[int]
+    # The probability of measuring a marked index after 0, 1, ... iterations.
+    success_probabilities: list[float]
+
+
+def optimal_grover_iterations(n: int, marked_count: int) -> int:
+    """The number of Grover iterations that makes measuring one of `marked_count`
+    marked indices out of 2^n most likely: about pi/4 * sqrt(2^n / marked_count).
+    """
+    if not 0 < marked_count <= 2**n:
+        raise ValueError(f"Between 1 and {2**n} indices must be marked.")
+    # Each iteration rotates the state by 2 * theta towards the marked indices.
+    theta = math.asin(math.sqrt(marked_count / 2**n))
+    return max(round(math.pi / (4 * theta) - 0.5), 0)
+
+
+def grover_search(
+    n: int,
+    oracle: Callable[[int], bool] | Iterable[int],
+    iterations: Optional[int] = None,
+    rng: Optional[random.Random] = None,
+) -> GroverResult:
+    """Search the 2^n indices of an n qubit register for one that `oracle` marks:
+    either a function that says whether an index is marked, or the marked indices.
+
+    Starting from the equal superposition of every index, each iteration flips the
+    phase of the marked indices then inverts every amplitude about the mean, both in
+    O(2^n) time on the state vector (rather than building 2^n x 2^n matrices).
+    By default, `optimal_grover_iterations` iterations are done.
+    The final state is then measured (using `rng`).
+
+    Raises ValueError if `oracle` marks no indices, or indices out of range.
+    """
+    if n < 1:
+        raise ValueError("Cannot search a register with no qubits.")
+    size = 2**n
+    if callable(oracle):
+        marked = [i for i in range(size) if oracle(i)]
+    else:
+        marked = sorted(set(oracle))
+        if marked and (marked[0] < 0 or marked[-1] >= size):
+            raise ValueError(f"Marked indices must be between 0 and {size - 1}.")
+    if not marked:
+        raise ValueError("The oracle must mark at least one index.")
+    if iterations is None:
+        iterations = optimal_grover_iterations(n, len(marked))
+    if rng is None:
+        rng = random.Random()
+
+    state = ComplexVector.from_buffer(array("d", [1 / math.sqrt(size), 0.0]) * size)
+    success_probabilities = [probability_of_indices(state, marked)]
+    for _ in range(iterations):
+        phase_flip(state, marked)
+        invert_about_mean(state)
+        success_probabilities.append(probability_of_indices(state, marked))
+    (found,) = sample_outcomes(qubit_probabilities(state), 1, rng)
+    return GroverResult(found, state, marked, success_probabilities)
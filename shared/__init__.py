@@ -4,5 +4,26 @@ from .complex_matrix_eigenvalues_vectors import (
     complex_matrix_eigenvectors,
     normalized_complex_matrix_eigenvectors,
 )
+from .complex_matrix_qubit_application import (
+    complex_matrix_apply_to_qubits,
+    qubit_count,
+)
 from .complex_matrix_vector_multiplication import complex_matrix_vector_multiply
 from .complex_vector_adjoint import complex_vector_adjoint
+from .qubit_expectations import (
+    outcome_probability,
+    pauli_expectation_values,
+    pauli_masks,
+)
+from .qubit_reflections import (
+    invert_about_mean,
+    phase_flip,
+    probability_of_indices,
+)
+from .qubit_sampling import (
+    marginal_probabilities,
+    outcome_mask,
+    project_qubits,
+    qubit_probabilities,
+    sample_outcomes,
+)
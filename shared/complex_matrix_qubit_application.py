@@ -0,0 +1,110 @@
+from typing import Sequence
+
+from complex_matrices import ComplexMatrix, SparseComplexMatrix
+from complex_numbers import complex_to_packed, packed_to_complex, use_numpy
+from complex_vectors import ComplexVector
+
+
+def qubit_count(v: ComplexVector) -> int:
+    """The number of qubits `v` is the state of.
+
+    Raises ValueError if the length of `v` is not a power of 2.
+    """
+    length = len(v)
+    n = length.bit_length() - 1
+    if length != 1 << n:
+        raise ValueError("Length of a qubit state vector must be a power of 2.")
+    return n
+
+
+def _check_qubits(qubits: Sequence[int], n: int) -> None:
+    if len(set(qubits)) != len(qubits):
+        raise ValueError("Cannot apply a gate to the same qubit twice.")
+    if any(q < 0 or q >= n for q in qubits):
+        raise ValueError(f"Qubit indices must be between 0 and {n - 1}.")
+
+
+def _nonzero_rows(
+    m: ComplexMatrix | SparseComplexMatrix,
+) -> list[list[tuple[int, complex]]]:
+    """Each row of `m` as (column index, value) pairs, leaving out zeros."""
+    if isinstance(m, SparseComplexMatrix):
+        values, column_indices, row_pointers = m.csr_buffers()
+        nonzeros = packed_to_complex(values)
+        return [
+            [
+                (column_indices[k], nonzeros[k])
+                for k in range(row_pointers[i], row_pointers[i + 1])
+            ]
+            for i in range(m.get_height())
+        ]
+    return [
+        [(j, c) for j, c in enumerate(row) if c != 0] for row in m.to_complex_list()
+    ]
+
+
+def complex_matrix_apply_to_qubits(
+    m: ComplexMatrix | SparseComplexMatrix, v: ComplexVector, qubits: Sequence[int]
+) -> None:
+    """Apply the 2^k x 2^k gate `m` to the k `qubits` of the state `v`, in place.
+
+    Qubit 0 is the leftmost qubit of the state
+    (the most significant bit of the index of each element of `v`),
+    and the gate's first qubit is `qubits[0]`.
+    This is the same as multiplying `v` by the tensor product of `m` with identities
+    (with the qubits reordered), but takes O(2^n) time for an n qubit state rather
+    than O(4^n), and never creates the 2^n x 2^n matrix.
+
+    Raises ValueError if `m` is not the right size, or `qubits` are not valid.
+    """
+    n = qubit_count(v)
+    k = len(qubits)
+    _check_qubits(qubits, n)
+    gate_size = 1 << k
+    if m.get_height() != gate_size or m.get_width() != gate_size:
+        raise ValueError(
+            f"A gate acting on {k} qubits must be a {gate_size} by {gate_size} matrix."
+        )
+
+    if use_numpy():
+        import numpy
+
+        if isinstance(m, SparseComplexMatrix):
+            m = m.to_dense()
+        state = numpy.frombuffer(v.to_buffer(), dtype=numpy.complex128).reshape(
+            (2,) * n
+        )
+        gate = numpy.frombuffer(m.to_buffer(), dtype=numpy.complex128).reshape(
+            (2,) * (2 * k)
+        )
+        # The gate's output axes come first in the result, so move them into place.
+        result = numpy.tensordot(gate, state, axes=(list(range(k, 2 * k)), qubits))
+        state[...] = numpy.moveaxis(result, list(range(k)), qubits)
+        return
+
+    # Bit position (from the least significant end) of each qubit of the gate.
+    positions = [n - 1 - q for q in qubits]
+    # offsets[g] is what to add to an index with all the gate's qubits 0,
+    # to get the index where the gate's qubits are in state g.
+    offsets: list[int] = []
+    for g in range(gate_size):
+        offset = 0
+        for b, position in enumerate(positions):
+            if (g >> (k - 1 - b)) & 1:
+                offset |= 1 << position
+        offsets.append(offset)
+    rows = _nonzero_rows(m)
+    sorted_positions = sorted(positions)
+
+    amplitudes = v.to_complex_list()
+    for rest in range(1 << (n - k)):
+        # Insert a 0 bit at each of the gate's positions.
+        base = rest
+        for position in sorted_positions:
+            low = base & ((1 << position) - 1)
+            base = ((base >> position) << (position + 1)) | low
+        indices = [base + offset for offset in offsets]
+        old = [amplitudes[i] for i in indices]
+        for index, row in zip(indices, rows):
+            amplitudes[index] = sum((c * old[j] for j, c in row), 0j)
+    v.to_buffer()[:] = complex_to_packed(amplitudes)
@@ -1,10 +1,82 @@
-from complex_matrices import ComplexMatrix
+import operator
+from typing import Optional
+
+from complex_matrices import ComplexMatrix, SparseComplexMatrix
+from complex_numbers import complex_to_packed, packed_to_complex, use_numpy
 from complex_vectors import ComplexVector
 
 
-def complex_matrix_vector_multiply(m: ComplexMatrix, v: ComplexVector) -> ComplexVector:
-    # Turn v into a matrix, and use complex_matrix_multiply.
-    m2 = ComplexMatrix([[i] for i in v])
-    result = m * m2
-    result_height = result.get_height()
-    return ComplexVector([result.get_row(i)[0] for i in range(result_height)])
+def complex_matrix_vector_multiply(
+    m: ComplexMatrix | SparseComplexMatrix,
+    v: ComplexVector,
+    out: Optional[ComplexVector] = None,
+) -> ComplexVector:
+    """Multiply an m x n matrix by a vector of length n, working directly on the
+    packed storage of both.
+
+    If `out` (a vector of length m) is given, the result is written into it
+    and it is returned, instead of creating a new vector.
+    `out` may be `v` itself, to update `v` in place.
+
+    Raises ValueError if sizes are not correct.
+    """
+    height = m.get_height()
+    width = m.get_width()
+    if len(v) != width:
+        raise ValueError(
+            "Cannot multiply matrix by vector due to incorrect sizes: width of matrix"
+            f" {width} is not equal to length of vector {len(v)}"
+        )
+    if out is not None and len(out) != height:
+        raise ValueError(
+            f"out must have length {height}, the height of the matrix, not {len(out)}."
+        )
+
+    if use_numpy():
+        import numpy
+
+        x = numpy.frombuffer(v.to_buffer(), dtype=numpy.complex128)
+        if isinstance(m, ComplexMatrix):
+            result = (
+                numpy.frombuffer(m.to_buffer(), dtype=numpy.complex128).reshape(
+                    height, width
+                )
+                @ x
+            )
+        else:
+            values, column_indices, row_pointers = m.csr_buffers()
+            row_indices = numpy.repeat(
+                numpy.arange(height), numpy.diff(numpy.frombuffer(row_pointers, "q"))
+            )
+            result = numpy.zeros(height, dtype=numpy.complex128)
+            numpy.add.at(
+                result,
+                row_indices,
+                numpy.frombuffer(values, dtype=numpy.complex128)
+                * x[numpy.frombuffer(column_indices, "q")],
+            )
+        if out is None:
+            return ComplexVector.from_complex(result)
+        numpy.frombuffer(out.to_buffer(), dtype=numpy.complex128)[:] = result
+        return out
+
+    x = v.to_complex_list()
+    if isinstance(m, ComplexMatrix):
+        result = [sum(map(operator.mul, row, x), 0j) for row in m.to_complex_list()]
+    else:
+        values, column_indices, row_pointers = m.csr_buffers()
+        nonzeros = packed_to_complex(values)
+        result = [
+            sum(
+                (
+                    nonzeros[k] * x[column_indices[k]]
+                    for k in range(row_pointers[i], row_pointers[i + 1])
+                ),
+                0j,
+            )
+            for i in range(height)
+        ]
+    if out is None:
+        return ComplexVector.from_complex(result)
+    out.to_buffer()[:] = complex_to_packed(result)
+    return out
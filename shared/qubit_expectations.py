@@ -0,0 +1,128 @@
+from typing import Optional, Sequence
+
+from complex_numbers import use_numpy
+from complex_vectors import ComplexVector
+
+from .complex_matrix_qubit_application import _check_qubits, qubit_count
+from .qubit_sampling import outcome_mask
+
+
+def pauli_masks(
+    pauli_string: str, qubits: Sequence[int], n: int
+) -> tuple[int, int, int]:
+    """The Pauli string (e.g. `"XIZY"`, with its first Pauli acting on `qubits[0]`)
+    as bit masks of an n qubit state's indices: the qubits it flips (X or Y),
+    the qubits it changes the sign of (Z or Y), and how many Ys it has.
+
+    So the Pauli string maps element `j ^ flip` of a state to element `j`,
+    multiplied by `(-i)^ys` and by -1 for each bit of `j & sign` that is set.
+
+    Raises ValueError if the string isn't one of I, X, Y or Z for each qubit.
+    """
+    if len(pauli_string) != len(qubits):
+        raise ValueError(
+            f"Pauli string {pauli_string} must have one Pauli for each of the"
+            f" {len(qubits)} qubits."
+        )
+    flip = sign = ys = 0
+    for pauli, q in zip(pauli_string, qubits):
+        bit = 1 << (n - 1 - q)
+        if pauli not in "IXYZ":
+            raise ValueError("Pauli strings can only contain I, X, Y and Z.")
+        if pauli in "XY":
+            flip |= bit
+        if pauli in "YZ":
+            sign |= bit
+        if pauli == "Y":
+            ys += 1
+    return flip, sign, ys
+
+
+def pauli_expectation_values(
+    v: ComplexVector,
+    pauli_strings: Sequence[str],
+    qubits: Optional[Sequence[int]] = None,
+) -> list[float]:
+    """The expectation value of each Pauli string (e.g. `"ZZIX"`) for the state `v`,
+    where the first Pauli acts on `qubits[0]` (by default, qubit 0).
+
+    Strings that flip the same qubits share the products of amplitudes they need,
+    and without NumPy all of the strings are found in a single pass over `v`.
+    `v` does not need to be normalized.
+    """
+    n = qubit_count(v)
+    if qubits is None:
+        qubits = range(n)
+    _check_qubits(qubits, n)
+    # flip -> [(index of the string, sign, ys)]
+    groups: dict[int, list[tuple[int, int, int]]] = {}
+    for index, pauli_string in enumerate(pauli_strings):
+        flip, sign, ys = pauli_masks(pauli_string, qubits, n)
+        groups.setdefault(flip, []).append((index, sign, ys))
+    totals = [0j] * len(pauli_strings)
+    phases = [0] * len(pauli_strings)
+
+    if use_numpy():
+        import numpy
+
+        state = numpy.frombuffer(v.to_buffer(), dtype=numpy.complex128)
+        indices = numpy.arange(len(state))
+        norm = float(numpy.vdot(state, state).real)
+        for flip, terms in groups.items():
+            products = state.conj() * state[indices ^ flip]
+            for index, sign, ys in terms:
+                parity = numpy.zeros(len(state), dtype=indices.dtype)
+                for position in range(n):
+                    if (sign >> position) & 1:
+                        parity ^= (indices >> position) & 1
+                totals[index] = complex((products * (1 - 2 * parity)).sum())
+                phases[index] = ys
+    else:
+        amplitudes = v.to_complex_list()
+        norm = sum(a.real * a.real + a.imag * a.imag for a in amplitudes)
+        for terms in groups.values():
+            for index, _, ys in terms:
+                phases[index] = ys
+        group_items = list(groups.items())
+        for j, a in enumerate(amplitudes):
+            if a == 0:
+                continue
+            conjugate = a.conjugate()
+            for flip, terms in group_items:
+                product = conjugate * amplitudes[j ^ flip]
+                if product == 0:
+                    continue
+                for index, sign, _ in terms:
+                    if (j & sign).bit_count() & 1:
+                        totals[index] -= product
+                    else:
+                        totals[index] += product
+    return [(total * (-1j) ** ys).real / norm for total, ys in zip(totals, phases)]
+
+
+def outcome_probability(v: ComplexVector, qubits: Sequence[int], outcome: int) -> float:
+    """The probability that measuring `qubits` of the state `v` gives `outcome`
+    (with `qubits[0]` as its most significant bit), without sampling.
+
+    `v` does not need to be normalized.
+    """
+    n = qubit_count(v)
+    _check_qubits(qubits, n)
+    mask, target = outcome_mask(qubits, outcome, n)
+
+    if use_numpy():
+        import numpy
+
+        state = numpy.frombuffer(v.to_buffer(), dtype=numpy.complex128)
+        probabilities = state.real**2 + state.imag**2
+        matches = (numpy.arange(len(state)) & mask) == target
+        return float(probabilities[matches].sum() / probabilities.sum())
+
+    data = v.to_buffer()
+    total = matching = 0.0
+    for i in range(len(data) // 2):
+        p = data[2 * i] * data[2 * i] + data[2 * i + 1] * data[2 * i + 1]
+        total += p
+        if i & mask == target:
+            matching += p
+    return matching / total
@@ -0,0 +1,72 @@
+from array import array
+from typing import Sequence
+
+from complex_numbers import use_numpy
+from complex_vectors import ComplexVector
+
+
+def _check_indices(indices: Sequence[int], length: int) -> None:
+    if any(i < 0 or i >= length for i in indices):
+        raise ValueError(f"Indices must be between 0 and {length - 1}.")
+
+
+def phase_flip(v: ComplexVector, indices: Sequence[int]) -> None:
+    """Multiply the elements of `v` at `indices` by -1, in place
+    (i.e. apply a phase oracle marking `indices`).
+
+    Takes O(len(indices)) time, rather than building the 2^n x 2^n oracle.
+    """
+    _check_indices(indices, len(v))
+
+    if use_numpy():
+        import numpy
+
+        state = numpy.frombuffer(v.to_buffer(), dtype=numpy.complex128)
+        chosen = numpy.asarray(indices, dtype=numpy.intp)
+        state[chosen] = -state[chosen]
+        return
+
+    data = v.to_buffer()
+    for i in indices:
+        data[2 * i] = -data[2 * i]
+        data[2 * i + 1] = -data[2 * i + 1]
+
+
+def invert_about_mean(v: ComplexVector) -> None:
+    """Replace each element `a` of `v` by `2 * mean - a`, in place
+    (i.e. apply the diffusion operator `-I + 2A`, where every element of A is 1/2^n).
+
+    Takes O(2^n) time, rather than building the 2^n x 2^n matrix.
+    """
+    data = v.to_buffer()
+
+    if use_numpy():
+        import numpy
+
+        state = numpy.frombuffer(data, dtype=numpy.complex128)
+        twice_mean = 2 * state.mean()
+        numpy.subtract(twice_mean, state, out=state)
+        return
+
+    length = len(data) // 2
+    twice_real_mean = 2 * sum(data[0::2]) / length
+    twice_imaginary_mean = 2 * sum(data[1::2]) / length
+    data[0::2] = array("d", [twice_real_mean - x for x in data[0::2]])
+    data[1::2] = array("d", [twice_imaginary_mean - x for x in data[1::2]])
+
+
+def probability_of_indices(v: ComplexVector, indices: Sequence[int]) -> float:
+    """The probability that measuring `v` (which must be normalized) gives one of
+    `indices`, in O(len(indices)) time.
+    """
+    _check_indices(indices, len(v))
+
+    if use_numpy():
+        import numpy
+
+        state = numpy.frombuffer(v.to_buffer(), dtype=numpy.complex128)
+        chosen = state[numpy.asarray(indices, dtype=numpy.intp)]
+        return float(numpy.sum(chosen.real**2 + chosen.imag**2))
+
+    data = v.to_buffer()
+    return sum(data[2 * i] ** 2 + data[2 * i + 1] ** 2 for i in indices)
@@ -0,0 +1,155 @@
+import bisect
+import itertools
+import math
+import random
+from typing import Optional, Sequence
+
+from complex_numbers import use_numpy
+from complex_vectors import ComplexVector
+
+from .complex_matrix_qubit_application import _check_qubits, qubit_count
+
+
+def marginal_probabilities(
+    probabilities: Sequence[float], qubits: Sequence[int]
+) -> list[float]:
+    """The probability of each outcome of measuring only `qubits`, given the
+    probability of each outcome of measuring every qubit.
+
+    In outcome `i`, the state of `qubits[0]` is the most significant bit of `i`.
+    Raises ValueError if the number of probabilities is not a power of 2.
+    """
+    n = len(probabilities).bit_length() - 1
+    if len(probabilities) != 1 << n:
+        raise ValueError("Number of outcome probabilities must be a power of 2.")
+    _check_qubits(qubits, n)
+
+    if use_numpy():
+        import numpy
+
+        marginal = (
+            numpy.asarray(probabilities, dtype=float)
+            .reshape((2,) * n)
+            .sum(axis=tuple(q for q in range(n) if q not in qubits))
+        )
+        # The remaining axes are in increasing order of qubit.
+        in_order = sorted(qubits)
+        marginal = marginal.transpose([in_order.index(q) for q in qubits])
+        return marginal.ravel().tolist()
+
+    marginal = [0.0] * (1 << len(qubits))
+    positions = [n - 1 - q for q in qubits]
+    for i, p in enumerate(probabilities):
+        outcome = 0
+        for position in positions:
+            outcome = (outcome << 1) | ((i >> position) & 1)
+        marginal[outcome] += p
+    return marginal
+
+
+def qubit_probabilities(
+    v: ComplexVector, qubits: Optional[Sequence[int]] = None
+) -> list[float]:
+    """The probability of each outcome of measuring `qubits` of the state `v`
+    (by default, all of its qubits).
+
+    In outcome `i`, the state of `qubits[0]` is the most significant bit of `i`.
+    `v` does not need to be normalized.
+    """
+    n = qubit_count(v)
+    if qubits is not None:
+        _check_qubits(qubits, n)
+
+    if use_numpy():
+        import numpy
+
+        state = numpy.frombuffer(v.to_buffer(), dtype=numpy.complex128)
+        probabilities = state.real**2 + state.imag**2
+        probabilities /= probabilities.sum()
+        if qubits is not None:
+            return marginal_probabilities(probabilities, qubits)
+        return probabilities.tolist()
+
+    data = v.to_buffer()
+    probabilities = [
+        data[k] * data[k] + data[k + 1] * data[k + 1] for k in range(0, len(data), 2)
+    ]
+    total = sum(probabilities)
+    probabilities = [p / total for p in probabilities]
+    if qubits is None:
+        return probabilities
+    return marginal_probabilities(probabilities, qubits)
+
+
+def sample_outcomes(
+    probabilities: Sequence[float], shots: int, rng: random.Random
+) -> list[int]:
+    """Choose `shots` outcomes at random, where outcome `i` has probability
+    `probabilities[i]` (which need not sum to exactly 1).
+
+    The cumulative probabilities are computed once,
+    then each shot is a binary search, rather than a pass over every outcome.
+    With NumPy, the shots' random numbers are drawn all at once by a NumPy
+    generator seeded from `rng`, so the same `rng` state gives the same outcomes,
+    but not the same outcomes as without NumPy.
+    """
+    last = len(probabilities) - 1
+
+    if use_numpy():
+        import numpy
+
+        uniforms = numpy.random.default_rng(rng.getrandbits(64)).random(shots)
+        cumulative = numpy.cumsum(probabilities)
+        chosen = numpy.searchsorted(cumulative, uniforms * cumulative[-1], side="right")
+        return numpy.minimum(chosen, last).tolist()
+
+    uniforms = [rng.random() for _ in range(shots)]
+    cumulative = list(itertools.accumulate(probabilities))
+    total = cumulative[-1]
+    return [min(bisect.bisect_right(cumulative, u * total), last) for u in uniforms]
+
+
+def outcome_mask(qubits: Sequence[int], outcome: int, n: int) -> tuple[int, int]:
+    """Bit masks `(mask, target)` such that measuring `qubits` of an n qubit state
+    gives `outcome` (with `qubits[0]` as its most significant bit) for the
+    indices `i` where `i & mask == target`.
+    """
+    mask = target = 0
+    for b, q in enumerate(qubits):
+        mask |= 1 << (n - 1 - q)
+        if (outcome >> (len(qubits) - 1 - b)) & 1:
+            target |= 1 << (n - 1 - q)
+    return mask, target
+
+
+def project_qubits(v: ComplexVector, qubits: Sequence[int], outcome: int) -> None:
+    """Collapse the state `v` to the part where measuring `qubits` gives `outcome`
+    (with `qubits[0]` as its most significant bit), and renormalize it, in place.
+
+    Takes O(2^n) time. Raises ValueError if `outcome` has probability 0.
+    """
+    n = qubit_count(v)
+    _check_qubits(qubits, n)
+    # An element is kept if the bits of its index at mask are target.
+    mask, target = outcome_mask(qubits, outcome, n)
+
+    if use_numpy():
+        import numpy
+
+        state = numpy.frombuffer(v.to_buffer(), dtype=numpy.complex128)
+        state[(numpy.arange(len(state)) & mask) != target] = 0
+        norm = numpy.sqrt(numpy.vdot(state, state).real)
+        if norm == 0:
+            raise ValueError("Cannot collapse a state to an outcome of probability 0.")
+        state /= norm
+        return
+
+    data = v.to_buffer()
+    for i in range(len(data) // 2):
+        if i & mask != target:
+            data[2 * i] = data[2 * i + 1] = 0.0
+    norm = math.sqrt(sum(x * x for x in data))
+    if norm == 0:
+        raise ValueError("Cannot collapse a state to an outcome of probability 0.")
+    for k in range(len(data)):
+        data[k] /= norm
@@ -5,6 +5,7 @@ sys.path.append(
     os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir))
 )
 
+from benchmarks import *
 from complex_matrices import *
 from complex_numbers import *
 from complex_vectors import *
@@ -12,5 +13,6 @@ from cryptography_ import *
 from information_theory import *
 from marble_game import *
 from myqasm import *
+from quantum_algorithms import *
 from quantum_systems import *
 from shared import *
@@ -0,0 +1,135 @@
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+import warnings
+from pathlib import Path
+from unittest.mock import patch
+
+from context import (
+    BENCHMARKS,
+    BenchmarkResult,
+    benchmarks_main,
+    compare_results,
+    load_metadata,
+    load_results,
+    peak_memory,
+    results_to_json,
+    run_benchmarks,
+    save_results,
+    time_call,
+    use_numpy,
+)
+
+
+class BenchmarksCheck(unittest.TestCase):
+    def test_time_call(self):
+        calls = []
+        times = time_call(lambda: calls.append(1), repeats=3, min_seconds=0)
+        self.assertEqual(len(times), 3)
+        self.assertEqual(len(calls), 3)
+        self.assertTrue(all(t >= 0 for t in times))
+
+    def test_peak_memory(self):
+        self.assertGreaterEqual(peak_memory(lambda: bytearray(100_000)), 100_000)
+
+    # A small SHARED register, which is run in this process.
+    @patch("benchmarks.benchmarks.SHARED_BENCHMARK_QUBITS", 3)
+    def test_run_benchmarks(self):
+        progress = []
+        results = run_benchmarks(
+            sizes=[2, 4],
+            qubits=[2],
+            workers=[1, 2],
+            repeats=1,
+            min_seconds=0,
+            progress=progress.append,
+        )
+        self.assertEqual(results, progress)
+        values = {"size": [2, 4], "qubits": [2], "workers": [1, 2]}
+        self.assertEqual(
+            [(r.name, r.parameter, r.value) for r in results],
+            [
+                (name, parameter, value)
+                for name, (parameter, _) in BENCHMARKS.items()
+                for value in values[parameter]
+            ],
+        )
+        for result in results:
+            self.assertLessEqual(result.seconds, result.median_seconds)
+            self.assertGreater(result.peak_bytes, 0)
+        only = run_benchmarks(["myqasm_apply"], qubits=[3], repeats=1, min_seconds=0)
+        self.assertEqual([(r.name, r.value) for r in only], [("myqasm_apply", 3)])
+        with self.assertRaises(ValueError):
+            run_benchmarks(["matrix_divide"])
+
+    def test_save_and_load(self):
+        results = [BenchmarkResult("matrix_multiply", "size", 4, 1e-5, 2e-5, 100)]
+        self.assertIn("numpy", results_to_json(results)["metadata"])
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "results.json"
+            save_results(results, path)
+            self.assertEqual(load_results(path), results)
+            self.assertEqual(load_metadata(path)["numpy"], use_numpy())
+
+    def test_compare_results(self):
+        baseline = [
+            BenchmarkResult("matrix_multiply", "size", 4, 1.0, 1.0, 0),
+            BenchmarkResult("matrix_multiply", "size", 8, 1.0, 1.0, 0),
+        ]
+        results = [
+            BenchmarkResult("matrix_multiply", "size", 4, 1.1, 1.1, 0),
+            BenchmarkResult("matrix_multiply", "size", 8, 1.5, 1.5, 0),
+            BenchmarkResult("matrix_multiply", "size", 16, 9.0, 9.0, 0),
+        ]
+        comparisons = compare_results(results, baseline, threshold=0.2)
+        self.assertEqual([c.value for c in comparisons], [4, 8])
+        self.assertEqual([c.regression for c in comparisons], [False, True])
+        self.assertAlmostEqual(comparisons[1].ratio, 1.5)
+        self.assertTrue(
+            compare_results(results, baseline, threshold=0.05)[0].regression
+        )
+
+    def test_compare_results_numpy_mismatch(self):
+        baseline = [BenchmarkResult("matrix_multiply", "size", 4, 1.0, 1.0, 0)]
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            compare_results(baseline, baseline, baseline_metadata={})
+            compare_results(
+                baseline, baseline, baseline_metadata={"numpy": use_numpy()}
+            )
+        with self.assertWarns(RuntimeWarning):
+            compare_results(
+                baseline, baseline, baseline_metadata={"numpy": not use_numpy()}
+            )
+
+    def test_command_line(self):
+        arguments = ["--only", "matrix_vector_multiply", "--sizes", "2"]
+        arguments += ["--repeats", "1", "--min-seconds", "0"]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "results.json"
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(
+                    benchmarks_main(arguments + ["--output", str(path)]), 0
+                )
+            saved = json.loads(path.read_text())
+            self.assertEqual(len(saved["results"]), 1)
+            # Make the baseline impossibly fast, so this run is a regression.
+            saved["results"][0]["seconds"] = 1e-12
+            path.write_text(json.dumps(saved))
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(
+                    benchmarks_main(arguments + ["--baseline", str(path)]), 1
+                )
+            self.assertIn("REGRESSION", output.getvalue())
+            saved["metadata"]["numpy"] = not saved["metadata"]["numpy"]
+            path.write_text(json.dumps(saved))
+            with contextlib.redirect_stdout(io.StringIO()):
+                with self.assertWarns(RuntimeWarning):
+                    benchmarks_main(arguments + ["--baseline", str(path)])
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -1,7 +1,9 @@
 import math
 import unittest
+from array import array
+from unittest.mock import patch
 
-from context import ComplexMatrix, ComplexNumber, tensor_product
+from context import ComplexMatrix, ComplexNumber, SparseComplexMatrix, tensor_product
 
 zero = ComplexNumber(0, 0)
 one = ComplexNumber(1, 0)
@@ -480,5 +482,204 @@ class ComplexMatrixIsDiagonalCheck(unittest.TestCase):
         )
 
 
+class ComplexMatrixPackedStorageCheck(unittest.TestCase):
+    def test_get_row_is_a_copy(self):
+        m = ComplexMatrix([[1, 2], [3, 4]])
+        row = m.get_row(0)
+        row[0] = five
+        self.assertEqual(m, [[1, 2], [3, 4]])
+
+    def test_elements_are_complex_numbers(self):
+        m = ComplexMatrix([[1, ComplexNumber(2, -3)]])
+        self.assertIsInstance(m.get_row(0)[0], ComplexNumber)
+        self.assertEqual(m.get_column(1), [ComplexNumber(2, -3)])
+
+    def test_larger_multiplication_by_identity(self):
+        m = ComplexMatrix([[ComplexNumber(i, j) for j in range(8)] for i in range(8)])
+        self.assertEqual(m * ComplexMatrix.identity(8), m)
+        self.assertEqual(ComplexMatrix.identity(8) * m, m)
+
+
+class ComplexMatrixBuiltinComplexCheck(unittest.TestCase):
+    def test_complex_values(self):
+        m = ComplexMatrix([[1j, 2], [3, 4 - 1j]])
+        self.assertEqual(m, [[ComplexNumber(0, 1), 2], [3, ComplexNumber(4, -1)]])
+        self.assertEqual(1j * m, [[-1, 2j], [3j, 1 + 4j]])
+        self.assertEqual(m + [[1j, 0], [0, 1j]], [[2j, 2], [3, 4]])
+
+    def test_from_buffer_does_not_copy(self):
+        data = array("d", [1, 2, 3, 4, 5, 6])
+        m = ComplexMatrix.from_buffer(data, 3, 1)
+        self.assertEqual(m, [[1 + 2j], [3 + 4j], [5 + 6j]])
+        data[5] = 0
+        self.assertEqual(m.get_row(2), [5])
+
+    def test_from_buffer_wrong_size(self):
+        with self.assertRaises(ValueError):
+            ComplexMatrix.from_buffer(array("d", [1, 2, 3, 4]), 2, 2)
+        with self.assertRaises(ValueError):
+            ComplexMatrix.from_buffer(array("d", [1, 2]), 0, 1)
+
+    def test_export(self):
+        m = ComplexMatrix([[1, ComplexNumber(2, -1)]])
+        self.assertEqual(m.to_complex_list(), [[1, 2 - 1j]])
+        self.assertEqual(m.to_buffer().tolist(), [1, 0, 2, -1])
+
+
+sparse_cnot = SparseComplexMatrix(
+    [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]]
+)
+dense_cnot = ComplexMatrix([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]])
+sparse_complex = SparseComplexMatrix([[0, ComplexNumber(0, 1)], [2, 0], [0, 3]])
+dense_complex = ComplexMatrix([[0, ComplexNumber(0, 1)], [2, 0], [0, 3]])
+
+
+class SparseComplexMatrixInitCheck(unittest.TestCase):
+    def test_only_nonzeros_stored(self):
+        self.assertEqual(sparse_cnot.number_of_nonzeros(), 4)
+        self.assertEqual(SparseComplexMatrix.identity(1000).number_of_nonzeros(), 1000)
+
+    def test_invalid(self):
+        with self.assertRaises(TypeError):
+            SparseComplexMatrix([])
+        with self.assertRaises(ValueError):
+            SparseComplexMatrix([[]])
+        with self.assertRaises(ValueError):
+            SparseComplexMatrix([[1, 2], [3]])
+        with self.assertRaises(TypeError):
+            SparseComplexMatrix([["1"]])
+
+    def test_from_coordinates(self):
+        self.assertEqual(
+            SparseComplexMatrix.from_coordinates(
+                3, 2, [(0, 1, 1j), (1, 0, 1), (1, 0, 1), (2, 1, 3)]
+            ),
+            dense_complex,
+        )
+        with self.assertRaises(ValueError):
+            SparseComplexMatrix.from_coordinates(2, 2, [(2, 0, 1)])
+
+    def test_dense_conversion(self):
+        self.assertEqual(SparseComplexMatrix.from_dense(dense_complex), sparse_complex)
+        self.assertIsInstance(sparse_complex.to_dense(), ComplexMatrix)
+        self.assertEqual(sparse_complex.to_dense(), dense_complex)
+
+
+class SparseComplexMatrixAccessCheck(unittest.TestCase):
+    def test_size(self):
+        self.assertEqual(sparse_complex.get_height(), 3)
+        self.assertEqual(sparse_complex.get_width(), 2)
+
+    def test_rows_and_columns(self):
+        self.assertEqual(sparse_complex.get_row(1), [2, 0])
+        self.assertEqual(sparse_complex.get_column(1), [ComplexNumber(0, 1), 0, 3])
+        with self.assertRaises(ValueError):
+            sparse_complex.get_row(3)
+        with self.assertRaises(ValueError):
+            sparse_complex.get_column(-1)
+
+    def test_equality(self):
+        self.assertEqual(sparse_cnot, dense_cnot)
+        self.assertEqual(dense_cnot, sparse_cnot)
+        self.assertEqual(
+            sparse_cnot, [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]]
+        )
+        self.assertNotEqual(sparse_cnot, SparseComplexMatrix.identity(4))
+        self.assertNotEqual(sparse_cnot, sparse_complex)
+        self.assertNotEqual(sparse_cnot, 1)
+
+
+class SparseComplexMatrixOperationsCheck(unittest.TestCase):
+    def test_sparse_results(self):
+        self.assertIsInstance(sparse_cnot * sparse_cnot, SparseComplexMatrix)
+        self.assertIsInstance(sparse_cnot + sparse_cnot, SparseComplexMatrix)
+        self.assertIsInstance(1j * sparse_cnot, SparseComplexMatrix)
+        self.assertIsInstance(sparse_complex.adjoint(), SparseComplexMatrix)
+        self.assertIsInstance(
+            tensor_product(sparse_cnot, dense_complex), SparseComplexMatrix
+        )
+
+    def test_agree_with_dense(self):
+        self.assertEqual(sparse_cnot * sparse_cnot, dense_cnot * dense_cnot)
+        self.assertEqual(sparse_complex * m2x2, dense_complex * m2x2)
+        self.assertEqual(
+            ComplexMatrix([[1, 2, 3]]) * sparse_complex,
+            ComplexMatrix([[1, 2, 3]]) * dense_complex,
+        )
+        self.assertEqual(sparse_cnot + dense_cnot, 2 * dense_cnot)
+        self.assertEqual(dense_cnot + sparse_cnot, 2 * dense_cnot)
+        self.assertEqual(
+            sparse_complex + sparse_complex.inverse(), [[0, 0], [0, 0], [0, 0]]
+        )
+        self.assertEqual(
+            ComplexNumber(0, 2) * sparse_complex, ComplexNumber(0, 2) * dense_complex
+        )
+        self.assertEqual(sparse_complex.conjugate(), dense_complex.conjugate())
+        self.assertEqual(sparse_complex.transpose(), dense_complex.transpose())
+        self.assertEqual(sparse_complex.adjoint(), dense_complex.adjoint())
+        self.assertEqual(
+            sparse_complex.moduli_squared_matrix(),
+            dense_complex.moduli_squared_matrix(),
+        )
+        self.assertEqual(
+            tensor_product(sparse_complex, sparse_cnot),
+            tensor_product(dense_complex, dense_cnot),
+        )
+        self.assertEqual(
+            tensor_product(dense_cnot, sparse_complex),
+            tensor_product(dense_cnot, dense_complex),
+        )
+
+    def test_wrong_sizes(self):
+        with self.assertRaises(ValueError):
+            _ = sparse_cnot * sparse_complex.transpose()
+        with self.assertRaises(ValueError):
+            _ = sparse_complex * dense_complex
+        with self.assertRaises(ValueError):
+            _ = dense_complex * sparse_complex
+        with self.assertRaises(ValueError):
+            _ = sparse_cnot + sparse_complex
+
+    def test_wrong_type(self):
+        with self.assertRaises(TypeError):
+            _ = sparse_cnot * 1
+        with self.assertRaises(TypeError):
+            _ = sparse_cnot + "1"
+
+    def test_properties(self):
+        self.assertTrue(sparse_cnot.is_unitary())
+        self.assertTrue(sparse_cnot.is_hermitian())
+        self.assertTrue(sparse_cnot.is_square())
+        self.assertFalse(sparse_cnot.is_diagonal())
+        self.assertTrue(SparseComplexMatrix.identity(3).is_diagonal())
+        self.assertFalse(sparse_complex.is_square())
+        self.assertFalse((2 * sparse_cnot).is_unitary())
+        self.assertFalse(SparseComplexMatrix([[1, 1j], [1j, 1]]).is_hermitian())
+
+
+class ComplexMatrixPurePythonFallbackCheck(unittest.TestCase):
+    """The pure Python code paths must agree with the NumPy ones (if installed)."""
+
+    def test_operations_agree(self):
+        a = ComplexMatrix([[1, ComplexNumber(0, 1)], [ComplexNumber(2, -1), 3]])
+        b = ComplexMatrix([[ComplexNumber(0.5, 2), 4, 0], [-1, 1, ComplexNumber(0, 1)]])
+
+        def operations() -> list[ComplexMatrix]:
+            return [
+                a * b,
+                a + a,
+                ComplexNumber(0, 2) * b,
+                a.inverse(),
+                b.conjugate(),
+                b.transpose(),
+                b.adjoint(),
+                tensor_product(a, b),
+            ]
+
+        expected = operations()
+        with patch("complex_numbers.complex_number_arrays.numpy", None):
+            self.assertEqual(operations(), expected)
+
+
 if __name__ == "__main__":
     unittest.main()  # pragma: no cover
@@ -1,3 +1,4 @@
+import importlib
 import math
 import unittest
 
@@ -143,6 +144,74 @@ class ComplexNumberSubtractCheck(unittest.TestCase):
             _ = "1" - ComplexNumber(1, 1)
 
 
+class ComplexNumberBuiltinComplexCheck(unittest.TestCase):
+    def test_arithmetic_with_complex(self):
+        self.assertEqual(ComplexNumber(1, 2) + 3j, ComplexNumber(1, 5))
+        self.assertEqual(3j + ComplexNumber(1, 2), ComplexNumber(1, 5))
+        self.assertEqual(ComplexNumber(1, 2) - (1 + 1j), ComplexNumber(0, 1))
+        self.assertEqual((1 + 1j) - ComplexNumber(1, 2), ComplexNumber(0, -1))
+        self.assertEqual(ComplexNumber(1, 1) * (2 + 1j), ComplexNumber(1, 3))
+        self.assertEqual((2 + 1j) * ComplexNumber(1, 1), ComplexNumber(1, 3))
+        self.assertEqual(ComplexNumber(-2, 1) / (1 + 2j), ComplexNumber(0, 1))
+        self.assertEqual((-2 + 1j) / ComplexNumber(1, 2), ComplexNumber(0, 1))
+
+    def test_in_place_with_complex(self):
+        total = ComplexNumber(1, 1)
+        total += 2 - 1j
+        self.assertEqual(total, ComplexNumber(3, 0))
+        total -= 1j
+        self.assertEqual(total, ComplexNumber(3, -1))
+
+    def test_equality_with_complex(self):
+        self.assertTrue(ComplexNumber(1, -2) == 1 - 2j)
+        self.assertFalse(ComplexNumber(1, 2) == 1 - 2j)
+
+    def test_conversion(self):
+        self.assertEqual(complex(ComplexNumber(1.5, -2)), 1.5 - 2j)
+        self.assertEqual(
+            ComplexNumber.new_from_complex(1.5 - 2j), ComplexNumber(1.5, -2)
+        )
+
+
+class ComplexNumberInPlaceCheck(unittest.TestCase):
+    def test___iadd___leaves_aliases_unchanged(self):
+        total = ComplexNumber(1, 1)
+        same_total = total
+        total += ComplexNumber(2, -3)
+        total += 1.5
+        self.assertEqual(total, ComplexNumber(4.5, -2))
+        self.assertEqual(same_total, ComplexNumber(1, 1))
+
+    def test___isub___leaves_aliases_unchanged(self):
+        total = ComplexNumber(1, 1)
+        same_total = total
+        total -= ComplexNumber(2, -3)
+        total -= 1
+        self.assertEqual(total, ComplexNumber(-2, 4))
+        self.assertEqual(same_total, ComplexNumber(1, 1))
+
+    def test_module_constants_unchanged(self):
+        modules = ["complex_matrices.complex_matrices"]
+        modules.append("shared.complex_matrix_eigenvalues_vectors")
+        constants = [importlib.import_module(module).zero for module in modules]
+        for constant in constants + [zero]:
+            total = constant
+            total += ComplexNumber(1, 2)
+            total -= 3
+            self.assertEqual(constant, ComplexNumber(0, 0))
+
+    def test_in_place_wrong_type(self):
+        total = ComplexNumber(1, 1)
+        with self.assertRaises(TypeError):
+            total += "1"
+        with self.assertRaises(TypeError):
+            total -= "1"
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            ComplexNumber(1, 1).__dict__
+
+
 class ComplexNumberMultiplyCheck(unittest.TestCase):
     def test___mul___two_complex(self):
         self.assertEqual(
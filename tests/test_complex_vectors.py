@@ -1,5 +1,6 @@
 import math
 import unittest
+from array import array
 
 from context import (
     ComplexNumber,
@@ -331,5 +332,36 @@ class ComplexVectorTensorProductCheck(unittest.TestCase):
         )
 
 
+class ComplexVectorBuiltinComplexCheck(unittest.TestCase):
+    def test_complex_values(self):
+        self.assertEqual(
+            ComplexVector([1j, 2 - 1j]), [ComplexNumber(0, 1), ComplexNumber(2, -1)]
+        )
+        self.assertEqual(1j * ComplexVector([1, 1j]), [1j, -1])
+
+    def test_from_complex(self):
+        self.assertEqual(
+            ComplexVector.from_complex([1j, 2 - 1j]), ComplexVector([1j, 2 - 1j])
+        )
+
+    def test_from_buffer_does_not_copy(self):
+        data = array("d", [1, 2, 3, 4])
+        v = ComplexVector.from_buffer(data)
+        self.assertEqual(v, [1 + 2j, 3 + 4j])
+        data[0] = 5
+        self.assertEqual(v[0], 5 + 2j)
+
+    def test_from_buffer_invalid(self):
+        with self.assertRaises(ValueError):
+            ComplexVector.from_buffer(array("d", [1, 2, 3]))
+        with self.assertRaises(TypeError):
+            ComplexVector.from_buffer(array("i", [1, 2, 3, 4]))
+
+    def test_export(self):
+        v = ComplexVector([1, ComplexNumber(2, -1)])
+        self.assertEqual(v.to_complex_list(), [1, 2 - 1j])
+        self.assertEqual(v.to_buffer().tolist(), [1, 0, 2, -1])
+
+
 if __name__ == "__main__":
     unittest.main()  # pragma: no cover
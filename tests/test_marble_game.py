@@ -10,6 +10,7 @@ from context import (
     MarbleGame,
     ProbabilisticMarbleGame,
     QuantumMarbleGame,
+    SparseComplexMatrix,
 )
 
 minus_one = ComplexNumber(-1, 0)
@@ -179,6 +180,10 @@ class MarbleGameIterationsCheck(unittest.TestCase):
             game6.calculate_state(1),
         )
 
+    def test_sparse_movement_matrix(self):
+        sparse_game6 = MarbleGame(6, 27, v6, SparseComplexMatrix.from_dense(m6))
+        self.assertEqual(sparse_game6.calculate_state(3), game6.calculate_state(3))
+
 
 class ProbabilisticMarbleGameInitCheck(unittest.TestCase):
     def test_initial_state_sum(self):
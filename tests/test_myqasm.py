@@ -1,24 +1,63 @@
+import json
+import gc
 import math
+import os
+import pickle
+import random
+import tempfile
+import tracemalloc
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from unittest.mock import patch
 
 from context import (
     MYQASM,
     ComplexMatrix,
     ComplexNumber,
     ComplexVector,
+    DensityMatrixRegister,
+    IdentityGate,
     InvalidMYQASMSyntaxError,
     KeywordEnum,
+    KroneckerGate,
+    MappedRegister,
+    MPSRegister,
     MYQASM_lexer,
     MYQASMCONCATDifferentSizeGatesError,
     MYQASMGateAndRegisterDifferentSizeGatesError,
     MYQASMGateDoesNotExistError,
+    MYQASMInstructionProfile,
+    MYQASMInvalidQubitsError,
+    MYQASMParameterError,
+    MYQASMProfiler,
+    MYQASMProgram,
     MYQASMRedefineBuiltinGateError,
     MYQASMRedefineRegisterError,
     MYQASMRedefineUserGateError,
     MYQASMRegisterDoesNotExistError,
+    MYQASMRegisterTypeError,
+    MYQASMSession,
+    MYQASMSnapshot,
+    MYQASMUnsupportedGateError,
+    SharedMemoryRegister,
+    StabilizerRegister,
     TokenNameEnum,
+    clear_builtin_gate_cache,
+    clifford_decomposition,
+    depolarizing_channel,
+    complex_matrix_vector_multiply,
+    get_builtin_gate_cache_info,
+    get_default_session,
     get_registers,
+    get_subregisters,
     get_user_defined_gates,
+    is_clifford_program,
+    outcome_probability,
+    pauli_expectation_values,
+    run_variants,
+    shutdown_worker_pools,
     tensor_product,
 )
 
@@ -29,6 +68,8 @@ hadamard = ComplexMatrix(
     ]
 )
 
+cnot = ComplexMatrix([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]])
+
 
 class LexerCheck(unittest.TestCase):
     def test_initialize_lexing_normal(self):
@@ -99,8 +140,22 @@ class LexerCheck(unittest.TestCase):
             ],
         )
 
+    def test_apply_lexing_qubit_indices(self):
+        self.assertEqual(
+            MYQASM_lexer("APPLY CNOT R 2 5"),
+            [
+                (TokenNameEnum.KEYWORD, KeywordEnum.APPLY),
+                (TokenNameEnum.IDENTIFIER, "CNOT"),
+                (TokenNameEnum.IDENTIFIER, "R"),
+                (TokenNameEnum.LITERAL, "2"),
+                (TokenNameEnum.LITERAL, "5"),
+            ],
+        )
+
     def test_apply_lexing_invalid(self):
         self.assertRaises(InvalidMYQASMSyntaxError, MYQASM_lexer, "APPLY U")
+        self.assertRaises(InvalidMYQASMSyntaxError, MYQASM_lexer, "APPLY U R one")
+        self.assertRaises(InvalidMYQASMSyntaxError, MYQASM_lexer, "APPLY U R 1 -2")
         self.assertRaises(InvalidMYQASMSyntaxError, MYQASM_lexer, "APPLY () R")
         self.assertRaises(InvalidMYQASMSyntaxError, MYQASM_lexer, "APPLY U ()")
 
@@ -113,8 +168,19 @@ class LexerCheck(unittest.TestCase):
             ],
         )
 
+    def test_measure_lexing_shots(self):
+        self.assertEqual(
+            MYQASM_lexer("MEASURE R 1000"),
+            [
+                (TokenNameEnum.KEYWORD, KeywordEnum.MEASURE),
+                (TokenNameEnum.IDENTIFIER, "R"),
+                (TokenNameEnum.LITERAL, "1000"),
+            ],
+        )
+
     def test_measure_lexing_invalid(self):
         self.assertRaises(InvalidMYQASMSyntaxError, MYQASM_lexer, "MEASURE R1 P")
+        self.assertRaises(InvalidMYQASMSyntaxError, MYQASM_lexer, "MEASURE R1 1 2")
         self.assertRaises(InvalidMYQASMSyntaxError, MYQASM_lexer, "MEASURE (")
 
     def test_initial_identifier_invalid(self):
@@ -316,6 +382,67 @@ class MYQASMCheck(unittest.TestCase):
         with self.assertRaises(MYQASMGateDoesNotExistError):
             MYQASM("APPLY UNDEFINED APPLY_INVALID")
 
+    def test_apply_to_qubits(self):
+        MYQASM("INITIALIZE APPLY_QUBITS 3 [100]")
+        MYQASM("APPLY CNOT APPLY_QUBITS 0 2")
+        self.assertEqual(get_registers()["APPLY_QUBITS"], [0, 0, 0, 0, 0, 1, 0, 0])
+        MYQASM("APPLY H APPLY_QUBITS 1")
+        MYQASM("APPLY_QUBITS_H TENSOR I2 H")
+        MYQASM("APPLY_QUBITS_H2 TENSOR APPLY_QUBITS_H I2")
+        MYQASM("INITIALIZE APPLY_QUBITS2 3 [101]")
+        MYQASM("APPLY APPLY_QUBITS_H2 APPLY_QUBITS2")
+        self.assertEqual(
+            get_registers()["APPLY_QUBITS"], get_registers()["APPLY_QUBITS2"]
+        )
+
+    def test_apply_to_qubits_invalid(self):
+        MYQASM("INITIALIZE APPLY_QUBITS_INVALID 3")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            MYQASM("APPLY H APPLY_QUBITS_INVALID 3")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            MYQASM("APPLY CNOT APPLY_QUBITS_INVALID 1 1")
+        with self.assertRaises(MYQASMGateAndRegisterDifferentSizeGatesError):
+            MYQASM("APPLY CNOT APPLY_QUBITS_INVALID 1")
+
+    def test_select(self):
+        MYQASM("INITIALIZE SELECT_REG 4")
+        MYQASM("SELECT SELECT_SUB SELECT_REG 1 3")
+        MYQASM("SELECT SELECT_SUB2 SELECT_SUB 1 2")
+        self.assertEqual(get_subregisters()["SELECT_SUB"], ("SELECT_REG", [1, 2, 3]))
+        self.assertEqual(get_subregisters()["SELECT_SUB2"], ("SELECT_REG", [2, 3]))
+        MYQASM("APPLY_SELECT_X CONCAT H R1")
+        MYQASM("APPLY_SELECT_X2 CONCAT APPLY_SELECT_X H")
+        MYQASM("APPLY APPLY_SELECT_X2 SELECT_SUB 0")
+        MYQASM("APPLY CNOT SELECT_SUB 0 2")
+        MYQASM("APPLY H SELECT_SUB2 0")
+        MYQASM("APPLY H SELECT_SUB2 0")
+        self.assertEqual(MYQASM("MEASURE SELECT_REG"), [0, 1, 0, 1])
+        self.assertEqual(MYQASM("MEASURE SELECT_SUB"), [1, 0, 1])
+        self.assertEqual(MYQASM("MEASURE SELECT_SUB2"), [0, 1])
+        MYQASM("APPLY CNOT SELECT_SUB2")
+        self.assertEqual(MYQASM("MEASURE SELECT_REG"), [0, 1, 0, 1])
+
+    def test_select_invalid(self):
+        MYQASM("INITIALIZE SELECT_INVALID 2")
+        with self.assertRaises(MYQASMRegisterDoesNotExistError):
+            MYQASM("SELECT SELECT_INVALID_SUB UNDEFINED 0 1")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            MYQASM("SELECT SELECT_INVALID_SUB SELECT_INVALID 1 2")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            MYQASM("SELECT SELECT_INVALID_SUB SELECT_INVALID 0 0")
+        with self.assertRaises(MYQASMRedefineBuiltinGateError):
+            MYQASM("SELECT H SELECT_INVALID 0 1")
+        with self.assertRaises(MYQASMRedefineRegisterError):
+            MYQASM("SELECT SELECT_INVALID SELECT_INVALID 0 1")
+        MYQASM("SELECT SELECT_INVALID_SUB SELECT_INVALID 1 1")
+        with self.assertRaises(MYQASMGateAndRegisterDifferentSizeGatesError):
+            MYQASM("APPLY CNOT SELECT_INVALID_SUB")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            MYQASM("APPLY H SELECT_INVALID_SUB 1")
+        MYQASM("INITIALIZE SELECT_INVALID 1")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            MYQASM("APPLY H SELECT_INVALID_SUB")
+
     def test_unified_X_gate(self):
         MYQASM("INITIALIZE UNIFIED1 1")
         MYQASM("HZ CONCAT H R1")
@@ -333,5 +460,1545 @@ class MYQASMCheck(unittest.TestCase):
         self.assertIn(ans, [[0, 0], [1, 1]])
 
 
+class MYQASMSessionCheck(unittest.TestCase):
+    def test_default_session(self):
+        MYQASM("INITIALIZE SESSION_DEFAULT 1")
+        MYQASM("SESSION_DEFAULT_GATE INVERSE H")
+        self.assertIs(get_default_session().get_registers(), get_registers())
+        self.assertIn("SESSION_DEFAULT", get_default_session().get_registers())
+        self.assertIn(
+            "SESSION_DEFAULT_GATE", get_default_session().get_user_defined_gates()
+        )
+
+    def test_sessions_are_independent(self):
+        session1 = MYQASMSession()
+        session2 = MYQASMSession()
+        session1.MYQASM("INITIALIZE SESSION_R 1")
+        session1.MYQASM("X CONCAT H H")
+        self.assertEqual(session2.get_registers(), {})
+        self.assertEqual(session2.get_user_defined_gates(), {})
+        self.assertNotIn("SESSION_R", get_registers())
+        session2.MYQASM("INITIALIZE SESSION_R 1 [1]")
+        session2.MYQASM("SELECT S SESSION_R 0 1")
+        self.assertEqual(session1.MYQASM("MEASURE SESSION_R"), [0])
+        self.assertEqual(session2.MYQASM("MEASURE S"), [1])
+        self.assertEqual(session1.get_subregisters(), {})
+        with self.assertRaises(MYQASMGateDoesNotExistError):
+            session2.MYQASM("APPLY X SESSION_R")
+
+    def test_threads(self):
+        def run(initial_state: str) -> list[list[int]]:
+            session = MYQASMSession()
+            session.MYQASM(f"INITIALIZE R 3 [{initial_state}]")
+            results: list[list[int]] = []
+            for _ in range(50):
+                session.MYQASM("APPLY CNOT R 0 1")
+                results.append(session.MYQASM("MEASURE R"))
+            return results
+
+        initial_states = ["100", "101", "110", "111"]
+        with ThreadPoolExecutor(4) as executor:
+            all_results = list(executor.map(run, initial_states))
+        for initial_state, results in zip(initial_states, all_results):
+            first_state = [int(char) for char in initial_state]
+            second_state = [first_state[0], 1 - first_state[1], first_state[2]]
+            self.assertEqual(results, [second_state, first_state] * 25)
+
+    def test_registers_change_in_place(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 2 [10]")
+        state = session.get_registers()["R"]
+        session.MYQASM("APPLY CNOT R 0 1")
+        self.assertIs(session.get_registers()["R"], state)
+        self.assertEqual(state.to_complex_list(), [0, 0, 0, 1])
+        session.MYQASM("FORK R F")
+        session.MYQASM("APPLY CNOT R 0 1")
+        # R was copied before it changed, so the state got earlier is F's.
+        self.assertIs(session.get_registers()["F"], state)
+        self.assertEqual(state.to_complex_list(), [0, 0, 0, 1])
+        self.assertEqual(session.get_registers()["R"].to_complex_list(), [0, 0, 1, 0])
+
+    def test_measure_shots(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 3 [101]")
+        self.assertEqual(session.MYQASM("MEASURE R 4"), [5, 5, 5, 5])
+        self.assertEqual(session.MYQASM("MEASURE R 0"), [])
+        session.MYQASM("APPLY H R 1")
+        results = session.MYQASM("MEASURE R 200")
+        self.assertEqual(len(results), 200)
+        self.assertEqual(set(results), {5, 7})
+
+    def test_sample(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 3 [110]")
+        session.MYQASM("SELECT S R 1 2")
+        self.assertEqual(list(session.sample("R", 3)), [6, 6, 6])
+        self.assertEqual(list(session.sample("S", 3)), [2, 2, 2])
+        self.assertEqual(session.sample_counts("S", 3), {"10": 3})
+        session.MYQASM("APPLY H R 2")
+        counts = session.sample_counts("S", 1000)
+        self.assertEqual(set(counts), {"10", "11"})
+        self.assertEqual(sum(counts.values()), 1000)
+        # Both outcomes have probability 1 / 2.
+        self.assertGreater(counts["10"], 400)
+        self.assertGreater(counts["11"], 400)
+        with self.assertRaises(MYQASMRegisterDoesNotExistError):
+            session.sample("UNDEFINED", 1)
+
+    def test_seed(self):
+        session1 = MYQASMSession(seed=1234)
+        session2 = MYQASMSession()
+        session2.seed(1234)
+        for session in [session1, session2]:
+            session.MYQASM("INITIALIZE R 4")
+            session.MYQASM("HH TENSOR H H")
+            session.MYQASM("APPLY HH R 0 3")
+        self.assertEqual(
+            session1.MYQASM("MEASURE R 100"), session2.MYQASM("MEASURE R 100")
+        )
+        self.assertEqual(session1.MYQASM("MEASURE R"), session2.MYQASM("MEASURE R"))
+        session1.seed(1)
+        session2.seed(1)
+        self.assertEqual(
+            session1.sample_counts("R", 50), session2.sample_counts("R", 50)
+        )
+
+    def test_program_in_session(self):
+        session = MYQASMSession()
+        program = MYQASMProgram(bell_program)
+        self.assertIn(program.run(session), [[[0, 0]], [[1, 1]]])
+        self.assertIn("PROGRAM_BELL", session.get_registers())
+        self.assertEqual(len(program.run_many(3, session)), 3)
+
+
+class BuiltinGateCacheCheck(unittest.TestCase):
+    def test_hits_and_misses(self):
+        clear_builtin_gate_cache()
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 2")
+        info = get_builtin_gate_cache_info()
+        session.MYQASM("APPLY R0.25 R 1")
+        session.MYQASM("X CONCAT R0.25 R0.25")
+        session.MYQASM("Y CONCAT R0.25 X")
+        new_info = get_builtin_gate_cache_info()
+        # Only R0.25 is a builtin gate: the names X, Y and R are never looked up.
+        self.assertEqual(new_info.misses - info.misses, 1)
+        self.assertGreaterEqual(new_info.hits - info.hits, 3)
+        clear_builtin_gate_cache()
+        self.assertEqual(get_builtin_gate_cache_info().currsize, 0)
+
+    def test_only_gates_are_cached(self):
+        clear_builtin_gate_cache()
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE reg 2")
+        session.MYQASM("APPLY H reg 0")
+        session.MYQASM("MEASURE reg")
+        session.MYQASM("G CONCAT H H")
+        session.MYQASM("APPLY G reg 1")
+        info = get_builtin_gate_cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (2, 1, 1))
+
+    def test_bounded(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 1")
+        info = get_builtin_gate_cache_info()
+        for k in range(info.maxsize + 10):
+            session.MYQASM(f"APPLY R{k} R")
+        self.assertEqual(get_builtin_gate_cache_info().currsize, info.maxsize)
+
+    def test_reserved_name_without_number(self):
+        # R. is reserved for rotations, but has no angle to parse.
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 1")
+        with self.assertRaises(MYQASMRedefineBuiltinGateError):
+            session.MYQASM("INITIALIZE R. 2")
+        with self.assertRaises(MYQASMRedefineBuiltinGateError):
+            session.MYQASM("R. INVERSE H")
+        with self.assertRaises(MYQASMGateDoesNotExistError):
+            session.MYQASM("APPLY R. R 0")
+
+
+class IdentityGateCheck(unittest.TestCase):
+    def test_implicit(self):
+        session = MYQASMSession()
+        session.MYQASM("I_TWICE CONCAT I1024 I1024")
+        self.assertEqual(
+            session.get_user_defined_gates()["I_TWICE"], IdentityGate(1024)
+        )
+        session.MYQASM("INITIALIZE R 10 [0110011001]")
+        session.MYQASM("APPLY I1024 R")
+        session.MYQASM("APPLY I4 R 3 7")
+        self.assertEqual(session.MYQASM("MEASURE R"), [0, 1, 1, 0, 0, 1, 1, 0, 0, 1])
+        with self.assertRaises(MYQASMGateAndRegisterDifferentSizeGatesError):
+            session.MYQASM("APPLY I512 R")
+        with self.assertRaises(MYQASMGateAndRegisterDifferentSizeGatesError):
+            session.MYQASM("APPLY I2 R 3 4")
+
+    def test_gates_made_from_identities(self):
+        session = MYQASMSession()
+        session.MYQASM("A CONCAT I2 H")
+        session.MYQASM("B CONCAT H I2")
+        session.MYQASM("C TENSOR I2 I4")
+        session.MYQASM("D INVERSE I8")
+        session.MYQASM("E TENSOR I2 H")
+        gates = session.get_user_defined_gates()
+        self.assertEqual(gates["A"], hadamard)
+        self.assertEqual(gates["B"], hadamard)
+        self.assertEqual(gates["C"], IdentityGate(8))
+        self.assertEqual(gates["D"], IdentityGate(8))
+        self.assertEqual(
+            gates["E"], tensor_product(ComplexMatrix.identity(2), hadamard)
+        )
+        self.assertEqual(IdentityGate(2), ComplexMatrix.identity(2))
+        with self.assertRaises(MYQASMCONCATDifferentSizeGatesError):
+            session.MYQASM("F CONCAT I2 CNOT")
+
+
+class KroneckerGateCheck(unittest.TestCase):
+    def test_tensor_is_factored(self):
+        session = MYQASMSession()
+        session.MYQASM("HH TENSOR H H")
+        session.MYQASM("HHCNOT TENSOR HH CNOT")
+        session.MYQASM("BIG TENSOR HHCNOT I256")
+        gates = session.get_user_defined_gates()
+        self.assertIsInstance(gates["BIG"], KroneckerGate)
+        self.assertEqual(gates["BIG"].get_height(), 4096)
+        self.assertEqual(len(gates["BIG"].get_factors()), 4)
+        self.assertEqual(
+            gates["HHCNOT"],
+            tensor_product(tensor_product(hadamard, hadamard), cnot),
+        )
+
+    def test_apply(self):
+        session = MYQASMSession()
+        session.MYQASM("HI TENSOR H I2")
+        session.MYQASM("HIR TENSOR HI R0.5")
+        session.MYQASM("U TENSOR HIR CNOT")
+        session.MYQASM("INITIALIZE R 5 [01111]")
+        session.MYQASM("INITIALIZE S 5 [01111]")
+        session.MYQASM("APPLY U R")
+        state = session.get_registers()["S"]
+        expected = complex_matrix_vector_multiply(
+            session.get_user_defined_gates()["U"].to_matrix(), state
+        )
+        self.assertEqual(session.get_registers()["R"], expected)
+        session.MYQASM("APPLY U S 0 1 2 3 4")
+        self.assertEqual(session.get_registers()["S"], expected)
+        with self.assertRaises(MYQASMGateAndRegisterDifferentSizeGatesError):
+            session.MYQASM("APPLY U R 0 1")
+
+    def test_concat_and_inverse(self):
+        session = MYQASMSession()
+        session.MYQASM("A TENSOR H R0.5")
+        session.MYQASM("B TENSOR R0.25 H")
+        session.MYQASM("C CONCAT A B")
+        session.MYQASM("D INVERSE C")
+        session.MYQASM("E CONCAT A CNOT")
+        gates = session.get_user_defined_gates()
+        self.assertIsInstance(gates["C"], KroneckerGate)
+        self.assertIsInstance(gates["D"], KroneckerGate)
+        self.assertEqual(gates["C"], gates["A"].to_matrix() * gates["B"].to_matrix())
+        self.assertEqual(gates["D"], gates["C"].to_matrix().adjoint())
+        self.assertEqual(gates["E"], gates["A"].to_matrix() * cnot)
+
+    def test_not_whole_qubits(self):
+        session = MYQASMSession()
+        session.MYQASM("A TENSOR I3 H")
+        gate = session.get_user_defined_gates()["A"]
+        self.assertNotIsInstance(gate, KroneckerGate)
+        self.assertEqual(gate, tensor_product(ComplexMatrix.identity(3), hadamard))
+
+
+bell_program = """INITIALIZE PROGRAM_BELL 2
+PROGRAM_HTI TENSOR H I2
+
+APPLY PROGRAM_HTI PROGRAM_BELL
+APPLY CNOT PROGRAM_BELL
+MEASURE PROGRAM_BELL
+"""
+
+
+class MYQASMProgramCheck(unittest.TestCase):
+    def test_string(self):
+        program = MYQASMProgram(bell_program)
+        self.assertEqual(len(program), 5)
+        results = program.run()
+        self.assertEqual(len(results), 1)
+        self.assertIn(results[0], [[0, 0], [1, 1]])
+
+    def test_lines(self):
+        program = MYQASMProgram(
+            [
+                "INITIALIZE PROGRAM_LINES 2 [10]",
+                "MEASURE PROGRAM_LINES",
+                "APPLY CNOT PROGRAM_LINES",
+                "MEASURE PROGRAM_LINES",
+                "APPLY H PROGRAM_LINES 0",
+                "APPLY H PROGRAM_LINES 0",
+                "MEASURE PROGRAM_LINES",
+            ]
+        )
+        self.assertEqual(program.run(), [[1, 0], [1, 1], [1, 1]])
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bell.myqasm")
+            with open(path, "w") as file:
+                file.write(bell_program)
+            for program in [
+                MYQASMProgram.from_file(path),
+                MYQASMProgram(Path(path)),
+            ]:
+                self.assertEqual(len(program), 5)
+                self.assertIn(program.run()[0], [[0, 0], [1, 1]])
+
+    def test_run_many(self):
+        program = MYQASMProgram(bell_program)
+        results = program.run_many(20)
+        self.assertEqual(len(results), 20)
+        for result in results:
+            self.assertIn(result, [[[0, 0]], [[1, 1]]])
+        self.assertEqual(program.run_many(0), [])
+
+    def test_invalid_syntax(self):
+        with self.assertRaisesRegex(InvalidMYQASMSyntaxError, "Line 3"):
+            MYQASMProgram("INITIALIZE PROGRAM_INVALID 1\n\nAPPLY H\nMEASURE R")
+
+    def test_errors_when_run(self):
+        program = MYQASMProgram("APPLY H PROGRAM_UNDEFINED")
+        with self.assertRaises(MYQASMRegisterDoesNotExistError):
+            program.run()
+
+
+class MYQASMOptimiserCheck(unittest.TestCase):
+    def assert_same_result(self, source: str, expected_passes_saved: int, **kwargs):
+        session = MYQASMSession()
+        optimised_session = MYQASMSession()
+        program = MYQASMProgram(source)
+        optimised_program = MYQASMProgram(source)
+        self.assertEqual(optimised_program.optimise(**kwargs), expected_passes_saved)
+        program.run(session)
+        optimised_program.run(optimised_session)
+        self.assertEqual(session.get_registers(), optimised_session.get_registers())
+        return optimised_program
+
+    def test_fuse(self):
+        program = self.assert_same_result(
+            "INITIALIZE R 3 [011]\n"
+            "APPLY H R 0\n"
+            "APPLY R0.25 R 0\n"
+            "APPLY CNOT R 0 1\n"
+            "APPLY H R 1\n"
+            "APPLY R0.5 R 2",
+            4,
+        )
+        self.assertEqual(len(program), 2)
+
+    def test_cancel(self):
+        program = self.assert_same_result(
+            "INITIALIZE R 2 [01]\n"
+            "U CONCAT H R0.25\n"
+            "V INVERSE U\n"
+            "APPLY U R 1\n"
+            "APPLY V R 1\n"
+            "APPLY H R 0\n"
+            "APPLY H R 0\n"
+            "APPLY I4 R\n"
+            "APPLY I2 R 1\n"
+            "APPLY CNOT R 1 0\n"
+            "APPLY CNOT R 1 0",
+            8,
+        )
+        # Only INITIALIZE and the gate definitions are left.
+        self.assertEqual(len(program), 3)
+
+    def test_width(self):
+        source = (
+            "INITIALIZE R 4 [0101]\n"
+            "APPLY H R 0\n"
+            "APPLY CNOT R 0 1\n"
+            "APPLY CNOT R 1 2\n"
+            "APPLY CNOT R 2 3\n"
+            "APPLY R0.5 R 3"
+        )
+        self.assert_same_result(source, 2, max_fusion_width=2)
+        self.assert_same_result(source, 4, max_fusion_width=4)
+        self.assert_same_result(source, 0, max_fusion_width=1)
+
+    def test_barriers(self):
+        source = (
+            "INITIALIZE R 2 [01]\n"
+            "APPLY H R 0\n"
+            "MEASURE R 5\n"
+            "APPLY H R 0\n"
+            "SELECT S R 0 1\n"
+            "APPLY H R 1\n"
+            "APPLY H S\n"
+            "APPLY H R 1\n"
+            "APPLY UNKNOWN R 0\n"
+            "APPLY H R 0"
+        )
+        program = MYQASMProgram(source)
+        self.assertEqual(program.optimise(), 0)
+        self.assertEqual(len(program), len(MYQASMProgram(source)))
+
+    def test_measure_after_fusion(self):
+        session = MYQASMSession()
+        program = MYQASMProgram(
+            "INITIALIZE R 2\nAPPLY H R 0\nAPPLY CNOT R 0 1\nMEASURE R 50"
+        )
+        self.assertEqual(program.optimise(), 1)
+        (results,) = program.run(session)
+        self.assertEqual(set(results), {0, 3})
+
+    def test_whole_register_and_subregisters(self):
+        self.assert_same_result(
+            "INITIALIZE R 2\nHH TENSOR H H\nAPPLY HH R\nAPPLY CNOT R", 1
+        )
+        # The registers of other programs aren't known, so aren't optimised.
+        program = MYQASMProgram("APPLY H R 0\nAPPLY H R 0")
+        self.assertEqual(program.optimise(), 0)
+
+
+class StabilizerCheck(unittest.TestCase):
+    def test_lexing(self):
+        self.assertEqual(
+            MYQASM_lexer("INITIALIZE R 2 [01] STABILIZER"),
+            [
+                (TokenNameEnum.KEYWORD, KeywordEnum.INITIALIZE),
+                (TokenNameEnum.IDENTIFIER, "R"),
+                (TokenNameEnum.LITERAL, "2"),
+                (TokenNameEnum.SEPARATOR, "["),
+                (TokenNameEnum.LITERAL, "01"),
+                (TokenNameEnum.SEPARATOR, "]"),
+                (TokenNameEnum.KEYWORD, KeywordEnum.STABILIZER),
+            ],
+        )
+        self.assertEqual(
+            MYQASM_lexer("INITIALIZE R 300 STABILIZER")[-1],
+            (TokenNameEnum.KEYWORD, KeywordEnum.STABILIZER),
+        )
+        with self.assertRaises(InvalidMYQASMSyntaxError):
+            MYQASM_lexer("INITIALIZE R STABILIZER")
+        with self.assertRaises(InvalidMYQASMSyntaxError):
+            MYQASM_lexer("INITIALIZE R 2 [01] STABILIZER STABILIZER")
+
+    def test_clifford_decomposition(self):
+        self.assertEqual(clifford_decomposition(IdentityGate(4)), [])
+        self.assertEqual(clifford_decomposition(hadamard), [("H", [0])])
+        self.assertEqual(clifford_decomposition(cnot), [("CNOT", [0, 1])])
+        self.assertEqual(
+            clifford_decomposition(KroneckerGate([IdentityGate(2), hadamard])),
+            [("H", [1])],
+        )
+        self.assertEqual(
+            clifford_decomposition(ComplexMatrix([[1, 0], [0, ComplexNumber(0, 1)]])),
+            [("S", [0])],
+        )
+        t = ComplexMatrix([[1, 0], [0, ComplexNumber.new_from_polar(1, math.pi / 4)]])
+        self.assertIsNone(clifford_decomposition(t))
+
+    def test_bell_state(self):
+        session = MYQASMSession(seed=1)
+        session.MYQASM("INITIALIZE STABILIZER_BELL 2 STABILIZER")
+        session.MYQASM("APPLY H STABILIZER_BELL 0")
+        session.MYQASM("APPLY CNOT STABILIZER_BELL")
+        counts = session.sample_counts("STABILIZER_BELL", 200)
+        self.assertEqual(set(counts), {"00", "11"})
+        self.assertGreater(counts["00"], 50)
+        self.assertGreater(counts["11"], 50)
+
+    def test_deterministic(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE STABILIZER_X 3 [100] STABILIZER")
+        # H R1 H is X, and R0.5 R0.5 is R1 (Z).
+        for expression in [
+            "APPLY H STABILIZER_X 2",
+            "APPLY R1 STABILIZER_X 2",
+            "APPLY R0.5 STABILIZER_X 1",
+            "APPLY R0.5 STABILIZER_X 1",
+            "APPLY H STABILIZER_X 2",
+            "APPLY CNOT STABILIZER_X 2 0",
+        ]:
+            session.MYQASM(expression)
+        self.assertEqual(session.MYQASM("MEASURE STABILIZER_X"), [0, 0, 1])
+        session.MYQASM("SELECT STABILIZER_X_1 STABILIZER_X 1 2")
+        self.assertEqual(session.MYQASM("MEASURE STABILIZER_X_1"), [0, 1])
+        self.assertEqual(session.sample("STABILIZER_X_1", 3).tolist(), [1, 1, 1])
+
+    def test_matches_state_vector(self):
+        rng = random.Random(5)
+        gates = ["H", "R1", "R0.5", "CNOT"]
+        for _ in range(20):
+            dense = MYQASMSession()
+            stabilizer = MYQASMSession(seed=2)
+            dense.MYQASM("INITIALIZE R 4")
+            stabilizer.MYQASM("INITIALIZE R 4 STABILIZER")
+            for _ in range(15):
+                gate = rng.choice(gates)
+                qubits = rng.sample(range(4), 2 if gate == "CNOT" else 1)
+                expression = f"APPLY {gate} R {' '.join(map(str, qubits))}"
+                dense.MYQASM(expression)
+                stabilizer.MYQASM(expression)
+            state = dense.get_registers()["R"].to_complex_list()
+            possible = {i for i, c in enumerate(state) if abs(c) > 1e-8}
+            self.assertLessEqual(set(stabilizer.sample("R", 100)), possible)
+            self.assertEqual(set(stabilizer.sample("R", 500)), possible)
+
+    def test_large_register(self):
+        session = MYQASMSession(seed=3)
+        session.MYQASM("INITIALIZE STABILIZER_GHZ 200 STABILIZER")
+        session.MYQASM("APPLY H STABILIZER_GHZ 0")
+        for q in range(199):
+            session.MYQASM(f"APPLY CNOT STABILIZER_GHZ {q} {q + 1}")
+        results = session.sample_counts("STABILIZER_GHZ", 20)
+        self.assertLessEqual(set(results), {"0" * 200, "1" * 200})
+        self.assertEqual(len(results), 2)
+
+    def test_errors(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE STABILIZER_ERRORS 2 STABILIZER")
+        session.MYQASM("T CONCAT R0.5 R0.5")
+        session.MYQASM("APPLY T STABILIZER_ERRORS 0")
+        with self.assertRaises(MYQASMUnsupportedGateError):
+            session.MYQASM("APPLY R0.25 STABILIZER_ERRORS 0")
+        with self.assertRaises(MYQASMGateAndRegisterDifferentSizeGatesError):
+            session.MYQASM("APPLY H STABILIZER_ERRORS")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            session.MYQASM("APPLY H STABILIZER_ERRORS 2")
+        session.MYQASM("SELECT STABILIZER_ERRORS_1 STABILIZER_ERRORS 1 1")
+        session.MYQASM("INITIALIZE STABILIZER_ERRORS 1 STABILIZER")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            session.MYQASM("APPLY H STABILIZER_ERRORS_1")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            session.MYQASM("MEASURE STABILIZER_ERRORS_1")
+
+    def test_copy(self):
+        register = StabilizerRegister(2, "10")
+        copy = register.copy()
+        register.apply_gate(hadamard, [0])
+        self.assertEqual(copy.sample([0, 1], 5, random.Random(0)), [2] * 5)
+
+    def test_queries_only_read_the_tableau(self):
+        class ReadOnlyList(list):
+            def append(self, item):
+                raise AssertionError("The tableau was changed.")
+
+            pop = __setitem__ = append
+
+        register = StabilizerRegister(3, "001")
+        register.apply_gate(hadamard, [0])
+        register.apply_gate(cnot, [0, 1])
+        for part in ["_x", "_z", "_r"]:
+            setattr(register, part, ReadOnlyList(getattr(register, part)))
+        self.assertEqual(
+            register.expectation_values(["ZZI", "XXI", "IIZ", "XII"], range(3)),
+            [1.0, 1.0, -1.0, 0.0],
+        )
+        self.assertAlmostEqual(register.probability([0, 1, 2], 0b111), 0.5)
+        self.assertEqual(set(register.sample([2, 1, 0], 20, random.Random(1))), {4, 7})
+
+    def test_program(self):
+        self.assertTrue(
+            is_clifford_program(
+                [
+                    MYQASM_lexer(expression)
+                    for expression in ["HH TENSOR H H", "APPLY HH R", "APPLY CNOT R"]
+                ]
+            )
+        )
+        self.assertFalse(is_clifford_program([MYQASM_lexer("APPLY R0.25 R")]))
+        self.assertFalse(is_clifford_program([MYQASM_lexer("APPLY UNKNOWN R")]))
+
+        ghz = "INITIALIZE R 100\nAPPLY H R 0\n" + "".join(
+            f"APPLY CNOT R {q} {q + 1}\n" for q in range(99)
+        )
+        session = MYQASMSession(seed=4)
+        program = MYQASMProgram(ghz + "MEASURE R 10")
+        (results,) = program.run(session)
+        self.assertIsInstance(session.get_registers()["R"], StabilizerRegister)
+        self.assertLessEqual(set(results), {0, 2**100 - 1})
+
+        # Small programs keep using state vectors, unless asked.
+        session = MYQASMSession()
+        MYQASMProgram("INITIALIZE R 2\nAPPLY H R 0").run(session)
+        self.assertIsInstance(session.get_registers()["R"], ComplexVector)
+        MYQASMProgram("INITIALIZE R 2\nAPPLY H R 0", stabilizer=True).run(session)
+        self.assertIsInstance(session.get_registers()["R"], StabilizerRegister)
+        program = MYQASMProgram("INITIALIZE R 2 STABILIZER\nAPPLY H R 0\nAPPLY H R 0")
+        self.assertEqual(program.optimise(), 0)
+
+
+class MPSCheck(unittest.TestCase):
+    def assert_states_close(self, v1: ComplexVector, v2: ComplexVector):
+        for c1, c2 in zip(v1.to_complex_list(), v2.to_complex_list()):
+            self.assertAlmostEqual(c1, c2)
+
+    def test_lexing(self):
+        self.assertEqual(
+            MYQASM_lexer("INITIALIZE R 100 MPS")[-1],
+            (TokenNameEnum.KEYWORD, KeywordEnum.MPS),
+        )
+
+    def test_queries_only_read_shared_registers(self):
+        class ReadOnlyList(list):
+            def __setitem__(self, index, value):
+                raise AssertionError("The sites were changed.")
+
+        session = MYQASMSession(seed=2)
+        session.MYQASM("INITIALIZE R 4 MPS")
+        session.MYQASM("APPLY H R 0")
+        for qubit in range(3):
+            session.MYQASM(f"APPLY CNOT R {qubit} {qubit + 1}")
+        register = session.get_registers()["R"]
+        register._sites = ReadOnlyList(register._sites)
+        center, sites = register._center, list(register._sites)
+        copied = MYQASMSession.from_snapshot(session.snapshot(), seed=3)
+        self.assertTrue(set(copied.MYQASM("MEASURE R 5")) <= {0, 15})
+        self.assertAlmostEqual(copied.probability("R", "1111"), 0.5)
+        self.assertAlmostEqual(copied.expectation_values("R", ["ZZII"])[0], 1)
+        self.assertIs(copied.get_registers()["R"], register)
+        self.assertEqual(register._center, center)
+        self.assertEqual(
+            [id(site) for site in register._sites], [id(site) for site in sites]
+        )
+
+    def test_matches_state_vector(self):
+        rng = random.Random(6)
+        gates = ["H", "R0.25", "R0.7", "CNOT", "HCNOT", "MIXED"]
+        for _ in range(10):
+            dense = MYQASMSession()
+            mps = MYQASMSession()
+            for session, register_type in [(dense, ""), (mps, " MPS")]:
+                session.MYQASM(f"INITIALIZE R 5 [10010]{register_type}")
+                session.MYQASM("HCNOT TENSOR H CNOT")
+                session.MYQASM("CNOTH TENSOR CNOT H")
+                session.MYQASM("MIXED CONCAT HCNOT CNOTH")
+                session.MYQASM("SELECT S R 1 4")
+            for _ in range(15):
+                gate = rng.choice(gates)
+                k = {"CNOT": 2, "HCNOT": 3, "MIXED": 3}.get(gate, 1)
+                indices = " ".join(map(str, rng.sample(range(4), k)))
+                for session in [dense, mps]:
+                    session.MYQASM(f"APPLY {gate} S {indices}")
+            register = mps.get_registers()["R"]
+            self.assertIsInstance(register, MPSRegister)
+            self.assertAlmostEqual(register.get_truncation_error(), 0)
+            self.assert_states_close(
+                register.to_state_vector(), dense.get_registers()["R"]
+            )
+
+    def test_truncation(self):
+        session = MYQASMSession(max_bond_dimension=1)
+        session.MYQASM("INITIALIZE MPS_GHZ 3 MPS")
+        session.MYQASM("APPLY H MPS_GHZ 0")
+        session.MYQASM("APPLY CNOT MPS_GHZ 0 1")
+        session.MYQASM("APPLY CNOT MPS_GHZ 1 2")
+        register = session.get_registers()["MPS_GHZ"]
+        self.assertEqual(register.get_bond_dimensions(), [1, 1])
+        self.assertAlmostEqual(register.get_truncation_error(), 0.5)
+        self.assertAlmostEqual(register.to_state_vector().norm(), 1)
+        with self.assertRaises(ValueError):
+            MPSRegister(2, max_bond_dimension=0)
+
+    def test_large_register(self):
+        session = MYQASMSession(seed=7)
+        session.MYQASM("INITIALIZE MPS_LARGE 100 MPS")
+        for q in range(0, 100, 2):
+            session.MYQASM(f"APPLY H MPS_LARGE {q}")
+            session.MYQASM(f"APPLY CNOT MPS_LARGE {q} {q + 1}")
+        register = session.get_registers()["MPS_LARGE"]
+        self.assertEqual(max(register.get_bond_dimensions()), 2)
+        session.MYQASM("SELECT MPS_LARGE_PAIR MPS_LARGE 50 2")
+        counts = session.sample_counts("MPS_LARGE_PAIR", 200)
+        self.assertEqual(set(counts), {"00", "11"})
+        for result in session.sample("MPS_LARGE", 5):
+            bits = format(result, "0100b")
+            self.assertEqual(bits[::2], bits[1::2])
+
+    def test_measure(self):
+        session = MYQASMSession(seed=8)
+        session.MYQASM("INITIALIZE MPS_MEASURE 4 [0100] MPS")
+        session.MYQASM("APPLY CNOT MPS_MEASURE 1 3")
+        self.assertEqual(session.MYQASM("MEASURE MPS_MEASURE"), [0, 1, 0, 1])
+        self.assertEqual(session.MYQASM("MEASURE MPS_MEASURE 2"), [5, 5])
+
+    def test_errors(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE MPS_ERRORS 2 MPS")
+        with self.assertRaises(MYQASMGateAndRegisterDifferentSizeGatesError):
+            session.MYQASM("APPLY H MPS_ERRORS")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            session.MYQASM("APPLY CNOT MPS_ERRORS 0 0")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            session.MYQASM("APPLY H MPS_ERRORS 2")
+
+
+class DensityMatrixCheck(unittest.TestCase):
+    def assert_matrices_close(self, m: ComplexMatrix, expected: list[list[complex]]):
+        for row, expected_row in zip(m.to_complex_list(), expected):
+            for c1, c2 in zip(row, expected_row):
+                self.assertAlmostEqual(c1, c2)
+
+    def test_lexing(self):
+        self.assertEqual(
+            MYQASM_lexer("NOISE DEPHASING R 0.25 0 2"),
+            [
+                (TokenNameEnum.KEYWORD, KeywordEnum.NOISE),
+                (TokenNameEnum.KEYWORD, KeywordEnum.DEPHASING),
+                (TokenNameEnum.IDENTIFIER, "R"),
+                (TokenNameEnum.LITERAL, "0.25"),
+                (TokenNameEnum.LITERAL, "0"),
+                (TokenNameEnum.LITERAL, "2"),
+            ],
+        )
+        self.assertEqual(
+            MYQASM_lexer("INITIALIZE R 2 DENSITY")[-1],
+            (TokenNameEnum.KEYWORD, KeywordEnum.DENSITY),
+        )
+        for expression in [
+            "NOISE DEPHASING R",
+            "NOISE BITFLIP R 0.1",
+            "NOISE DEPHASING R 2",
+            "NOISE DEPHASING R half",
+            "NOISE DEPHASING R 0.1 a",
+        ]:
+            with self.assertRaises(InvalidMYQASMSyntaxError):
+                MYQASM_lexer(expression)
+
+    def test_matches_state_vector(self):
+        dense = MYQASMSession()
+        density = MYQASMSession()
+        for session, register_type in [(dense, ""), (density, " DENSITY")]:
+            session.MYQASM(f"INITIALIZE R 3 [010]{register_type}")
+            session.MYQASM("HCNOT TENSOR H CNOT")
+            for expression in [
+                "APPLY H R 1",
+                "APPLY R0.25 R 1",
+                "APPLY CNOT R 1 2",
+                "APPLY HCNOT R 2 0 1",
+            ]:
+                session.MYQASM(expression)
+        v = dense.get_registers()["R"].to_complex_list()
+        self.assert_matrices_close(
+            density.get_registers()["R"].get_density_matrix(),
+            [[a * b.conjugate() for b in v] for a in v],
+        )
+
+    def test_channels(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE DENSITY_R 2 [01] DENSITY")
+        session.MYQASM("APPLY H DENSITY_R 0")
+        session.MYQASM("NOISE AMPLITUDE_DAMPING DENSITY_R 0.36 1")
+        register = session.get_registers()["DENSITY_R"]
+        self.assertIsInstance(register, DensityMatrixRegister)
+        # |01> decays to |00> with probability 0.36.
+        self.assert_matrices_close(
+            register.get_density_matrix(),
+            [
+                [0.18, 0, 0.18, 0],
+                [0, 0.32, 0, 0.32],
+                [0.18, 0, 0.18, 0],
+                [0, 0.32, 0, 0.32],
+            ],
+        )
+        # Dephasing with probability 1/2 removes the coherences between |0> and |1>.
+        session.MYQASM("NOISE DEPHASING DENSITY_R 0.5 0")
+        self.assert_matrices_close(
+            register.get_density_matrix(),
+            [[0.18, 0, 0, 0], [0, 0.32, 0, 0], [0, 0, 0.18, 0], [0, 0, 0, 0.32]],
+        )
+        session.MYQASM("NOISE DEPOLARIZING DENSITY_R 1")
+        self.assert_matrices_close(
+            register.get_density_matrix(),
+            [[0.25 if i == j else 0 for j in range(4)] for i in range(4)],
+        )
+
+    def test_depolarizing_bell_state(self):
+        register = DensityMatrixRegister(2)
+        register.apply_gate(hadamard, [0])
+        register.apply_gate(cnot, [0, 1])
+        register.apply_channel(depolarizing_channel(0.4), [1])
+        self.assert_matrices_close(
+            register.get_density_matrix(),
+            [
+                [0.4, 0, 0, 0.3],
+                [0, 0.1, 0, 0],
+                [0, 0, 0.1, 0],
+                [0.3, 0, 0, 0.4],
+            ],
+        )
+        with self.assertRaises(ValueError):
+            depolarizing_channel(1.5)
+
+    def test_measure(self):
+        session = MYQASMSession(seed=9)
+        session.MYQASM("INITIALIZE DENSITY_M 3 [100] DENSITY")
+        session.MYQASM("NOISE AMPLITUDE_DAMPING DENSITY_M 1")
+        self.assertEqual(session.MYQASM("MEASURE DENSITY_M"), [0, 0, 0])
+        session.MYQASM("APPLY H DENSITY_M 2")
+        session.MYQASM("SELECT DENSITY_M_2 DENSITY_M 2 1")
+        counts = session.sample_counts("DENSITY_M_2", 200)
+        self.assertEqual(set(counts), {"0", "1"})
+        session.MYQASM("NOISE DEPHASING DENSITY_M_2 0.5")
+
+    def test_errors(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE DENSITY_ERRORS 2 DENSITY")
+        session.MYQASM("INITIALIZE DENSITY_ERRORS_PURE 2")
+        with self.assertRaises(MYQASMRegisterTypeError):
+            session.MYQASM("NOISE DEPHASING DENSITY_ERRORS_PURE 0.5")
+        with self.assertRaises(MYQASMRegisterDoesNotExistError):
+            session.MYQASM("NOISE DEPHASING DENSITY_ERRORS_UNDEFINED 0.5")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            session.MYQASM("NOISE DEPHASING DENSITY_ERRORS 0.5 2")
+        with self.assertRaises(MYQASMGateAndRegisterDifferentSizeGatesError):
+            session.MYQASM("APPLY H DENSITY_ERRORS")
+        session.MYQASM("SELECT DENSITY_ERRORS_1 DENSITY_ERRORS 1 1")
+        session.MYQASM("INITIALIZE DENSITY_ERRORS 1 DENSITY")
+        with self.assertRaises(MYQASMInvalidQubitsError):
+            session.MYQASM("NOISE DEPHASING DENSITY_ERRORS_1 0.5")
+
+
+class PartialMeasurementCheck(unittest.TestCase):
+    register_types = ["", " STABILIZER", " MPS", " DENSITY", " MAPPED", " SHARED"]
+
+    def test_lexing(self):
+        self.assertEqual(
+            MYQASM_lexer("MEASURE R [0,2,5]"),
+            [
+                (TokenNameEnum.KEYWORD, KeywordEnum.MEASURE),
+                (TokenNameEnum.IDENTIFIER, "R"),
+                (TokenNameEnum.SEPARATOR, "["),
+                (TokenNameEnum.LITERAL, "0"),
+                (TokenNameEnum.LITERAL, "2"),
+                (TokenNameEnum.LITERAL, "5"),
+                (TokenNameEnum.SEPARATOR, "]"),
+            ],
+        )
+        for expression in ["MEASURE R [0,2", "MEASURE R []", "MEASURE R [0,,1]"]:
+            with self.assertRaises(InvalidMYQASMSyntaxError):
+                MYQASM_lexer(expression)
+
+    def test_collapse(self):
+        for register_type in self.register_types:
+            outcomes = set()
+            for seed in range(10):
+                session = MYQASMSession(seed=seed)
+                session.MYQASM(f"INITIALIZE R 3{register_type}")
+                session.MYQASM("APPLY H R 0")
+                session.MYQASM("APPLY CNOT R 0 2")
+                session.MYQASM("APPLY H R 1")
+                (bit,) = session.MYQASM("MEASURE R [2]")
+                outcomes.add(bit)
+                # Qubit 0 now always agrees with qubit 2, and qubit 1 is still random.
+                for result in session.MYQASM("MEASURE R 20"):
+                    self.assertEqual(result & 0b101, 0b101 * bit)
+                self.assertEqual(session.MYQASM("MEASURE R [2,0]"), [bit, bit])
+                self.assertEqual(session.MYQASM("MEASURE R [0]"), [bit])
+            self.assertEqual(outcomes, {0, 1}, register_type)
+
+    def test_dense_state(self):
+        session = MYQASMSession(seed=1)
+        session.MYQASM("INITIALIZE PARTIAL_R 2")
+        session.MYQASM("APPLY H PARTIAL_R 0")
+        session.MYQASM("APPLY H PARTIAL_R 1")
+        session.MYQASM("SELECT PARTIAL_S PARTIAL_R 1 1")
+        (bit,) = session.MYQASM("MEASURE PARTIAL_S [0]")
+        expected = [0.5**0.5 if i & 1 == bit else 0 for i in range(4)]
+        state = session.get_registers()["PARTIAL_R"].to_complex_list()
+        for c, e in zip(state, expected):
+            self.assertAlmostEqual(c, e)
+
+    def test_errors(self):
+        for register_type in self.register_types:
+            session = MYQASMSession()
+            session.MYQASM(f"INITIALIZE R 2{register_type}")
+            with self.assertRaises(MYQASMInvalidQubitsError):
+                session.MYQASM("MEASURE R [0,0]")
+            with self.assertRaises(MYQASMInvalidQubitsError):
+                session.MYQASM("MEASURE R [2]")
+            with self.assertRaises(MYQASMRegisterDoesNotExistError):
+                session.MYQASM("MEASURE S [0]")
+            session.MYQASM("SELECT S R 1 1")
+            session.MYQASM(f"INITIALIZE R 1{register_type}")
+            with self.assertRaises(MYQASMInvalidQubitsError):
+                session.MYQASM("MEASURE S [0]")
+
+
+class QueryCheck(unittest.TestCase):
+    register_types = ["", " STABILIZER", " MPS", " DENSITY", " MAPPED", " SHARED"]
+
+    def test_lexing(self):
+        self.assertEqual(
+            MYQASM_lexer("EXPECT R ZZI XIY"),
+            [
+                (TokenNameEnum.KEYWORD, KeywordEnum.EXPECT),
+                (TokenNameEnum.IDENTIFIER, "R"),
+                (TokenNameEnum.LITERAL, "ZZI"),
+                (TokenNameEnum.LITERAL, "XIY"),
+            ],
+        )
+        self.assertEqual(
+            MYQASM_lexer("PROB R 0110"),
+            [
+                (TokenNameEnum.KEYWORD, KeywordEnum.PROB),
+                (TokenNameEnum.IDENTIFIER, "R"),
+                (TokenNameEnum.LITERAL, "0110"),
+            ],
+        )
+        for expression in [
+            "EXPECT R",
+            "EXPECT R ZA",
+            "PROB R",
+            "PROB R 012",
+            "PROB R 01 10",
+        ]:
+            with self.assertRaises(InvalidMYQASMSyntaxError):
+                MYQASM_lexer(expression)
+
+    def test_bell_state(self):
+        for register_type in self.register_types:
+            session = MYQASMSession()
+            session.MYQASM(f"INITIALIZE R 2{register_type}")
+            session.MYQASM("APPLY H R 0")
+            session.MYQASM("APPLY CNOT R")
+            values = session.MYQASM("EXPECT R ZZ XX YY ZI IX XY")
+            for value, expected in zip(values, [1, 1, -1, 0, 0, 0]):
+                self.assertAlmostEqual(value, expected, msg=register_type)
+            self.assertAlmostEqual(session.MYQASM("PROB R 00"), 0.5)
+            self.assertAlmostEqual(session.MYQASM("PROB R 01"), 0)
+            self.assertAlmostEqual(session.probability("R", "11"), 0.5)
+            # The register hasn't changed.
+            self.assertAlmostEqual(session.expectation_values("R", ["ZZ"])[0], 1)
+
+    def test_subregisters(self):
+        for register_type in self.register_types:
+            session = MYQASMSession()
+            session.MYQASM(f"INITIALIZE R 3 [001]{register_type}")
+            session.MYQASM("APPLY H R 0")
+            session.MYQASM("SELECT S R 1 2")
+            values = session.expectation_values("S", ["ZZ", "IZ", "ZI"])
+            for value, expected in zip(values, [-1, -1, 1]):
+                self.assertAlmostEqual(value, expected, msg=register_type)
+            self.assertAlmostEqual(session.probability("S", "01"), 1)
+            self.assertAlmostEqual(session.expectation_values("R", ["XII"])[0], 1)
+            self.assertAlmostEqual(session.probability("R", "101"), 0.5)
+
+    def test_matches_state_vector(self):
+        program = [
+            "APPLY H R 0",
+            "APPLY H R 1",
+            "APPLY R0.25 R 1",
+            "APPLY CNOT R 0 2",
+            "APPLY R0.75 R 2",
+            "APPLY H R 1",
+        ]
+        pauli_strings = ["ZZZ", "XIY", "YXZ", "IZX"]
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 3")
+        for expression in program:
+            session.MYQASM(expression)
+        expected = session.MYQASM("EXPECT R " + " ".join(pauli_strings))
+        expected_probability = session.MYQASM("PROB R 011")
+        for register_type in [" MPS", " DENSITY"]:
+            session.MYQASM(f"INITIALIZE Q 3{register_type}")
+            for expression in program:
+                session.MYQASM(expression.replace(" R ", " Q "))
+            values = session.expectation_values("Q", pauli_strings)
+            for value, e in zip(values, expected):
+                self.assertAlmostEqual(value, e, msg=register_type)
+            self.assertAlmostEqual(
+                session.probability("Q", "011"), expected_probability
+            )
+
+    def test_noise(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 1 [1] DENSITY")
+        session.MYQASM("NOISE AMPLITUDE_DAMPING R 0.25")
+        self.assertAlmostEqual(session.MYQASM("EXPECT R Z")[0], -0.5)
+        self.assertAlmostEqual(session.MYQASM("PROB R 0"), 0.25)
+
+    def test_errors(self):
+        for register_type in self.register_types:
+            session = MYQASMSession()
+            session.MYQASM(f"INITIALIZE R 2{register_type}")
+            with self.assertRaises(MYQASMInvalidQubitsError):
+                session.MYQASM("EXPECT R ZZZ")
+            with self.assertRaises(MYQASMInvalidQubitsError):
+                session.MYQASM("PROB R 0")
+            with self.assertRaises(MYQASMRegisterDoesNotExistError):
+                session.MYQASM("EXPECT S Z")
+            with self.assertRaises(ValueError):
+                session.expectation_values("R", ["ZA"])
+            with self.assertRaises(ValueError):
+                session.probability("R", "02")
+            session.MYQASM("SELECT S R 1 1")
+            session.MYQASM(f"INITIALIZE R 1{register_type}")
+            with self.assertRaises(MYQASMInvalidQubitsError):
+                session.MYQASM("PROB S 0")
+
+
+class ForkCheck(unittest.TestCase):
+    register_types = ["", " STABILIZER", " MPS", " DENSITY", " MAPPED", " SHARED"]
+
+    def test_lexing(self):
+        self.assertEqual(
+            MYQASM_lexer("FORK R R2"),
+            [
+                (TokenNameEnum.KEYWORD, KeywordEnum.FORK),
+                (TokenNameEnum.IDENTIFIER, "R"),
+                (TokenNameEnum.IDENTIFIER, "R2"),
+            ],
+        )
+        for expression in ["FORK R", "FORK R F G", "FORK R R$"]:
+            with self.assertRaises(InvalidMYQASMSyntaxError):
+                MYQASM_lexer(expression)
+
+    def test_fork(self):
+        for register_type in self.register_types:
+            session = MYQASMSession()
+            session.MYQASM(f"INITIALIZE R 2{register_type}")
+            session.MYQASM("APPLY H R 0")
+            session.MYQASM("FORK R F")
+            # The state is only copied when one of them changes.
+            registers = session.get_registers()
+            self.assertIs(registers["R"], registers["F"])
+            session.MYQASM("APPLY CNOT F")
+            self.assertIsNot(registers["R"], registers["F"])
+            self.assertAlmostEqual(session.probability("R", "10"), 0.5)
+            self.assertAlmostEqual(session.probability("F", "11"), 0.5)
+            session.MYQASM("APPLY H R 0")
+            self.assertAlmostEqual(session.probability("R", "00"), 1)
+            self.assertAlmostEqual(session.probability("F", "11"), 0.5)
+
+    def test_fork_measure_and_noise(self):
+        session = MYQASMSession(seed=0)
+        session.MYQASM("INITIALIZE R 1 DENSITY")
+        session.MYQASM("APPLY H R")
+        session.MYQASM("FORK R F")
+        session.MYQASM("FORK R G")
+        session.MYQASM("MEASURE F [0]")
+        session.MYQASM("NOISE DEPHASING G 1")
+        self.assertAlmostEqual(session.expectation_values("R", ["X"])[0], 1)
+        self.assertAlmostEqual(session.expectation_values("F", ["X"])[0], 0)
+        self.assertAlmostEqual(session.expectation_values("G", ["X"])[0], -1)
+
+    def test_errors(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 2")
+        session.MYQASM("SELECT S R 0 1")
+        session.MYQASM("U INVERSE H")
+        with self.assertRaises(MYQASMRegisterDoesNotExistError):
+            session.MYQASM("FORK Q F")
+        with self.assertRaises(MYQASMRegisterTypeError):
+            session.MYQASM("FORK S F")
+        with self.assertRaises(MYQASMRedefineBuiltinGateError):
+            session.MYQASM("FORK R H")
+        with self.assertRaises(MYQASMRedefineUserGateError):
+            session.MYQASM("FORK R U")
+        # Forking onto a subregister's name replaces it.
+        session.MYQASM("FORK R S")
+        self.assertNotIn("S", session.get_subregisters())
+
+    def test_snapshot_and_restore(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 2")
+        session.MYQASM("APPLY H R 0")
+        session.MYQASM("SELECT S R 1 1")
+        snapshot = session.snapshot()
+        self.assertIsInstance(snapshot, MYQASMSnapshot)
+        session.MYQASM("APPLY CNOT R")
+        session.MYQASM("U INVERSE H")
+        session.MYQASM("INITIALIZE Q 1")
+        self.assertAlmostEqual(session.probability("R", "11"), 0.5)
+        for _ in range(2):
+            session.restore(snapshot)
+            self.assertAlmostEqual(session.probability("R", "10"), 0.5)
+            self.assertEqual(session.get_subregisters(), {"S": ("R", [1])})
+            self.assertEqual(set(session.get_registers()), {"R"})
+            self.assertEqual(session.get_user_defined_gates(), {})
+            session.MYQASM("APPLY H R 0")
+
+    def test_fork_session(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 2 MPS")
+        session.MYQASM("APPLY H R 0")
+        forked = session.fork()
+        forked.MYQASM("APPLY CNOT R")
+        self.assertAlmostEqual(session.probability("R", "11"), 0)
+        self.assertAlmostEqual(forked.probability("R", "11"), 0.5)
+        session.MYQASM("APPLY H R 1")
+        self.assertAlmostEqual(forked.probability("R", "01"), 0)
+        copied = MYQASMSession.from_snapshot(
+            pickle.loads(pickle.dumps(forked.snapshot()))
+        )
+        self.assertAlmostEqual(copied.probability("R", "11"), 0.5)
+
+    def test_optimised_fork(self):
+        program = MYQASMProgram(
+            "INITIALIZE R 2\nAPPLY H R 0\nFORK R F\nAPPLY H F 1\nAPPLY CNOT F"
+        )
+        program.optimise()
+        session = MYQASMSession()
+        program.run(session)
+        self.assertAlmostEqual(session.probability("R", "10"), 0.5)
+        self.assertAlmostEqual(session.expectation_values("F", ["ZZ"])[0], 0)
+        self.assertAlmostEqual(session.probability("F", "01"), 0.25)
+
+    def test_pickle_program(self):
+        program = MYQASMProgram("INITIALIZE R 2\nAPPLY H R 0\nAPPLY H R 1\nPROB R 11")
+        program.optimise()
+        copied = pickle.loads(pickle.dumps(program))
+        self.assertEqual(len(copied), len(program))
+        self.assertAlmostEqual(copied.run(MYQASMSession())[0], 0.25)
+
+    def test_run_variants(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 3")
+        session.MYQASM("APPLY H R 0")
+        session.MYQASM("APPLY CNOT R 0 1")
+        snapshot = session.snapshot()
+        programs = [
+            MYQASMProgram("PROB R 110"),
+            MYQASMProgram("APPLY CNOT R 1 2\nPROB R 111\nMEASURE R 5"),
+            MYQASMProgram("APPLY H R 0\nEXPECT R XXI"),
+        ]
+        results = run_variants(snapshot, programs, max_workers=2, seed=7)
+        self.assertEqual(len(results), 3)
+        self.assertAlmostEqual(results[0][0], 0.5)
+        self.assertAlmostEqual(results[1][0], 0.5)
+        self.assertEqual(
+            results[1][1],
+            programs[1].run(MYQASMSession.from_snapshot(snapshot, seed=8))[1],
+        )
+        self.assertAlmostEqual(results[2][0][0], 0)
+        # The snapshot is unchanged.
+        self.assertAlmostEqual(session.probability("R", "110"), 0.5)
+
+
+class MappedCheck(unittest.TestCase):
+    def assert_states_close(self, v1: ComplexVector, v2: ComplexVector):
+        for c1, c2 in zip(v1.to_complex_list(), v2.to_complex_list()):
+            self.assertAlmostEqual(c1, c2)
+
+    def test_lexing(self):
+        self.assertEqual(
+            MYQASM_lexer("INITIALIZE R 30 MAPPED")[-1],
+            (TokenNameEnum.KEYWORD, KeywordEnum.MAPPED),
+        )
+
+    def test_matches_state_vector(self):
+        rng = random.Random(8)
+        session = MYQASMSession()
+        session.MYQASM("G1 INVERSE H")
+        session.MYQASM("G2 INVERSE R0.25")
+        session.MYQASM("G3 INVERSE R0.7")
+        session.MYQASM("G4 INVERSE CNOT")
+        session.MYQASM("HCNOT TENSOR H CNOT")
+        session.MYQASM("G5 CONCAT HCNOT I8")
+        session.MYQASM("G6 TENSOR H H")
+        gates = session.get_user_defined_gates()
+        for _ in range(5):
+            session.MYQASM("INITIALIZE R 5")
+            # Blocks of 4 amplitudes, so most gates act on several blocks.
+            mapped = MappedRegister(5, block_qubits=2)
+            for _ in range(15):
+                gate_name = rng.choice(["G1", "G2", "G3", "G4", "G5", "G6"])
+                gate = gates[gate_name]
+                qubits = rng.sample(range(5), gate.get_height().bit_length() - 1)
+                session.MYQASM(f"APPLY {gate_name} R {' '.join(map(str, qubits))}")
+                mapped.apply_gate(gate, qubits)
+            dense = session.get_registers()["R"]
+            self.assert_states_close(mapped.to_state_vector(), dense)
+
+            pauli_strings = ["ZZIXY", "XIIIX", "IYZII"]
+            expected = pauli_expectation_values(dense, pauli_strings)
+            values = mapped.expectation_values(pauli_strings, range(5))
+            for value, e in zip(values, expected):
+                self.assertAlmostEqual(value, e)
+            self.assertAlmostEqual(
+                mapped.probability([4, 0], 0b10),
+                outcome_probability(dense, [4, 0], 0b10),
+            )
+
+    def test_measure(self):
+        for seed in range(5):
+            register = MappedRegister(4, block_qubits=1)
+            register.apply_gate(hadamard, [0])
+            register.apply_gate(cnot, [0, 3])
+            register.apply_gate(hadamard, [2])
+            rng = random.Random(seed)
+            samples = register.sample([3, 0], 20, rng)
+            self.assertTrue(set(samples) <= {0, 3})
+            outcome = register.measure([3, 2], rng)
+            bit = outcome >> 1
+            self.assertAlmostEqual(register.probability([0], bit), 1)
+            self.assertAlmostEqual(register.probability([2], outcome & 1), 1)
+            self.assertAlmostEqual(register.to_state_vector().norm(), 1)
+
+    def test_measure_more_qubits_than_a_block(self):
+        for seed in range(5):
+            register = MappedRegister(5, block_qubits=2)
+            register.apply_gate(hadamard, [0])
+            register.apply_gate(cnot, [0, 4])
+            register.apply_gate(hadamard, [2])
+            rng = random.Random(seed)
+            samples = register.sample([4, 2, 0], 20, rng)
+            self.assertTrue(set(samples) <= {0b000, 0b010, 0b101, 0b111})
+            self.assertEqual(
+                register.sample(range(5), 20, random.Random(seed)),
+                register.sample(range(5), 20, random.Random(seed)),
+            )
+            outcome = register.measure([4, 2, 1, 0], rng)
+            self.assertEqual(outcome >> 3, outcome & 1)
+            self.assertEqual((outcome >> 1) & 1, 0)
+            self.assertAlmostEqual(register.probability([4, 2, 1, 0], outcome), 1)
+            self.assertAlmostEqual(register.to_state_vector().norm(), 1)
+
+    def test_measure_streams_over_blocks(self):
+        n = 14
+        register = MappedRegister(n, block_qubits=7)
+        for qubit in range(n):
+            register.apply_gate(hadamard, [qubit])
+        tracemalloc.start()
+        try:
+            register.sample(range(n), 10, random.Random(1))
+            outcome = register.measure(range(n), random.Random(2))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        # Far less than the 2^n probabilities, even as packed doubles.
+        self.assertLess(peak, 8 * 2**n // 4)
+        self.assertAlmostEqual(register.probability(range(n), outcome), 1)
+
+    def test_copy_and_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            session = MYQASMSession(mapped_directory=directory)
+            session.MYQASM("INITIALIZE R 3 [001] MAPPED")
+            session.MYQASM("APPLY H R 0")
+            session.MYQASM("FORK R F")
+            session.MYQASM("APPLY CNOT F 0 1")
+            self.assertIsInstance(session.get_registers()["F"], MappedRegister)
+            self.assertAlmostEqual(session.probability("R", "101"), 0.5)
+            self.assertAlmostEqual(session.probability("R", "111"), 0)
+            self.assertAlmostEqual(session.probability("F", "111"), 0.5)
+
+    def test_optimised_program(self):
+        source = "INITIALIZE R 3 MAPPED\nAPPLY H R 0\nAPPLY CNOT R 0 2\nAPPLY H R 1"
+        program = MYQASMProgram(source)
+        self.assertEqual(program.optimise(), 2)
+        session = MYQASMSession()
+        program.run(session)
+        self.assertAlmostEqual(session.probability("R", "101"), 0.25)
+        self.assertAlmostEqual(session.expectation_values("R", ["ZIZ"])[0], 1)
+
+
+class SharedMemoryCheck(unittest.TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_worker_pools()
+
+    def assert_states_close(self, v1: ComplexVector, v2: ComplexVector):
+        for c1, c2 in zip(v1.to_complex_list(), v2.to_complex_list()):
+            self.assertAlmostEqual(c1, c2)
+
+    def test_lexing(self):
+        self.assertEqual(
+            MYQASM_lexer("INITIALIZE R 24 SHARED")[-1],
+            (TokenNameEnum.KEYWORD, KeywordEnum.SHARED),
+        )
+
+    # Split the work between the processes, however small the register.
+    @patch("myqasm.myqasm_shared_memory.SHARED_MIN_QUBITS", 0)
+    def test_matches_state_vector(self):
+        rng = random.Random(9)
+        session = MYQASMSession()
+        session.MYQASM("G1 INVERSE H")
+        session.MYQASM("G2 INVERSE R0.3")
+        session.MYQASM("G3 INVERSE CNOT")
+        session.MYQASM("HCNOT TENSOR H CNOT")
+        session.MYQASM("G4 CONCAT HCNOT I8")
+        gates = session.get_user_defined_gates()
+        session.MYQASM("INITIALIZE R 5")
+        shared = SharedMemoryRegister(5, workers=2, block_qubits=2)
+        self.assertEqual(shared.get_workers(), 2)
+        for _ in range(15):
+            gate_name = rng.choice(["G1", "G2", "G3", "G4"])
+            gate = gates[gate_name]
+            qubits = rng.sample(range(5), gate.get_height().bit_length() - 1)
+            session.MYQASM(f"APPLY {gate_name} R {' '.join(map(str, qubits))}")
+            shared.apply_gate(gate, qubits)
+        dense = session.get_registers()["R"]
+        self.assert_states_close(shared.to_state_vector(), dense)
+
+        pauli_strings = ["ZZIXY", "XIIIX"]
+        expected = pauli_expectation_values(dense, pauli_strings)
+        for value, e in zip(
+            shared.expectation_values(pauli_strings, range(5)), expected
+        ):
+            self.assertAlmostEqual(value, e)
+        self.assertAlmostEqual(
+            shared.probability([3, 1], 0b01), outcome_probability(dense, [3, 1], 0b01)
+        )
+        outcome = shared.measure([0, 4], random.Random(1))
+        self.assertAlmostEqual(shared.probability([0, 4], outcome), 1)
+        self.assertAlmostEqual(shared.to_state_vector().norm(), 1)
+
+    @patch("myqasm.myqasm_shared_memory.SHARED_MIN_QUBITS", 0)
+    def test_measure_sends_back_little(self):
+        shared = SharedMemoryRegister(6, workers=2, block_qubits=2)
+        for qubit in range(6):
+            shared.apply_gate(hadamard, [qubit])
+        run = shared._run
+        sent = []
+
+        def recording_run(kernel, units, *args):
+            parts = run(kernel, units, *args)
+            sent.extend(len(part) for part in parts if isinstance(part, list))
+            return parts
+
+        with patch.object(shared, "_run", recording_run):
+            self.assertEqual(len(shared.sample(range(6), 10, random.Random(3))), 10)
+            outcome = shared.measure([5, 4, 3, 2, 1], random.Random(4))
+        # Each process sends back at most one probability for each of its 8 blocks.
+        self.assertTrue(sent)
+        self.assertLessEqual(max(sent), 8)
+        self.assertAlmostEqual(shared.probability([5, 4, 3, 2, 1], outcome), 1)
+
+    def test_memory_is_freed(self):
+        shared = SharedMemoryRegister(3)
+        name = shared._memory.name
+        del shared
+        gc.collect()
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name)
+        with patch("sys.unraisablehook") as hook:
+            with patch("myqasm.myqasm_shared_memory.SharedMemory", side_effect=OSError):
+                with self.assertRaises(OSError):
+                    SharedMemoryRegister(3)
+            gc.collect()
+        hook.assert_not_called()
+
+    def test_session(self):
+        session = MYQASMSession(workers=2)
+        session.MYQASM("INITIALIZE R 3 [010] SHARED")
+        session.MYQASM("APPLY H R 0")
+        session.MYQASM("FORK R F")
+        session.MYQASM("APPLY CNOT F 0 2")
+        register = session.get_registers()["F"]
+        self.assertIsInstance(register, SharedMemoryRegister)
+        self.assertEqual(register.get_workers(), 2)
+        self.assertAlmostEqual(session.probability("R", "110"), 0.5)
+        self.assertAlmostEqual(session.probability("F", "111"), 0.5)
+        self.assertAlmostEqual(session.probability("R", "111"), 0)
+
+
+class SweepCheck(unittest.TestCase):
+    program = """INITIALIZE R 2 [{start}]
+APPLY H R 0
+APPLY R{theta} R 0
+APPLY H R 0
+PROB R 00
+EXPECT R ZI"""
+
+    def test_lexing(self):
+        self.assertEqual(
+            MYQASM_lexer("APPLY R{theta} R 0")[1],
+            (TokenNameEnum.IDENTIFIER, "R{theta}"),
+        )
+        self.assertEqual(
+            MYQASM_lexer("INITIALIZE R 2 [{start}]")[4],
+            (TokenNameEnum.LITERAL, "{start}"),
+        )
+        for expression in [
+            "APPLY R{} R",
+            "APPLY R{a-b} R",
+            "APPLY R{a R",
+            "APPLY H{a} R",
+            "INITIALIZE R 2 [{}]",
+            "INITIALIZE R 2 [{a b}]",
+        ]:
+            with self.assertRaises(InvalidMYQASMSyntaxError):
+                MYQASM_lexer(expression)
+
+    def test_session_parameters(self):
+        session = MYQASMSession()
+        session.set_parameters({"s": "01", "x": 0.5})
+        self.assertEqual(session.get_parameters(), {"s": "01", "x": 0.5})
+        session.MYQASM("INITIALIZE R 2 [{s}]")
+        self.assertAlmostEqual(session.probability("R", "01"), 1)
+        session.MYQASM("APPLY H R 1")
+        session.MYQASM("APPLY R{x} R 1")
+        self.assertAlmostEqual(session.expectation_values("R", ["IY"])[0], -1)
+        session.set_parameters({"x": "1"})
+        session.MYQASM("APPLY R{x} R 1")
+        self.assertAlmostEqual(session.expectation_values("R", ["IY"])[0], 1)
+
+    def test_parameter_errors(self):
+        session = MYQASMSession()
+        session.MYQASM("INITIALIZE R 2")
+        for parameters, expression in [
+            ({}, "APPLY R{x} R 0"),
+            ({"x": "half"}, "APPLY R{x} R 0"),
+            ({"x": None}, "APPLY R{x} R 0"),
+            ({"s": "0"}, "INITIALIZE Q 2 [{s}]"),
+            ({"s": "02"}, "INITIALIZE Q 2 [{s}]"),
+            ({"s": 1}, "INITIALIZE Q 1 [{s}]"),
+        ]:
+            session.set_parameters(parameters)
+            with self.assertRaises(MYQASMParameterError):
+                session.MYQASM(expression)
+
+    def test_sweep(self):
+        program = MYQASMProgram(self.program)
+        self.assertEqual(program.get_parameters(), ["start", "theta"])
+        table = [{"start": "00", "theta": x / 4} for x in range(5)]
+        table.append({"start": "10", "theta": 0})
+        for optimise in [False, True]:
+            if optimise:
+                program.optimise()
+            results = program.sweep(table)
+            self.assertEqual(len(results), len(table))
+            for (probability, (z,)), parameters in zip(results[:5], table):
+                theta = math.pi * parameters["theta"]
+                self.assertAlmostEqual(probability, math.cos(theta / 2) ** 2)
+                self.assertAlmostEqual(z, math.cos(theta))
+            self.assertAlmostEqual(results[5][0], 0)
+            self.assertAlmostEqual(results[5][1][0], -1)
+            # Running with parameters gives the same results as the sweep.
+            session = MYQASMSession()
+            run_results = program.run(session, table[1])
+            self.assertAlmostEqual(run_results[0], results[1][0])
+            self.assertEqual(session.get_parameters(), table[1])
+
+    def test_shared_prefix(self):
+        program = MYQASMProgram(
+            "INITIALIZE R 3\nAPPLY H R 0\nAPPLY H R 1\nMEASURE R [2]\n"
+            "APPLY R{a} R 1\nAPPLY H R 1\nMEASURE R 4"
+        )
+        for optimise in [False, True]:
+            if optimise:
+                program.optimise()
+            session = MYQASMSession()
+            session.MYQASM("U INVERSE H")
+            session.MYQASM("INITIALIZE Q 1")
+            table = [{"a": 0}, {"a": 1}, {"a": 0}]
+            results = program.sweep(table, session, seed=3)
+            # The MEASURE before the placeholder is only run once.
+            self.assertEqual(results[0][0], [0])
+            self.assertTrue(all(row[0] is results[0][0] for row in results))
+            self.assertTrue(all(outcome & 2 == 0 for outcome in results[0][1]))
+            self.assertTrue(all(outcome & 2 == 2 for outcome in results[1][1]))
+            self.assertEqual(results[0], program.sweep(table, seed=3)[0])
+            self.assertEqual(results, program.sweep(table, seed=3, max_workers=2))
+            # The sweep starts from a fork of the session, which isn't changed.
+            self.assertEqual(set(session.get_registers()), {"Q"})
+            self.assertEqual(session.get_parameters(), {})
+
+    def test_pickle_program(self):
+        program = MYQASMProgram(self.program)
+        program.optimise()
+        copied = pickle.loads(pickle.dumps(program))
+        self.assertEqual(copied.get_parameters(), ["start", "theta"])
+        self.assertAlmostEqual(
+            copied.run(MYQASMSession(), {"start": "00", "theta": 1})[0], 0
+        )
+
+
+class ProfilerCheck(unittest.TestCase):
+    def test_session(self):
+        profiles = []
+        profiler = MYQASMProfiler(profiles.append)
+        session = MYQASMSession()
+        session.set_profiler(profiler)
+        self.assertIs(session.get_profiler(), profiler)
+        session.MYQASM("INITIALIZE R 3")
+        session.MYQASM("U TENSOR H CNOT")
+        session.MYQASM("APPLY U R")
+        session.MYQASM("APPLY H R 1")
+        session.MYQASM("PROB R 000")
+        self.assertEqual(profiles, profiler.get_profiles())
+        self.assertEqual(
+            [p.keyword for p in profiles],
+            ["INITIALIZE", "TENSOR", "APPLY", "APPLY", "PROB"],
+        )
+        tensor, apply_u, apply_h = profiles[1:4]
+        self.assertIsInstance(apply_u, MYQASMInstructionProfile)
+        self.assertEqual(apply_u.expression, "APPLY U R")
+        self.assertIsNone(apply_u.line)
+        self.assertEqual(tensor.gate_dimension, 8)
+        self.assertEqual((apply_u.register_qubits, apply_u.gate_dimension), (3, 8))
+        self.assertEqual((apply_h.register_qubits, apply_h.gate_dimension), (3, 2))
+        self.assertIsNone(apply_h.allocated_bytes)
+        for profile in profiles:
+            self.assertGreater(profile.lex_seconds, 0)
+            self.assertGreaterEqual(profile.run_seconds, profile.gate_seconds)
+        # H is looked up when the expression is compiled.
+        clear_builtin_gate_cache()
+        session.MYQASM("APPLY H R 0")
+        session.MYQASM("APPLY H R 0")
+        self.assertEqual(
+            [(p.cache_hits, p.cache_misses) for p in profiles[-2:]], [(0, 1), (1, 0)]
+        )
+        session.set_profiler(None)
+        session.MYQASM("APPLY H R 0")
+        self.assertEqual(len(profiles), 7)
+
+    def test_program(self):
+        profiler = MYQASMProfiler(trace_memory=True)
+        session = MYQASMSession(seed=1)
+        session.set_profiler(profiler)
+        program = MYQASMProgram(
+            "INITIALIZE R 2\n\nAPPLY H R 0\nAPPLY CNOT R\nMEASURE R 10"
+        )
+        program.run(session)
+        self.assertEqual(
+            [(p.expression, p.line) for p in profiler.get_profiles()],
+            [
+                ("INITIALIZE R 2", 1),
+                ("APPLY H R 0", 3),
+                ("APPLY CNOT R", 4),
+                ("MEASURE R 10", 5),
+            ],
+        )
+        for profile in profiler.get_profiles():
+            self.assertEqual(profile.lex_seconds, 0)
+            self.assertIsNotNone(profile.allocated_bytes)
+        profiler.clear()
+        program.optimise()
+        program.run(session)
+        fused = profiler.get_profiles()[1]
+        self.assertEqual(fused.expression, "APPLY H R 0; APPLY CNOT R")
+        self.assertEqual((fused.line, fused.gate_dimension), (3, 4))
+
+    def test_report(self):
+        profiler = MYQASMProfiler()
+        session = MYQASMSession()
+        session.set_profiler(profiler)
+        program = MYQASMProgram("INITIALIZE R 2\nAPPLY H R 0\nAPPLY R{x} R 0")
+        program.sweep([{"x": 0.5}, {"x": 1}], session)
+        report = profiler.report()
+        self.assertEqual(report["instructions"], 4)
+        self.assertEqual(report["by_keyword"]["APPLY"]["count"], 3)
+        self.assertEqual(report["by_keyword"]["INITIALIZE"]["count"], 1)
+        self.assertEqual(
+            sorted((e["expression"], e["count"]) for e in report["by_expression"]),
+            [("APPLY H R 0", 1), ("APPLY R{x} R 0", 2), ("INITIALIZE R 2", 1)],
+        )
+        seconds = [e["total_seconds"] for e in report["by_expression"]]
+        self.assertEqual(seconds, sorted(seconds, reverse=True))
+        self.assertAlmostEqual(
+            report["total_seconds"],
+            sum(summary["total_seconds"] for summary in report["by_keyword"].values()),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "profile.json"
+            text = profiler.to_json(path, include_profiles=True)
+            self.assertEqual(json.loads(path.read_text()), json.loads(text))
+        self.assertEqual(len(json.loads(text)["profiles"]), 4)
+        self.assertNotIn("profiles", json.loads(profiler.to_json()))
+
+
 if __name__ == "__main__":
     unittest.main()  # pragma: no cover
@@ -0,0 +1,57 @@
+import math
+import random
+import unittest
+from unittest.mock import patch
+
+from context import GroverResult, grover_search, optimal_grover_iterations
+
+
+class GroverSearchCheck(unittest.TestCase):
+    def test_optimal_iterations(self):
+        self.assertEqual(optimal_grover_iterations(2, 1), 1)
+        self.assertEqual(optimal_grover_iterations(6, 1), 6)
+        self.assertEqual(
+            optimal_grover_iterations(10, 1), math.floor(math.pi / 4 * math.sqrt(1024))
+        )
+        self.assertEqual(optimal_grover_iterations(10, 4), 12)
+        self.assertEqual(optimal_grover_iterations(3, 8), 0)
+        for marked_count in [0, 9]:
+            with self.assertRaises(ValueError):
+                optimal_grover_iterations(3, marked_count)
+
+    def check_search(self):
+        result = grover_search(6, [42], rng=random.Random(0))
+        self.assertIsInstance(result, GroverResult)
+        self.assertEqual(result.found, 42)
+        self.assertEqual(result.marked, [42])
+        self.assertEqual(len(result.success_probabilities), 7)
+        self.assertAlmostEqual(result.success_probabilities[0], 1 / 64)
+        # The success probability after k iterations is sin^2((2k + 1) theta).
+        theta = math.asin(1 / 8)
+        for k, probability in enumerate(result.success_probabilities):
+            self.assertAlmostEqual(probability, math.sin((2 * k + 1) * theta) ** 2)
+        self.assertGreater(result.success_probabilities[-1], 0.99)
+        self.assertAlmostEqual(result.state.norm(), 1)
+
+        # Many marked items, given by a predicate.
+        result = grover_search(8, lambda i: i % 16 == 3, rng=random.Random(1))
+        self.assertEqual(result.marked, list(range(3, 256, 16)))
+        self.assertEqual(result.found % 16, 3)
+        self.assertGreater(result.success_probabilities[-1], 0.95)
+
+        result = grover_search(4, {1, 2}, iterations=0)
+        self.assertEqual(result.success_probabilities, [0.125])
+
+    def test_search(self):
+        self.check_search()
+        with patch("complex_numbers.complex_number_arrays.numpy", None):
+            self.check_search()
+
+    def test_errors(self):
+        for n, oracle in [(0, [0]), (3, []), (3, lambda i: False), (3, [8]), (3, [-1])]:
+            with self.assertRaises(ValueError):
+                grover_search(n, oracle)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -1,5 +1,6 @@
 import unittest
 
+from test_benchmarks import *
 from test_complex_matrices import *
 from test_complex_numbers import *
 from test_complex_vectors import *
@@ -7,6 +8,7 @@ from test_cryptography import *
 from test_information_theory import *
 from test_marble_game import *
 from test_myqasm import *
+from test_quantum_algorithms import *
 from test_quantum_systems import *
 from test_shared import *
 
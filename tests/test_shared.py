@@ -1,16 +1,33 @@
 import unittest
 
+import itertools
 import math
+import random
+from unittest.mock import patch
 
 from context import (
     ComplexMatrix,
     ComplexNumber,
     ComplexVector,
+    SparseComplexMatrix,
+    complex_matrix_apply_to_qubits,
     complex_matrix_eigenvalues,
     complex_matrix_eigenvectors,
     complex_matrix_vector_multiply,
     complex_vector_adjoint,
+    invert_about_mean,
+    marginal_probabilities,
     normalized_complex_matrix_eigenvectors,
+    outcome_probability,
+    pauli_expectation_values,
+    pauli_masks,
+    phase_flip,
+    probability_of_indices,
+    project_qubits,
+    qubit_count,
+    qubit_probabilities,
+    sample_outcomes,
+    tensor_product,
 )
 
 v2 = ComplexVector([ComplexNumber(2, 1), ComplexNumber(1, 1)])
@@ -38,6 +55,278 @@ class ComplexMatrixVectorMultiplicationCheck(unittest.TestCase):
             ComplexVector([ComplexNumber(-1, -1), ComplexNumber(2, 1)]),
         )
 
+    def test_not_square(self):
+        self.assertEqual(
+            complex_matrix_vector_multiply(
+                ComplexMatrix([[1, 2], [ComplexNumber(0, 1), 0], [0, 1]]), v2
+            ),
+            [ComplexNumber(4, 3), ComplexNumber(-1, 2), ComplexNumber(1, 1)],
+        )
+
+    def test_sparse(self):
+        self.assertEqual(
+            complex_matrix_vector_multiply(
+                SparseComplexMatrix.from_dense(rotation_90_2D), v2
+            ),
+            ComplexVector([ComplexNumber(-1, -1), ComplexNumber(2, 1)]),
+        )
+
+    def test_out(self):
+        out = ComplexVector([0, 0])
+        result = complex_matrix_vector_multiply(rotation_90_2D, v2, out=out)
+        self.assertIs(result, out)
+        self.assertEqual(out, [ComplexNumber(-1, -1), ComplexNumber(2, 1)])
+
+    def test_in_place(self):
+        v = ComplexVector([1, 0])
+        for _ in range(3):
+            complex_matrix_vector_multiply(rotation_90_2D, v, out=v)
+        self.assertEqual(v, [0, -1])
+        sparse_rotation = SparseComplexMatrix.from_dense(rotation_90_2D)
+        complex_matrix_vector_multiply(sparse_rotation, v, out=v)
+        self.assertEqual(v, [1, 0])
+
+    def test_wrong_sizes(self):
+        with self.assertRaises(ValueError):
+            complex_matrix_vector_multiply(m5x5, v2)
+        with self.assertRaises(ValueError):
+            complex_matrix_vector_multiply(i2, v2, out=ComplexVector([0]))
+
+
+class ComplexMatrixApplyToQubitsCheck(unittest.TestCase):
+    hadamard = ComplexMatrix([[1, 1], [1, -1]])
+    cnot = SparseComplexMatrix([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]])
+    state = [ComplexNumber(k, 8 - k) for k in range(8)]
+
+    def test_qubit_count(self):
+        self.assertEqual(qubit_count(ComplexVector([1])), 0)
+        self.assertEqual(qubit_count(ComplexVector([1] + [0] * 7)), 3)
+        with self.assertRaises(ValueError):
+            qubit_count(ComplexVector([1, 0, 0]))
+
+    def test_one_qubit_gate(self):
+        i2 = ComplexMatrix.identity(2)
+        for qubit, full_gate in enumerate(
+            [
+                tensor_product(tensor_product(self.hadamard, i2), i2),
+                tensor_product(tensor_product(i2, self.hadamard), i2),
+                tensor_product(tensor_product(i2, i2), self.hadamard),
+            ]
+        ):
+            v = ComplexVector(self.state)
+            complex_matrix_apply_to_qubits(self.hadamard, v, [qubit])
+            self.assertEqual(
+                v, complex_matrix_vector_multiply(full_gate, ComplexVector(self.state))
+            )
+
+    def test_two_qubit_gate(self):
+        # CNOT with control qubit 2 and target qubit 0 of |001>.
+        v = ComplexVector([0, 1, 0, 0, 0, 0, 0, 0])
+        complex_matrix_apply_to_qubits(self.cnot, v, [2, 0])
+        self.assertEqual(v, [0, 0, 0, 0, 0, 1, 0, 0])
+        v = ComplexVector(self.state)
+        complex_matrix_apply_to_qubits(self.cnot.to_dense(), v, [0, 1])
+        self.assertEqual(
+            v,
+            complex_matrix_vector_multiply(
+                tensor_product(self.cnot, ComplexMatrix.identity(2)),
+                ComplexVector(self.state),
+            ),
+        )
+
+    def test_invalid(self):
+        v = ComplexVector(self.state)
+        with self.assertRaises(ValueError):
+            complex_matrix_apply_to_qubits(self.hadamard, v, [3])
+        with self.assertRaises(ValueError):
+            complex_matrix_apply_to_qubits(self.cnot, v, [1, 1])
+        with self.assertRaises(ValueError):
+            complex_matrix_apply_to_qubits(self.cnot, v, [1])
+
+
+class QubitSamplingCheck(unittest.TestCase):
+    # Probabilities 1/10, 0, 2/10, 0, 3/10, 0, 4/10, 0 (unnormalized).
+    state = ComplexVector([1, 0, ComplexNumber(1, 1), 0, math.sqrt(3), 0, 2j, 0])
+
+    def assert_all_close(self, probabilities, expected):
+        self.assertEqual(len(probabilities), len(expected))
+        for p, q in zip(probabilities, expected):
+            self.assertAlmostEqual(p, q)
+
+    def test_probabilities(self):
+        self.assert_all_close(
+            qubit_probabilities(self.state), [0.1, 0, 0.2, 0, 0.3, 0, 0.4, 0]
+        )
+        self.assert_all_close(qubit_probabilities(self.state, [2]), [1, 0])
+        self.assert_all_close(qubit_probabilities(self.state, [0]), [0.3, 0.7])
+        self.assert_all_close(
+            qubit_probabilities(self.state, [1, 0]), [0.1, 0.3, 0.2, 0.4]
+        )
+        with self.assertRaises(ValueError):
+            qubit_probabilities(self.state, [3])
+
+    def test_marginal_probabilities(self):
+        probabilities = [0.1, 0, 0.2, 0, 0.3, 0, 0.4, 0]
+        self.assert_all_close(
+            marginal_probabilities(probabilities, [1, 0]), [0.1, 0.3, 0.2, 0.4]
+        )
+        with patch("complex_numbers.complex_number_arrays.numpy", None):
+            self.assert_all_close(marginal_probabilities(probabilities, [2]), [1, 0])
+        with self.assertRaises(ValueError):
+            marginal_probabilities(probabilities, [0, 0])
+        with self.assertRaises(ValueError):
+            marginal_probabilities(probabilities[:6], [0])
+
+    def check_project_qubits(self):
+        v = ComplexVector([1, 1, 1, 1, 1, 1, 1, 1j])
+        # Qubit 2 is 0, and qubit 0 is 1.
+        project_qubits(v, [2, 0], 1)
+        expected = [0, 0, 0, 0, math.sqrt(0.5), 0, math.sqrt(0.5), 0]
+        for c, e in zip(v.to_complex_list(), expected):
+            self.assertAlmostEqual(c, e)
+        with self.assertRaises(ValueError):
+            project_qubits(v, [0], 0)
+        with self.assertRaises(ValueError):
+            project_qubits(v, [3], 0)
+
+    def test_project_qubits(self):
+        self.check_project_qubits()
+        with patch("complex_numbers.complex_number_arrays.numpy", None):
+            self.check_project_qubits()
+
+    def test_probabilities_without_numpy(self):
+        expected = qubit_probabilities(self.state, [1, 0])
+        with patch("complex_numbers.complex_number_arrays.numpy", None):
+            self.assert_all_close(qubit_probabilities(self.state, [1, 0]), expected)
+
+    def test_sample(self):
+        outcomes = sample_outcomes(
+            [0.1, 0, 0.2, 0, 0.3, 0, 0.4, 0], 1000, random.Random(0)
+        )
+        self.assertEqual(len(outcomes), 1000)
+        self.assertEqual(set(outcomes), {0, 2, 4, 6})
+        self.assertGreater(outcomes.count(6), outcomes.count(0))
+        self.assertEqual(sample_outcomes([0, 0, 1], 3, random.Random()), [2, 2, 2])
+
+    def test_sample_seed(self):
+        probabilities = qubit_probabilities(self.state)
+        outcomes = sample_outcomes(probabilities, 100, random.Random(42))
+        self.assertEqual(
+            sample_outcomes(probabilities, 100, random.Random(42)), outcomes
+        )
+        with patch("complex_numbers.complex_number_arrays.numpy", None):
+            without_numpy = sample_outcomes(probabilities, 100, random.Random(42))
+            self.assertEqual(
+                sample_outcomes(probabilities, 100, random.Random(42)), without_numpy
+            )
+        self.assertEqual(set(outcomes) | set(without_numpy), {0, 2, 4, 6})
+
+
+class QubitExpectationsCheck(unittest.TestCase):
+    paulis = {
+        "I": ComplexMatrix([[1, 0], [0, 1]]),
+        "X": ComplexMatrix([[0, 1], [1, 0]]),
+        "Y": ComplexMatrix([[0, -1j], [1j, 0]]),
+        "Z": ComplexMatrix([[1, 0], [0, -1]]),
+    }
+
+    def brute_force_expectation(self, v, pauli_string):
+        matrix = self.paulis[pauli_string[0]]
+        for pauli in pauli_string[1:]:
+            matrix = tensor_product(matrix, self.paulis[pauli])
+        w = complex_matrix_vector_multiply(matrix, v).to_complex_list()
+        amplitudes = v.to_complex_list()
+        total = sum(a.conjugate() * b for a, b in zip(amplitudes, w))
+        return total.real / sum(abs(a) ** 2 for a in amplitudes)
+
+    def test_pauli_masks(self):
+        # Qubit 0 is the most significant bit.
+        self.assertEqual(pauli_masks("XIZY", range(4), 4), (0b1001, 0b0011, 1))
+        self.assertEqual(pauli_masks("YY", [2, 0], 3), (0b101, 0b101, 2))
+        with self.assertRaises(ValueError):
+            pauli_masks("XA", range(2), 2)
+        with self.assertRaises(ValueError):
+            pauli_masks("X", range(2), 2)
+
+    def check_expectation_values(self):
+        rng = random.Random(3)
+        v = ComplexVector([complex(rng.gauss(0, 1), rng.gauss(0, 1)) for _ in range(8)])
+        pauli_strings = ["".join(p) for p in itertools.product("IXYZ", repeat=3)]
+        values = pauli_expectation_values(v, pauli_strings)
+        for pauli_string, value in zip(pauli_strings, values):
+            self.assertAlmostEqual(
+                value, self.brute_force_expectation(v, pauli_string), msg=pauli_string
+            )
+        # "XZ" on qubits 2 and 0 is "ZIX" on the whole state.
+        self.assertAlmostEqual(
+            pauli_expectation_values(v, ["XZ"], [2, 0])[0],
+            self.brute_force_expectation(v, "ZIX"),
+        )
+        with self.assertRaises(ValueError):
+            pauli_expectation_values(v, ["XZ"], [3, 0])
+
+    def test_expectation_values(self):
+        self.check_expectation_values()
+        with patch("complex_numbers.complex_number_arrays.numpy", None):
+            self.check_expectation_values()
+
+    def check_outcome_probability(self):
+        # Probabilities 1/10, 0, 2/10, 0, 3/10, 0, 4/10, 0 (unnormalized).
+        state = ComplexVector([1, 0, ComplexNumber(1, 1), 0, math.sqrt(3), 0, 2j, 0])
+        self.assertAlmostEqual(outcome_probability(state, [0], 1), 0.7)
+        self.assertAlmostEqual(outcome_probability(state, [1, 0], 0b01), 0.3)
+        self.assertAlmostEqual(outcome_probability(state, [0, 1, 2], 0b110), 0.4)
+        self.assertAlmostEqual(outcome_probability(state, [2], 1), 0)
+        with self.assertRaises(ValueError):
+            outcome_probability(state, [3], 0)
+
+    def test_outcome_probability(self):
+        self.check_outcome_probability()
+        with patch("complex_numbers.complex_number_arrays.numpy", None):
+            self.check_outcome_probability()
+
+
+class QubitReflectionsCheck(unittest.TestCase):
+    def check_reflections(self):
+        rng = random.Random(5)
+        amplitudes = [complex(rng.gauss(0, 1), rng.gauss(0, 1)) for _ in range(8)]
+        v = ComplexVector(amplitudes)
+        phase_flip(v, [1, 6])
+        oracle = ComplexMatrix(
+            [
+                [(-1 if i in [1, 6] else 1) if i == j else 0 for j in range(8)]
+                for i in range(8)
+            ]
+        )
+        expected = complex_matrix_vector_multiply(oracle, ComplexVector(amplitudes))
+        for a, b in zip(v.to_complex_list(), expected.to_complex_list()):
+            self.assertAlmostEqual(a, b)
+
+        # The diffusion operator is -I + 2A, where every element of A is 1/2^n.
+        diffusion = ComplexMatrix(
+            [[2 / 8 - 1 if i == j else 2 / 8 for j in range(8)] for i in range(8)]
+        )
+        expected = complex_matrix_vector_multiply(diffusion, v)
+        invert_about_mean(v)
+        for a, b in zip(v.to_complex_list(), expected.to_complex_list()):
+            self.assertAlmostEqual(a, b)
+
+        amplitudes = v.to_complex_list()
+        self.assertAlmostEqual(
+            probability_of_indices(v, [0, 5]),
+            abs(amplitudes[0]) ** 2 + abs(amplitudes[5]) ** 2,
+        )
+        self.assertEqual(probability_of_indices(v, []), 0)
+        with self.assertRaises(ValueError):
+            phase_flip(v, [8])
+        with self.assertRaises(ValueError):
+            probability_of_indices(v, [-1])
+
+    def test_reflections(self):
+        self.check_reflections()
+        with patch("complex_numbers.complex_number_arrays.numpy", None):
+            self.check_reflections()
+
 
 class ComplexMatrixEigenvaluesCheck(unittest.TestCase):
     def test_not_square(self):